@@ -0,0 +1,428 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+from readiness import ReadinessWait
+
+DROP = "drop"
+OLDEST = "oldest"
+REJECT = "reject"
+OVERFLOW_POLICIES = (DROP, OLDEST, REJECT)
+
+# How a run ended, as passed to on_complete
+RUN_OK = 0
+RUN_FAILED = 1       # a step failed or raised, or a wait_for timed out
+RUN_CANCELLED = 2    # superseded by cancel_previous, or cancelled at shutdown
+RUN_SKIPPED = 3      # debounced, coalesced or pushed out of a full queue; never started
+
+# Per-combo limits from the "policies" section of config.json:
+#   coalesce         - ignore a press while a run of the combo is queued or in flight
+#   debounce_ms      - ignore a press within this many ms of the last accepted one
+#   max_concurrency  - how many runs of the combo may be in flight at once
+#   cancel_previous  - a new press cancels queued and in-flight runs of the combo
+ComboPolicy = namedtuple("ComboPolicy", ["coalesce", "debounce_ms", "max_concurrency", "cancel_previous"],
+                         defaults=(False, 0, 1, False))
+DEFAULT_POLICY = ComboPolicy()
+
+
+class ActionQueueFull(Exception):
+    """Raised by submit() when the queue is full and the overflow policy is 'reject'"""
+
+
+def step_graph(steps):
+    """For each step, the indexes of the steps it waits for.
+
+    A plain list runs in order, each step after the one before it. Once any
+    step has an `after` list the steps form a graph instead: a step waits
+    for the steps whose `id` it names in `after`, and steps without `after`
+    start straight away. Raises ValueError for ids that are not strings,
+    duplicate or unknown ids, and cycles.
+    """
+    if not any("after" in step for step in steps):
+        return [[index - 1] if index else [] for index in range(len(steps))]
+
+    ids = {}
+    for index, step in enumerate(steps):
+        if "id" in step:
+            if not isinstance(step["id"], str):
+                raise ValueError(f"'id' of step {index + 1} must be a string, got {step['id']!r}")
+            if step["id"] in ids:
+                raise ValueError(f"duplicate step id {step['id']!r}")
+            ids[step["id"]] = index
+    after = []
+    for index, step in enumerate(steps):
+        names = step.get("after", [])
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise ValueError(f"'after' of step {index + 1} must be a list of step ids")
+        unknown = [name for name in names if name not in ids]
+        if unknown:
+            raise ValueError(f"step {index + 1} waits for unknown step ids: {', '.join(map(repr, unknown))}")
+        after.append(sorted({ids[name] for name in names}))
+
+    # Kahn's algorithm: whatever is never freed up is part of a cycle
+    waiting = [len(prerequisites) for prerequisites in after]
+    free = [index for index, count in enumerate(waiting) if not count]
+    for index in free:
+        for dependent, prerequisites in enumerate(after):
+            if index in prerequisites:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    free.append(dependent)
+    if len(free) < len(steps):
+        cycle = [steps[index].get("id", str(index + 1)) for index, count in enumerate(waiting) if count]
+        raise ValueError(f"steps {', '.join(map(str, cycle))} wait for each other")
+    return after
+
+
+class ComboRun:
+    """One invocation of a combo and which of its steps are waiting, running or done"""
+
+    def __init__(self, key_combo, steps, policy=DEFAULT_POLICY, tag=None):
+        self.key_combo = key_combo
+        self.steps = steps
+        self.policy = policy
+        self.tag = tag
+        after = step_graph(steps)
+        self.waiting_on = [len(prerequisites) for prerequisites in after]
+        self.dependents = [[] for _ in steps]
+        for index, prerequisites in enumerate(after):
+            for prerequisite in prerequisites:
+                self.dependents[prerequisite].append(index)
+        self.waits = {}       # step index -> ReadinessWait while its wait_for is being polled
+        self.running = 0
+        self.done = 0
+        self.cancelled = False
+        self.failed = False
+        self.finished = False
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+
+    def roots(self):
+        return [index for index, count in enumerate(self.waiting_on) if not count]
+
+
+class ActionExecutor:
+    """Runs combo command lists on a pool of worker threads.
+
+    New runs wait in a bounded FIFO queue; when it is full the overflow policy
+    decides whether the new run is dropped, the oldest queued run is evicted,
+    or ActionQueueFull is raised. Runs of the same combo start in order and,
+    unless their policy raises max_concurrency, never overlap; different
+    combos run concurrently. Per-combo policies (see ComboPolicy) are applied
+    in submit() before a run is queued.
+
+    Steps form a graph (see step_graph): a step starts as soon as every
+    step it waits for is done, so independent branches of one run execute
+    on different workers at the same time. A step's `delay` holds back the
+    steps waiting for it without sleeping a worker: they go on a timer heap
+    and are picked up by whichever worker is free when they fall due.
+    A step with `wait_for` (see readiness.parse_wait_for) starts once its
+    conditions hold instead: a worker checks them, and while they do not
+    hold the step goes back on the timer heap with exponential backoff. A
+    condition that times out is logged, marks the run failed, and the step
+    runs anyway.
+
+    A step fails when command_executor.run_step() returns False or raises;
+    the remaining steps still run, and the run is reported as RUN_FAILED.
+
+    Every accepted or refused run is reported exactly once to
+    on_complete(tag, key_combo, duration, status), with the seconds since
+    it started (0 if it never did) and one of the RUN_* statuses. The
+    callback runs with the executor lock held and must not block.
+    """
+
+    def __init__(self, command_executor, workers=4, queue_size=32, overflow=DROP, on_complete=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow}', expected one of {OVERFLOW_POLICIES}")
+        self.command_executor = command_executor
+        self.on_complete = on_complete
+        self.queue_size = max(1, queue_size)
+        self.overflow = overflow
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        self.queue = deque()      # runs not started yet, oldest first
+        self.ready = deque()      # (run, step index) of started runs, due now
+        self.timers = []          # heap of (due, seq, run, step index, callback) for delays and wait_for polls
+        self.active = {}          # key_combo -> runs in flight
+        self.last_accepted = {}   # key_combo -> monotonic time of last accepted submit
+        self.seq = itertools.count()
+        self.stopping = False
+
+        self.counters = {
+            "submitted": 0,
+            "started": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "dropped": 0,
+            "evicted": 0,
+            "rejected": 0,
+            "debounced": 0,
+            "coalesced": 0,
+            "superseded": 0,
+            "steps_run": 0,
+            "steps_failed": 0,
+            "waits_timed_out": 0,
+            "max_queue_depth": 0,
+        }
+
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"action-worker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, key_combo, steps, policy=DEFAULT_POLICY, tag=None):
+        """Queue a run of `steps` for `key_combo`; returns False if it was not queued.
+
+        `tag` is handed back to on_complete to identify the run.
+        """
+        if not steps:
+            print(f"No commands configured for {key_combo}")
+            return False
+
+        run = ComboRun(key_combo, steps, policy, tag)
+        with self.lock:
+            if self.stopping:
+                self._report(run, RUN_CANCELLED)
+                return False
+            self.counters["submitted"] += 1
+
+            now = run.submitted_at
+            if policy.debounce_ms:
+                last = self.last_accepted.get(key_combo)
+                if last is not None and (now - last) * 1000.0 < policy.debounce_ms:
+                    self.counters["debounced"] += 1
+                    self._report(run, RUN_SKIPPED)
+                    return False
+
+            if policy.coalesce and (self.active.get(key_combo) or
+                                    any(queued.key_combo == key_combo for queued in self.queue)):
+                self.counters["coalesced"] += 1
+                self._report(run, RUN_SKIPPED)
+                return False
+
+            if policy.cancel_previous:
+                self._cancel_combo(key_combo)
+
+            if len(self.queue) >= self.queue_size:
+                if self.overflow == DROP:
+                    self.counters["dropped"] += 1
+                    logging.warning(f"Action queue full, dropped {key_combo}")
+                    self._report(run, RUN_SKIPPED)
+                    return False
+                if self.overflow == REJECT:
+                    self.counters["rejected"] += 1
+                    self._report(run, RUN_SKIPPED)
+                    raise ActionQueueFull(f"Action queue full ({self.queue_size}), rejected {key_combo}")
+                evicted = self.queue.popleft()
+                evicted.cancelled = True
+                self.counters["evicted"] += 1
+                self._report(evicted, RUN_SKIPPED)
+                logging.warning(f"Action queue full, evicted {evicted.key_combo}")
+
+            self.queue.append(run)
+            self.last_accepted[key_combo] = now
+            self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], len(self.queue))
+            self.wakeup.notify()
+        return True
+
+    def get_metrics(self):
+        with self.lock:
+            metrics = dict(self.counters)
+            metrics["queue_depth"] = len(self.queue)
+            metrics["scheduled_steps"] = len(self.timers)
+            metrics["running"] = sum(len(runs) for runs in self.active.values())
+        return metrics
+
+    def shutdown(self, wait=True, timeout=None):
+        """Stop accepting work, cancel every queued and started run, and stop workers after their current step.
+
+        All of them are reported as RUN_CANCELLED before the workers are
+        joined; a step still executing finishes on its worker unreported.
+        """
+        with self.lock:
+            self.stopping = True
+            for run in self.queue:
+                run.cancelled = True
+                self._report(run, RUN_CANCELLED)
+            self.counters["cancelled"] += len(self.queue)
+            self.queue.clear()
+            for runs in list(self.active.values()):
+                for run in list(runs):
+                    run.cancelled = True
+                    self._finish(run)
+            self.ready.clear()
+            self.timers = []
+            self.wakeup.notify_all()
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for thread in self.threads:
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                thread.join(remaining)
+
+    def _worker(self):
+        while True:
+            with self.lock:
+                step = self._next_step()
+                if step is None:
+                    return
+            self._run_step(*step)
+
+    def _next_step(self):
+        # Called with the lock held; blocks until a step is due or we are stopping
+        while True:
+            if self.stopping:
+                return None
+
+            now = time.monotonic()
+            while self.timers and self.timers[0][0] <= now:
+                _, _, run, index, callback = heapq.heappop(self.timers)
+                callback(run, index)
+
+            # Steps of runs already in flight go first
+            if self.ready:
+                run, index = self.ready.popleft()
+                run.running += 1
+                if self.ready:
+                    # More than one step became due; wake other workers for the rest
+                    self.wakeup.notify_all()
+                return run, index
+
+            for run in self.queue:
+                if len(self.active.get(run.key_combo, ())) < run.policy.max_concurrency:
+                    self.queue.remove(run)
+                    self.active.setdefault(run.key_combo, []).append(run)
+                    run.started_at = now
+                    self.counters["started"] += 1
+                    self.ready.extend((run, index) for index in run.roots())
+                    break
+            else:
+                timeout = self.timers[0][0] - now if self.timers else None
+                self.wakeup.wait(timeout)
+
+    def _run_step(self, run, index):
+        step = run.steps[index]
+        failed = False
+        retry = None
+        if not run.cancelled and "wait_for" in step:
+            retry = self._check_ready(run, index, step)
+        if not run.cancelled and retry is None:
+            try:
+                if not self.command_executor.run_step(step):
+                    failed = run.failed = True
+                    logging.error(f"Step {index + 1} of {run.key_combo} failed")
+            except Exception as e:
+                failed = run.failed = True
+                logging.error(f"Error running step {index + 1} of {run.key_combo}: {e}", exc_info=True)
+
+        with self.lock:
+            run.running -= 1
+            if run.cancelled:
+                # The last of its running steps finishes a cancelled run
+                if not run.running and not run.finished:
+                    self._finish(run)
+            elif retry is not None:
+                heapq.heappush(self.timers, (time.monotonic() + retry, next(self.seq), run, index, self._step_due))
+                self.wakeup.notify()
+            else:
+                self.counters["steps_run"] += 1
+                if failed:
+                    self.counters["steps_failed"] += 1
+                delay = step.get("delay", 0) or 0
+                if delay > 0 and run.dependents[index]:
+                    heapq.heappush(self.timers, (time.monotonic() + delay, next(self.seq), run, index,
+                                                 self._step_done))
+                else:
+                    self._step_done(run, index)
+                self.wakeup.notify_all()
+            finished = run.finished
+
+        if finished and not run.cancelled:
+            self.command_executor.report_completion(run.key_combo, run.steps)
+
+    def _check_ready(self, run, index, step):
+        # Seconds until the next poll while wait_for does not hold yet, None once the step may run
+        wait = run.waits.get(index)
+        if wait is None:
+            wait = run.waits[index] = ReadinessWait(step["wait_for"])
+        if wait.poll():
+            del run.waits[index]
+            if wait.elapsed() >= 0.5:
+                logging.info(f"{run.key_combo}: step {index + 1} ready after {wait.elapsed():.1f}s")
+            return None
+        expired = wait.expired()
+        if expired:
+            del run.waits[index]
+            run.failed = True
+            with self.lock:
+                self.counters["waits_timed_out"] += 1
+            logging.warning(f"{run.key_combo}: gave up after {wait.elapsed():.1f}s waiting for "
+                            f"{', '.join(map(str, expired))}; running step {index + 1} anyway")
+            return None
+        return wait.next_delay()
+
+    def _step_due(self, run, index):
+        # Called with the lock held when a step's next wait_for poll falls due
+        self.ready.append((run, index))
+
+    def _step_done(self, run, index):
+        # Called with the lock held, once the step has run and its delay is over
+        run.done += 1
+        for dependent in run.dependents[index]:
+            run.waiting_on[dependent] -= 1
+            if not run.waiting_on[dependent]:
+                self.ready.append((run, dependent))
+        if run.done == len(run.steps):
+            self._finish(run)
+
+    def _cancel_combo(self, key_combo):
+        # Called with the lock held. Queued runs are dropped outright; runs
+        # waiting on a delay are finished now; a run with steps executing on
+        # workers stops once the last of them returns.
+        for queued in [queued for queued in self.queue if queued.key_combo == key_combo]:
+            queued.cancelled = True
+            self.queue.remove(queued)
+            self.counters["superseded"] += 1
+            self._report(queued, RUN_CANCELLED)
+
+        in_flight = self.active.get(key_combo)
+        if not in_flight:
+            return
+        for run in in_flight:
+            run.cancelled = True
+            self.counters["superseded"] += 1
+        self.ready = deque(entry for entry in self.ready if not entry[0].cancelled)
+        timers = [timer for timer in self.timers if not timer[2].cancelled]
+        if len(timers) != len(self.timers):
+            heapq.heapify(timers)
+            self.timers = timers
+        for run in list(in_flight):
+            if not run.running:
+                self._finish(run)
+
+    def _finish(self, run):
+        # Called with the lock held
+        run.finished = True
+        runs = self.active.get(run.key_combo)
+        if runs and run in runs:
+            runs.remove(run)
+            if not runs:
+                del self.active[run.key_combo]
+        self.counters["cancelled" if run.cancelled else "completed"] += 1
+        self._report(run, RUN_CANCELLED if run.cancelled else RUN_FAILED if run.failed else RUN_OK)
+        # A queued run of the same combo may be able to start now
+        self.wakeup.notify_all()
+
+    def _report(self, run, status):
+        # Called with the lock held
+        if self.on_complete is None:
+            return
+        duration = time.monotonic() - run.started_at if run.started_at is not None else 0.0
+        try:
+            self.on_complete(run.tag, run.key_combo, duration, status)
+        except Exception as e:
+            logging.error(f"Error reporting completion of {run.key_combo}: {e}", exc_info=True)
@@ -1,29 +1,22 @@
 #!/usr/bin/env python3
 
 import sys
-import subprocess
+from script_library import run_script
 
 def activate_menu_item(app_name, menu_name, menu_item):
-    applescript = f'''
-    tell application "{app_name}" to activate
-    tell application "System Events"
-        tell process "{app_name}"
-            set frontmost to true
-            click menu item "{menu_item}" of menu "{menu_name}" of menu bar 1
-        end tell
-    end tell
-    '''
+    result = run_script("activate_menu_item", app_name, menu_name, menu_item)
+    if not result.ok:
+        print(f"AppleScript error: {result.error}")
 
-    subprocess.run(["osascript", "-e", applescript])
-
-def main():
-    if len(sys.argv) != 4:
-        print(f"Usage: {sys.argv[0]} <application_name> <menu_name> <menu_item>")
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 3:
+        print("Usage: activate_menu_item.py <application_name> <menu_name> <menu_item>")
         sys.exit(1)
 
-    app_name = sys.argv[1]
-    menu_name = sys.argv[2]
-    menu_item = sys.argv[3]
+    app_name = argv[0]
+    menu_name = argv[1]
+    menu_item = argv[2]
 
     activate_menu_item(app_name, menu_name, menu_item)
 
@@ -1,30 +1,23 @@
 #!/usr/bin/env python3
 
 import sys
-import subprocess
+from script_library import run_script
 
 
 def activate_window(app_name, window_name):
-    applescript = f'''
-    tell application "{app_name}" to activate
-    tell application "System Events"
-        tell process "{app_name}"
-            set frontmost to true
-            click menu item "{window_name}" of menu "Window" of menu bar 1
-        end tell
-    end tell
-    '''
-
-    subprocess.run(["osascript", "-e", applescript])
-
-
-def main():
-    if len(sys.argv) != 3:
-        print(f"Usage: {sys.argv[0]} <application_name> <window_name>")
+    result = run_script("activate_window", app_name, window_name)
+    if not result.ok:
+        print(f"AppleScript error: {result.error}")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print("Usage: activate_window.py <application_name> <window_name>")
         sys.exit(1)
 
-    app_name = sys.argv[1]
-    window_name = sys.argv[2]
+    app_name = argv[0]
+    window_name = argv[1]
 
     activate_window(app_name, window_name)
 
@@ -0,0 +1,79 @@
+import sys
+from collections import deque
+
+
+class ComboMatcher:
+    """Aho-Corasick automaton over the configured custom combos.
+
+    Every state carries a complete transition table (failure links are folded
+    in at build time), so feeding a key is a single dict lookup. Keys that
+    cannot start or continue any combo simply miss the table and fall back to
+    the root state.
+    """
+
+    ROOT = 0
+
+    def __init__(self, combos=()):
+        combos = sorted({sys.intern(combo) for combo in combos if combo})
+        self.combos = frozenset(combos)
+        self.alphabet = frozenset(char for combo in combos for char in combo)
+        self.max_length = max((len(combo) for combo in combos), default=0)
+        self.transitions = []
+        self.outputs = []
+        self.prefixes = []
+        self._build(combos)
+
+    def _build(self, combos):
+        # Plain trie first
+        goto = [{}]
+        terminal = [None]
+        prefixes = [""]
+        for combo in combos:
+            state = self.ROOT
+            for char in combo:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto.append({})
+                    terminal.append(None)
+                    prefixes.append(prefixes[state] + char)
+                    goto[state][char] = next_state
+                state = next_state
+            terminal[state] = combo
+
+        # Breadth-first pass computes failure links and folds them into full
+        # transition tables. Outputs list every combo ending at a state,
+        # longest first, so shorter suffix matches are never missed.
+        state_count = len(goto)
+        fail = [self.ROOT] * state_count
+        transitions = [None] * state_count
+        outputs = [()] * state_count
+
+        transitions[self.ROOT] = dict(goto[self.ROOT])
+        queue = deque(goto[self.ROOT].values())
+        while queue:
+            state = queue.popleft()
+            fallback = fail[state]
+            own = (terminal[state],) if terminal[state] else ()
+            outputs[state] = own + outputs[fallback]
+
+            table = dict(transitions[fallback])
+            table.update(goto[state])
+            transitions[state] = table
+
+            for char, child in goto[state].items():
+                fail[child] = transitions[fallback].get(char, self.ROOT)
+                queue.append(child)
+
+        self.transitions = transitions
+        self.outputs = outputs
+        self.prefixes = [sys.intern(prefix) for prefix in prefixes]
+
+    def step(self, state, char):
+        return self.transitions[state].get(char, self.ROOT)
+
+    def __len__(self):
+        return len(self.combos)
+
+    def __contains__(self, combo):
+        return combo in self.combos
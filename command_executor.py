@@ -1,14 +1,43 @@
 import subprocess
 import shlex
 import os
+import threading
 import time
 from pathlib import Path
 from datetime import datetime
+from helper_runner import HelperRunner, IN_PROCESS, ISOLATED
 
 
 class CommandExecutor:
-    def __init__(self, app_dir):
+    def __init__(self, app_dir, file_command_mode=IN_PROCESS, file_command_timeout=60.0,
+                 isolated_workers=2, isolated_worker_max_jobs=100, isolated_worker_max_rss_growth_mb=200):
         self.app_dir = Path(app_dir)
+        # Python helpers with main(argv) run in-process unless a step says "mode": "subprocess"
+        # or "mode": "isolated" (a warm worker process from the pool)
+        self.file_command_mode = file_command_mode
+        self.helpers = HelperRunner(timeout=file_command_timeout)
+        self.pool_settings = dict(size=isolated_workers, max_jobs=isolated_worker_max_jobs,
+                                  max_rss_growth_mb=isolated_worker_max_rss_growth_mb, timeout=file_command_timeout)
+        self.workers = None
+        self.workers_lock = threading.Lock()
+
+    def worker_pool(self):
+        """The pool for isolated helpers, created (and its module imported) on first use"""
+        with self.workers_lock:
+            if self.workers is None:
+                from zygote_pool import ZygotePool
+                self.workers = ZygotePool(self.app_dir, **self.pool_settings)
+            return self.workers
+
+    def start(self):
+        """Warm up the worker pool if helpers run isolated by default; otherwise it starts on first use"""
+        if self.file_command_mode == ISOLATED:
+            self.worker_pool().start()
+
+    def close(self):
+        with self.workers_lock:
+            if self.workers is not None:
+                self.workers.close()
 
     def open_app(self, app_path):
         if os.path.exists(app_path):
@@ -19,46 +48,25 @@ class CommandExecutor:
             app_name = Path(app_path).stem
             current_time = datetime.now().strftime("%Y-%m-%d %I:%M %p")
             print(f"[{current_time}] KeyMapper - Opened (Direct): {app_name}")
+            return True
         else:
             print(f"The file or directory {app_path} does not exist.")
+            return False
 
     def run_iterm_command(self, command):
-        # Escape quotes and backslashes in the command for AppleScript
-        escaped_command = command.replace('\\', '\\\\').replace('"', '\\"')
-        
-        applescript = f'''
-            tell application "iTerm2"
-                activate
-                tell current window
-                    create tab with default profile
-                    tell current session
-                        write text "{escaped_command}"
-                    end tell
-                end tell
-            end tell
-            '''
-        try:
-            subprocess.run(["osascript", "-e", applescript], check=True)
-        except subprocess.CalledProcessError as e:
-            print(f"Error executing iTerm command: {e}")
+        # Imported on first use so AppleScript support stays out of startup
+        from script_library import run_script
+        # The command is passed to the script as an argument, so it needs no escaping
+        result = run_script("iterm_new_tab", command)
+        if not result.ok:
+            print(f"Error executing iTerm command: {result.error}")
             # Fallback: try with iTerm (version 1) if iTerm2 fails
-            applescript_v1 = f'''
-                tell application "iTerm"
-                    activate
-                    tell current terminal
-                        launch session "Default Session"
-                        tell current session
-                            write text "{escaped_command}"
-                        end tell
-                    end tell
-                end tell
-                '''
-            try:
-                subprocess.run(["osascript", "-e", applescript_v1], check=True)
-            except subprocess.CalledProcessError as e2:
-                print(f"Error with both iTerm2 and iTerm: {e2}")
-
-    def run_file_command(self, file_command):
+            result = run_script("iterm_legacy_new_tab", command)
+            if not result.ok:
+                print(f"Error with both iTerm2 and iTerm: {result.error}")
+        return result.ok
+
+    def run_file_command(self, file_command, mode=None):
         try:
             parts = shlex.split(file_command)
             file_name = parts[0]
@@ -68,30 +76,47 @@ class CommandExecutor:
 
             if file_path.exists():
                 if file_path.suffix == '.py':
-                    subprocess.run(['python3', str(file_path)] + args)
+                    mode = mode or self.file_command_mode
+                    ok = None
+                    if mode == IN_PROCESS:
+                        ok = self.helpers.run(file_path, args)
+                    elif mode == ISOLATED:
+                        ok = self.worker_pool().run(file_path, args)
+                    if ok is not None:
+                        return ok
+                    return subprocess.run(['python3', str(file_path)] + args).returncode == 0
                 else:
-                    subprocess.run([str(file_path)] + args)
+                    return subprocess.run([str(file_path)] + args).returncode == 0
             else:
                 print(f"File not found: {file_path}")
+                return False
         except Exception as e:
             print(f"Error running file command: {e}")
+            return False
+
+    def run_step(self, cmd):
+        """Run one configured step; returns whether it succeeded"""
+        if 'file_command' in cmd:
+            return self.run_file_command(cmd['file_command'], cmd.get('mode'))
+        full_command = f"source ~/.bashrc && {cmd['command']}"
+        return self.run_iterm_command(full_command)
+
+    def report_completion(self, key_combo, commands):
+        current_time = datetime.now().strftime("%Y-%m-%d %I:%M %p")
+        comment = ""
+        if commands and len(commands) > 0 and 'comment' in commands[0]:
+            comment = f" - {commands[0]['comment']}"
+
+        print(f"[{current_time}] {key_combo}{comment}")
 
     def run_commands(self, commands, key_combo):
+        """Run a command list synchronously; the listener goes through ActionExecutor instead"""
         if not commands:
             print(f"No commands configured for {key_combo}")
             return
 
         for cmd in commands:
-            if 'file_command' in cmd:
-                self.run_file_command(cmd['file_command'])
-            else:
-                full_command = f"source ~/.bashrc && {cmd['command']}"
-                self.run_iterm_command(full_command)
+            self.run_step(cmd)
             time.sleep(cmd.get("delay", 0))
 
-        current_time = datetime.now().strftime("%Y-%m-%d %I:%M %p")
-        comment = ""
-        if commands and len(commands) > 0 and 'comment' in commands[0]:
-            comment = f" - {commands[0]['comment']}"
-
-        print(f"[{current_time}] {key_combo}{comment}")
+        self.report_completion(key_combo, commands)
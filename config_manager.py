@@ -1,17 +1,30 @@
+import hashlib
 import json
 import os
+import threading
 from pathlib import Path
 from datetime import datetime
 import logging
+from config_snapshot import ConfigSnapshot
+from action_executor import ComboPolicy, step_graph
+from helper_runner import FILE_COMMAND_MODES, IN_PROCESS
+from readiness import parse_wait_for
 
 
 class ConfigManager:
     def __init__(self, config_path):
         self.config_path = Path(config_path)
         self.config_mtime = 0
-        self.config = self.load_config()
+        self.config_size = -1
+        self.config_hash = None
+        self.reload_lock = threading.Lock()
+        self.snapshot = ConfigSnapshot(self.load_initial_config())
         self.update_config_mtime()
 
+    @property
+    def config(self):
+        return self.snapshot.config
+
     def get_default_config(self):
         return {
             "settings": {
@@ -33,6 +46,9 @@ class ConfigManager:
                 ],
                 "cmd+7": [{"command": "xx", "delay": 0}],
                 "cmd+8": [{"command": "top", "delay": 0}]
+            },
+            "policies": {
+                "cmd+6": {"coalesce": True}
             }
         }
 
@@ -46,35 +62,123 @@ class ConfigManager:
         with open(self.config_path, "r") as f:
             return json.load(f)
 
+    def load_initial_config(self):
+        """The config to start with: the file if it parses and validates, the built-in default otherwise.
+
+        A broken file is reported and left alone, as on a reload; the watcher
+        picks it up once it has been fixed.
+        """
+        try:
+            config = self.load_config()
+            self.validate_config(config)
+            return config
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading {self.config_path}, starting with the default config: {e}")
+            return self.get_default_config()
+
+    def publish(self, config):
+        """Compile config into a new snapshot and swap it in as one reference assignment"""
+        snapshot = ConfigSnapshot(config, self.snapshot.version + 1)
+        self.snapshot = snapshot
+        return snapshot
+
     def update_config_mtime(self):
         try:
-            self.config_mtime = os.path.getmtime(self.config_path)
+            stat = os.stat(self.config_path)
+            self.config_mtime = stat.st_mtime_ns
+            self.config_size = stat.st_size
+            self.config_hash = hashlib.sha1(self.config_path.read_bytes()).hexdigest()
         except Exception as e:
             logging.error(f"Error getting config file modification time: {e}")
 
+    def validate_config(self, config):
+        """Raise ValueError if the parsed config does not have the expected shape"""
+        if not isinstance(config, dict):
+            raise ValueError("config root must be an object")
+        for section in ("settings", "apps", "commands", "policies"):
+            if not isinstance(config.get(section, {}), dict):
+                raise ValueError(f"'{section}' must be an object")
+        for code, app_path in config.get("apps", {}).items():
+            if not isinstance(app_path, str):
+                raise ValueError(f"app '{code}' must map to a path string")
+        for code, steps in config.get("commands", {}).items():
+            if not isinstance(steps, list):
+                raise ValueError(f"command '{code}' must map to a list of steps")
+            for step in steps:
+                if not isinstance(step, dict) or not ('command' in step or 'file_command' in step):
+                    raise ValueError(f"command '{code}' has a step without 'command' or 'file_command'")
+                if step.get("mode", IN_PROCESS) not in FILE_COMMAND_MODES:
+                    raise ValueError(f"command '{code}' has a step with an unknown mode: {step['mode']!r} "
+                                     f"(expected one of {', '.join(FILE_COMMAND_MODES)})")
+                if "wait_for" in step:
+                    try:
+                        parse_wait_for(step["wait_for"])
+                    except ValueError as e:
+                        raise ValueError(f"command '{code}': {e}")
+            try:
+                step_graph(steps)
+            except ValueError as e:
+                raise ValueError(f"command '{code}': {e}")
+        for code, policy in config.get("policies", {}).items():
+            if not isinstance(policy, dict):
+                raise ValueError(f"policy for '{code}' must be an object")
+            unknown = set(policy) - set(ComboPolicy._fields)
+            if unknown:
+                raise ValueError(f"policy for '{code}' has unknown keys: {', '.join(sorted(unknown))}")
+            for key in ("coalesce", "cancel_previous"):
+                if key in policy and not isinstance(policy[key], bool):
+                    raise ValueError(f"policy for '{code}': {key} must be true or false")
+            max_concurrency = policy.get("max_concurrency", 1)
+            if isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int) or max_concurrency < 1:
+                raise ValueError(f"policy for '{code}': max_concurrency must be a whole number of at least 1")
+            debounce_ms = policy.get("debounce_ms", 0)
+            if isinstance(debounce_ms, bool) or not isinstance(debounce_ms, (int, float)) or debounce_ms < 0:
+                raise ValueError(f"policy for '{code}': debounce_ms must be a number of milliseconds, 0 or more")
+
     def check_for_updates(self):
-        try:
-            current_mtime = os.path.getmtime(self.config_path)
-            if current_mtime != self.config_mtime:
-                self.config = self.load_config()
-                self.config_mtime = current_mtime
+        """Reparse and publish a new snapshot if the file changed.
+
+        The cheap mtime+size check runs first; the content hash filters out
+        saves that did not change anything. A file that fails to parse or
+        validate leaves the current snapshot in place.
+        """
+        with self.reload_lock:
+            try:
+                stat = os.stat(self.config_path)
+                if stat.st_mtime_ns == self.config_mtime and stat.st_size == self.config_size:
+                    return False
+                self.config_mtime = stat.st_mtime_ns
+                self.config_size = stat.st_size
+
+                data = self.config_path.read_bytes()
+                digest = hashlib.sha1(data).hexdigest()
+                if digest == self.config_hash:
+                    return False
+                self.config_hash = digest
+
+                config = json.loads(data)
+                self.validate_config(config)
+                self.publish(config)
                 print(f"[{datetime.now().strftime('%Y-%m-%d %I:%M %p')}] Config reloaded - file was modified")
                 return True
-        except Exception as e:
-            logging.error(f"Error checking config file: {e}")
-        return False
+            except Exception as e:
+                logging.error(f"Error checking config file: {e}")
+            return False
 
     def get_setting(self, key, default=None):
-        return self.config.get("settings", {}).get(key, default)
+        return self.snapshot.settings.get(key, default)
 
     def get_apps(self):
-        return self.config.get("apps", {})
+        return self.snapshot.apps
 
     def get_commands(self):
-        return self.config.get("commands", {})
+        return self.snapshot.commands
 
     def get_custom_combo_keys(self):
-        return set(combo for combo in self.get_commands() if not combo.startswith("cmd+"))
+        return self.snapshot.custom_combo_keys
 
     def is_configured_shortcut(self, key_combo):
-        return key_combo in self.get_apps() or key_combo in self.get_commands()
\ No newline at end of file
+        return key_combo in self.snapshot.actions
+
+    def get_action(self, key_combo):
+        return self.snapshot.actions.get(key_combo)
@@ -0,0 +1,99 @@
+import sys
+from collections import namedtuple
+from pathlib import Path
+from types import MappingProxyType
+from combo_matcher import ComboMatcher
+from action_executor import ComboPolicy, DEFAULT_POLICY
+
+APP = "app"
+COMMAND = "command"
+
+Action = namedtuple("Action", ["code", "kind", "target", "comment", "policy"])
+ConfigDiff = namedtuple("ConfigDiff", ["added", "removed", "renamed"])
+
+
+def describe_commands(commands):
+    """Human readable label for a command list, taken from its first step"""
+    if not commands:
+        return ""
+    first_cmd = commands[0]
+    if 'comment' in first_cmd:
+        return first_cmd['comment']
+    if 'command' in first_cmd:
+        return f"Run: {first_cmd['command']}"
+    if 'file_command' in first_cmd:
+        return f"File: {first_cmd['file_command']}"
+    return f"{len(commands)} commands"
+
+
+def diff_snapshots(old, new):
+    """Compare the actions of two snapshots.
+
+    A removed combo whose action (kind and target) reappears under exactly
+    one added code is reported as renamed {old: new} rather than as a
+    removal plus an addition, so its usage can follow it.
+    """
+    removed = old.actions.keys() - new.actions.keys()
+    added = new.actions.keys() - old.actions.keys()
+    renamed = {}
+    for code in sorted(removed):
+        action = old.actions[code]
+        matches = [candidate for candidate in added
+                   if (new.actions[candidate].kind, new.actions[candidate].target) == (action.kind, action.target)
+                   and candidate not in renamed.values()]
+        if len(matches) == 1:
+            renamed[code] = matches[0]
+    return ConfigDiff(
+        frozenset(added - set(renamed.values())),
+        frozenset(removed - renamed.keys()),
+        MappingProxyType(renamed)
+    )
+
+
+class ConfigSnapshot:
+    """Immutable, precompiled view of one loaded config.
+
+    Built once per (re)load and published by swapping a single reference, so
+    readers on the key path never see a half-updated config and never need a
+    lock.
+    """
+
+    def __init__(self, config, version=0):
+        self.version = version
+        self.config = MappingProxyType(config)
+        self.settings = MappingProxyType(dict(config.get("settings", {})))
+        self.apps = MappingProxyType({sys.intern(k): v for k, v in config.get("apps", {}).items()})
+        self.commands = MappingProxyType({
+            sys.intern(k): tuple(MappingProxyType(dict(step)) for step in steps)
+            for k, steps in config.get("commands", {}).items()
+        })
+
+        self.policies = MappingProxyType({
+            sys.intern(k): ComboPolicy(**policy) for k, policy in config.get("policies", {}).items()
+        })
+
+        actions = {}
+        for code, app_path in self.apps.items():
+            actions[code] = Action(code, APP, app_path, f"Open {Path(app_path).stem}", DEFAULT_POLICY)
+        for code, steps in self.commands.items():
+            comment = describe_commands(steps)
+            if code in actions:
+                # Apps take precedence when executing, commands when labelling
+                actions[code] = actions[code]._replace(comment=comment)
+            else:
+                actions[code] = Action(code, COMMAND, steps, comment, self.policies.get(code, DEFAULT_POLICY))
+        self.actions = MappingProxyType(actions)
+
+        # cmd+<char> actions keyed by the bare character, so the key path
+        # does not have to format "cmd+x" before looking it up
+        self.cmd_actions = MappingProxyType({
+            code[4:]: action for code, action in actions.items() if code.startswith("cmd+")
+        })
+        self.custom_combo_keys = frozenset(code for code in self.commands if not code.startswith("cmd+"))
+        self.matcher = ComboMatcher(self.custom_combo_keys)
+
+    def get_setting(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def get_action(self, key_combo):
+        return self.actions.get(key_combo)
@@ -0,0 +1,122 @@
+import logging
+import os
+import select
+import threading
+
+
+class PollingBackend:
+    """Wakes the watcher every `interval` seconds"""
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+
+    def wait(self, stop_event):
+        stop_event.wait(self.interval)
+
+    def close(self):
+        pass
+
+
+class KqueueBackend:
+    """Blocks on kqueue vnode events for the config file (macOS/BSD).
+
+    Editors that save by writing a new file and renaming it over the old one
+    produce a DELETE/RENAME on the watched descriptor; the file is reopened on
+    the next wait. `interval` bounds how long a wait can block so the watcher
+    still notices a stop request or a missed event.
+    """
+
+    FFLAGS = (getattr(select, "KQ_NOTE_WRITE", 0) | getattr(select, "KQ_NOTE_EXTEND", 0) |
+              getattr(select, "KQ_NOTE_ATTRIB", 0) | getattr(select, "KQ_NOTE_DELETE", 0) |
+              getattr(select, "KQ_NOTE_RENAME", 0))
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.kqueue = select.kqueue()
+        self.fd = None
+
+    def _open(self):
+        try:
+            self.fd = os.open(self.path, getattr(os, "O_EVTONLY", os.O_RDONLY))
+        except OSError:
+            self.fd = None
+            return
+        event = select.kevent(self.fd, filter=select.KQ_FILTER_VNODE,
+                              flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR, fflags=self.FFLAGS)
+        self.kqueue.control([event], 0, 0)
+
+    def _close_fd(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def wait(self, stop_event):
+        if self.fd is None:
+            self._open()
+            if self.fd is None:
+                stop_event.wait(self.interval)
+                return
+        events = self.kqueue.control(None, 4, self.interval)
+        replaced = select.KQ_NOTE_DELETE | select.KQ_NOTE_RENAME
+        if any(event.fflags & replaced for event in events):
+            self._close_fd()
+
+    def close(self):
+        self._close_fd()
+        self.kqueue.close()
+
+
+def create_backend(path, interval=1.0):
+    if hasattr(select, "kqueue"):
+        try:
+            return KqueueBackend(path, interval)
+        except OSError as e:
+            logging.warning(f"kqueue unavailable, falling back to polling: {e}")
+    return PollingBackend(path, interval)
+
+
+class ConfigWatcher(threading.Thread):
+    """Reloads the config off the key path and publishes new snapshots.
+
+    Change detection, parsing and validation all happen on this thread via
+    ConfigManager.check_for_updates(); listeners registered with
+    add_listener() are called here with the new snapshot once it is live.
+    """
+
+    def __init__(self, config_manager, interval=1.0, backend=None):
+        super().__init__(name="config-watcher", daemon=True)
+        self.config_manager = config_manager
+        self.backend = backend or create_backend(config_manager.config_path, interval)
+        self.listeners = []
+        self.stop_event = threading.Event()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                self.backend.wait(self.stop_event)
+                if self.stop_event.is_set():
+                    break
+                self.poll()
+        finally:
+            self.backend.close()
+
+    def poll(self):
+        if not self.config_manager.check_for_updates():
+            return False
+        snapshot = self.config_manager.snapshot
+        for callback in self.listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logging.error(f"Error in config reload listener: {e}", exc_info=True)
+        return True
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
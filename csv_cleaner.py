@@ -1,93 +1,132 @@
 import csv
 import logging
+import queue
+import threading
 from datetime import datetime
-from pathlib import Path
+from config_snapshot import diff_snapshots
+from usage_log import CSV_FIELDS
+
+ARCHIVE_FIELDS = CSV_FIELDS + ['archived_at']
 
 
 class CSVCleaner:
+    """Keeps the usage data in line with the config, off the startup and reload paths.
+
+    schedule() hands a snapshot to a background thread, which diffs it
+    against the last snapshot it handled: usage of renamed combos moves to
+    the new code and only removed codes are pruned. The first run has no
+    previous snapshot and checks the logged codes instead. Pruned entries
+    are appended to an archive CSV next to the usage file.
+    """
+
     def __init__(self, csv_logger, config_manager):
         self.csv_logger = csv_logger
         self.config_manager = config_manager
-    
+        csv_path = csv_logger.csv_log_path
+        self.archive_path = csv_path.with_name(csv_path.stem + "_archive.csv")
+        self.snapshot = None
+        self.inbox = queue.SimpleQueue()
+        self.thread = None
+        self.lock = threading.Lock()
+
     def get_valid_commands(self):
         """Get all valid commands from both apps and commands sections"""
-        valid_commands = set()
-        valid_commands.update(self.config_manager.get_apps().keys())
-        valid_commands.update(self.config_manager.get_commands().keys())
-        return valid_commands
-    
-    def cleanup_outdated_entries(self):
-        """Remove outdated entries from the CSV file that are no longer in config"""
-        if not self.csv_logger.csv_log_path.exists():
+        return set(self.config_manager.snapshot.actions)
+
+    def schedule(self, snapshot=None):
+        """Reconcile the usage data with `snapshot` (default: the current config) in the background"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="usage-cleanup", daemon=True)
+                self.thread.start()
+        self.inbox.put(snapshot or self.config_manager.snapshot)
+
+    def stop(self, timeout=None):
+        """Finish the reconciles already scheduled and stop the thread"""
+        if self.thread is None:
             return
-        
+        self.inbox.put(None)
+        self.thread.join(timeout)
+
+    def _run(self):
+        while True:
+            snapshot = self.inbox.get()
+            if snapshot is None:
+                return
+            self.reconcile(snapshot)
+
+    def reconcile(self, snapshot):
+        # Usage data loads in the background too; it has to be there to diff against
+        self.csv_logger.wait_loaded()
         try:
-            valid_commands = self.get_valid_commands()
-            rows_to_keep = []
-            removed_entries = []
-            
-            # Read existing CSV data
-            with open(self.csv_logger.csv_log_path, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                fieldnames = reader.fieldnames
-                
-                for row in reader:
-                    command_code = row['code']
-                    if command_code in valid_commands:
-                        rows_to_keep.append(row)
-                    else:
-                        removed_entries.append(command_code)
-            
-            # Write back only valid commands if any were removed
-            if removed_entries:
-                with open(self.csv_logger.csv_log_path, 'w', newline='', encoding='utf-8') as csvfile:
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(rows_to_keep)
-                
-                # Update the csv_logger's action_counts to reflect the cleanup
-                self.csv_logger.load_action_counts()
-                
-                print(f"[{datetime.now().strftime('%Y-%m-%d %I:%M %p')}] CSV cleaned up: removed {len(removed_entries)} outdated entries")
-                logging.info(f"Removed outdated CSV entries: {', '.join(removed_entries)}")
-                
-                return removed_entries
+            previous, self.snapshot = self.snapshot, snapshot
+            if previous is None:
+                return self.cleanup_outdated_entries(set(snapshot.actions))
+
+            diff = diff_snapshots(previous, snapshot)
+            if diff.renamed:
+                moved = self.csv_logger.rename_entries(diff.renamed)
+                if moved:
+                    logging.info(f"Moved usage for renamed combos: "
+                                 f"{', '.join(f'{old} -> {diff.renamed[old]}' for old in moved)}")
+            if diff.removed:
+                return self.prune(diff.removed)
+            return []
+
+        except Exception as e:
+            logging.error(f"Error cleaning up usage data: {e}", exc_info=True)
+            return []
+
+    def prune(self, codes):
+        """Remove `codes` from the usage data and archive what was removed"""
+        removed = self.csv_logger.remove_entries(sorted(codes))
+        if not removed:
+            return []
+
+        self.archive(removed)
+        removed_codes = [entry['code'] for entry in removed]
+        print(f"[{datetime.now().strftime('%Y-%m-%d %I:%M %p')}] CSV cleaned up: archived {len(removed_codes)} outdated entries")
+        logging.info(f"Archived outdated CSV entries to {self.archive_path}: {', '.join(removed_codes)}")
+        return removed_codes
+
+    def archive(self, entries):
+        archived_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        write_header = not self.archive_path.exists() or self.archive_path.stat().st_size == 0
+        with open(self.archive_path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=ARCHIVE_FIELDS, extrasaction='ignore')
+            if write_header:
+                writer.writeheader()
+            for entry in entries:
+                writer.writerow(dict(entry, archived_at=archived_at))
+
+    def cleanup_outdated_entries(self, valid_commands=None):
+        """Remove and archive usage entries that are no longer in config"""
+        try:
+            if valid_commands is None:
+                valid_commands = self.get_valid_commands()
+            outdated = self.csv_logger.get_logged_codes() - valid_commands
+
+            if outdated:
+                return self.prune(outdated)
             else:
                 logging.info("CSV file is already clean - no outdated entries found")
                 return []
-                
+
         except Exception as e:
             logging.error(f"Error cleaning up CSV file: {e}")
             return []
-    
+
     def get_outdated_entries(self):
         """Get list of outdated entries without removing them (for preview)"""
-        if not self.csv_logger.csv_log_path.exists():
-            return []
-        
         try:
             valid_commands = self.get_valid_commands()
-            outdated_entries = []
-            
-            with open(self.csv_logger.csv_log_path, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                for row in reader:
-                    command_code = row['code']
-                    if command_code not in valid_commands:
-                        outdated_entries.append({
-                            'code': command_code,
-                            'count': row.get('count', 0),
-                            'last_action': row.get('last_action', ''),
-                            'comment': row.get('comment', '')
-                        })
-            
-            return outdated_entries
-            
+            return [entry for entry in self.csv_logger.get_entries()
+                    if entry['code'] not in valid_commands]
+
         except Exception as e:
             logging.error(f"Error checking for outdated entries: {e}")
             return []
-    
+
     def preview_cleanup(self):
         """Preview what entries would be removed without actually removing them"""
         outdated = self.get_outdated_entries()
@@ -97,4 +136,4 @@ class CSVCleaner:
                 print(f"  - {entry['code']}: {entry['comment']} (used {entry['count']} times)")
         else:
             print("No outdated entries found - CSV file is clean")
-        return outdated 
\ No newline at end of file
+        return outdated
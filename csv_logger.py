@@ -1,23 +1,295 @@
-import csv
-from collections import defaultdict
+import itertools
+import threading
+import time
+from abc import ABC, abstractmethod
 from datetime import datetime
 from pathlib import Path
 import logging
+from file_lock import file_lock
+from storage_actor import StorageActor
+from usage_index import UsageIndex
+from usage_log import UsageEventLog, CSV_FIELDS, AGGREGATE_OPS, newest_mtime, retire
+
+
+class UsageBackend(ABC):
+    """Persistence for per-code usage aggregates.
+
+    load() runs once at startup and returns {code: row shaped like the CSV
+    view}; write_batch() and close() are only ever called from the storage
+    actor thread. Reports do not query the backend: they read the in-memory
+    UsageIndex kept by CSVLogger.
+    """
+
+    path = None
+
+    @abstractmethod
+    def load(self):
+        """{code: row} as stored, read once at startup"""
+
+    @abstractmethod
+    def write_batch(self, events):
+        """Apply a batch of events (actions, prunes, renames) to the stored aggregates"""
+
+    @abstractmethod
+    def close(self):
+        """Flush whatever is pending and refresh the CSV view"""
+
+
+class EventLogBackend(UsageBackend):
+    """Append-only event log + compacted snapshot, with the CSV as a view.
+
+    If the SQLite database is newer than the event log, the SQLite backend
+    was used last: its rows are taken over and the database is retired.
+    """
+
+    def __init__(self, csv_path, compact_every=1000):
+        self.event_log = UsageEventLog(csv_path)
+        self.path = self.event_log.log_path
+        self.lock_path = self.event_log.csv_path.with_suffix(".lock")
+        self.db_path = self.event_log.csv_path.with_suffix(".db")
+        self.compact_every = compact_every
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        with file_lock(self.lock_path):
+            entries = self._take_over_db()
+            if entries is None:
+                entries = self.event_log.load()
+        with self.lock:
+            self.entries = entries
+        return {code: dict(entry) for code, entry in entries.items()}
+
+    def _take_over_db(self):
+        # Called with the file lock held
+        db_mtime = newest_mtime(SQLiteBackend.files(self.db_path))
+        log_mtime = newest_mtime([self.event_log.snapshot_path, self.event_log.log_path])
+        if db_mtime is None or (log_mtime is not None and log_mtime >= db_mtime):
+            return None
+        try:
+            entries = SQLiteBackend.read_entries(self.db_path)
+        except Exception as e:
+            logging.error(f"Error reading {self.db_path}, using the event log: {e}")
+            return None
+        # Whatever the event log holds predates the database
+        retire([self.event_log.snapshot_path, self.event_log.log_path])
+        self.event_log.compact(entries)
+        self.event_log.materialize_csv(entries)
+        SQLiteBackend.retire(self.db_path)
+        logging.info(f"Migrated {len(entries)} usage entries from {self.db_path}")
+        return entries
+
+    def write_batch(self, events):
+        events = [event for event in events if event["op"] in AGGREGATE_OPS]
+        if not events:
+            return
+        with file_lock(self.lock_path), self.lock:
+            self.event_log.append_many(events)
+            for event in events:
+                UsageEventLog.apply(self.entries, event)
+            # Compacting costs O(entries), so wait for at least that many
+            # events to keep the amortized cost per action constant
+            if self.event_log.records_since_compaction >= max(self.compact_every, len(self.entries)):
+                self.event_log.compact(self.entries)
+                self.event_log.materialize_csv(self.entries)
+
+    def close(self):
+        with file_lock(self.lock_path), self.lock:
+            self.event_log.compact(self.entries)
+            self.event_log.materialize_csv(self.entries)
+            self.event_log.close()
+
+
+class SQLiteBackend(UsageBackend):
+    """Usage aggregates in an SQLite database (WAL mode).
+
+    Each action is one upsert; the SQL text is constant, so sqlite3's
+    per-connection statement cache keeps each statement prepared. Each
+    thread that touches the database gets its own connection.
+    On first use, and whenever the event log is newer than the database
+    (the event log backend was used since), the event log / CSV data is
+    imported and the event log files are retired.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS usage ("
+        " code TEXT PRIMARY KEY,"
+        " count INTEGER NOT NULL DEFAULT 0,"
+        " last_action TEXT NOT NULL DEFAULT '',"
+        " comment TEXT NOT NULL DEFAULT '')",
+        # Reports come from the in-memory indexes; these only slowed down writes
+        "DROP INDEX IF EXISTS usage_by_count",
+        "DROP INDEX IF EXISTS usage_by_last_action",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    )
+    UPSERT = ("INSERT INTO usage (code, count, last_action, comment) VALUES (?, 1, ?, ?) "
+              "ON CONFLICT(code) DO UPDATE SET count = count + 1, "
+              "last_action = excluded.last_action, comment = excluded.comment")
+    IMPORT = "INSERT OR REPLACE INTO usage (code, count, last_action, comment) VALUES (?, ?, ?, ?)"
+    DELETE = "DELETE FROM usage WHERE code = ?"
+    RENAME = ("INSERT INTO usage (code, count, last_action, comment) "
+              "SELECT ?, count, last_action, comment FROM usage WHERE code = ? "
+              "ON CONFLICT(code) DO UPDATE SET count = count + excluded.count, "
+              "last_action = MAX(last_action, excluded.last_action)")
+    SELECT = "SELECT code, count, last_action, comment FROM usage"
+
+    def __init__(self, db_path, csv_path, compact_every=1000):
+        self.db_path = self.path = Path(db_path)
+        self.event_log = UsageEventLog(csv_path)
+        self.lock_path = self.event_log.csv_path.with_suffix(".lock")
+        self.compact_every = compact_every
+        self.events_since_view = 0
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            # Imported here so the event log backend never pays for it
+            import sqlite3
+            conn = sqlite3.connect(self.db_path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    @classmethod
+    def files(cls, db_path):
+        """The database and its WAL, whose mtimes say when it was last written"""
+        return [db_path, db_path.with_name(db_path.name + "-wal")]
+
+    def load(self):
+        event_log_paths = [self.event_log.snapshot_path, self.event_log.log_path]
+        with file_lock(self.lock_path):
+            db_mtime = newest_mtime(self.files(self.db_path))
+            log_mtime = newest_mtime(event_log_paths)
+            conn = self._connection()
+            with conn:
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+                migrated = conn.execute("SELECT value FROM meta WHERE key = 'migrated'").fetchone()
+                if migrated is None or (log_mtime is not None and db_mtime is not None and log_mtime > db_mtime):
+                    self._migrate(conn)
+            # Left in place, the event log backend or usage_merge would read the stale counts back
+            retire(event_log_paths)
+        return {row['code']: row for row in self._rows(self.SELECT, ())}
+
+    def _migrate(self, conn):
+        # Called with the file lock held
+        entries = self.event_log.load()
+        self.event_log.close()
+        conn.execute("DELETE FROM usage")
+        conn.executemany(self.IMPORT, [
+            (entry['code'], int(entry['count'] or 0), entry['last_action'], entry['comment'])
+            for entry in entries.values()
+        ])
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated', ?)",
+                     (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+        logging.info(f"Migrated {len(entries)} usage entries into {self.db_path}")
+
+    def write_batch(self, events):
+        conn = self._connection()
+        with conn:
+            for event in events:
+                if event["op"] == "action":
+                    conn.execute(self.UPSERT, (event["code"], event["ts"], event.get("comment", "")))
+                elif event["op"] == "prune":
+                    conn.executemany(self.DELETE, [(code,) for code in event["codes"]])
+                elif event["op"] == "rename":
+                    for old, new in event["renames"]:
+                        conn.execute(self.RENAME, (new, old))
+                        conn.execute(self.DELETE, (old,))
+        self.events_since_view += len(events)
+        if self.events_since_view >= self.compact_every:
+            self.materialize_csv()
+
+    @classmethod
+    def read_entries(cls, db_path):
+        """{code: row shaped like the CSV view}, read-only, for processes other than the listener"""
+        import sqlite3
+        conn = sqlite3.connect(f"{Path(db_path).absolute().as_uri()}?mode=ro", uri=True, timeout=5.0)
+        try:
+            return {code: dict(zip(CSV_FIELDS, (code, str(count), last_action, comment)))
+                    for code, count, last_action, comment in conn.execute(cls.SELECT)}
+        finally:
+            conn.close()
+
+    @classmethod
+    def retire(cls, db_path):
+        """Fold the WAL into the database and move it aside once the event log owns the data"""
+        import sqlite3
+        conn = sqlite3.connect(db_path, timeout=5.0)
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            # Closing the last connection also removes the WAL files
+            conn.close()
+        db_path = Path(db_path)
+        retire(cls.files(db_path) + [db_path.with_name(db_path.name + "-shm")])
+
+    def materialize_csv(self):
+        entries = {row['code']: row for row in self._rows(self.SELECT, ())}
+        with file_lock(self.lock_path):
+            self.event_log.materialize_csv(entries)
+        self.events_since_view = 0
+
+    def close(self):
+        self.materialize_csv()
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+    def _rows(self, sql, params):
+        cursor = self._connection().execute(sql, params)
+        return [dict(zip(CSV_FIELDS, (code, str(count), last_action, comment)))
+                for code, count, last_action, comment in cursor]
+
+
+def create_backend(name, csv_path, compact_every=1000):
+    csv_path = Path(csv_path)
+    if name == "sqlite":
+        return SQLiteBackend(csv_path.with_suffix(".db"), csv_path, compact_every)
+    if name not in (None, "eventlog"):
+        logging.warning(f"Unknown usage backend '{name}', using the event log")
+    return EventLogBackend(csv_path, compact_every)
 
 
 class CSVLogger:
-    def __init__(self, csv_path):
+    def __init__(self, csv_path, compact_every=1000, flush_interval=1.0, flush_batch=64, backend="eventlog",
+                 hourly_retention_days=14, daily_retention_days=730,
+                 history_segment_max_bytes=1_000_000, history_segment_max_hours=168, history_retention_days=730,
+                 live_counters=True):
         self.csv_log_path = Path(csv_path)
-        self.action_counts = defaultdict(int)
-        self.init_csv_log()
-        self.load_action_counts()
+        self.backend = create_backend(backend, self.csv_log_path, compact_every)
+        # History, rollups and live counters are opened on the storage thread (see _open_stores)
+        self.history_settings = dict(segment_max_bytes=history_segment_max_bytes,
+                                     segment_max_hours=history_segment_max_hours,
+                                     retention_days=history_retention_days)
+        self.rollup_settings = dict(hourly_retention_days=hourly_retention_days,
+                                    daily_retention_days=daily_retention_days)
+        self.live_counters = live_counters
+        self.history = None
+        self.rollups = None
+        self.live = None
+        self.entries = {}
+        # Bumped on every change to the in-memory usage data; reports cache on it
+        self.version = 0
+        # Ties an action to the completion of its run in the history
+        self.event_ids = itertools.count(1)
+        self.index = UsageIndex()
+        self.configured_comments = {}
+        self.lock = threading.Lock()
+        # Events applied in memory before the stored data finished loading
+        self.pending = []
+        self.loaded = threading.Event()
 
-    def init_csv_log(self):
-        if not self.csv_log_path.exists():
-            with open(self.csv_log_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerow(['code', 'count', 'last_action', 'comment'])
-            print(f"Created CSV log file at {self.csv_log_path}")
+        # All disk writes go through the storage actor; this object only
+        # keeps the in-memory counts used for the cheatsheet and cleanup.
+        # Loading runs on the actor thread too, so the caller never waits
+        # for it and nothing is written before it is done.
+        self.storage = StorageActor(self.backend, flush_interval=flush_interval, flush_batch=flush_batch,
+                                    on_start=self._load)
+        self.storage.start()
 
     def safe_int(self, value, default=0):
         """Safely convert a value to int, returning default if conversion fails"""
@@ -28,83 +300,204 @@ class CSVLogger:
         except (ValueError, TypeError):
             return default
 
-    def load_action_counts(self):
-        counts = defaultdict(int)
-        if self.csv_log_path.exists():
+    def _open_stores(self):
+        # Runs on the storage thread before its first write, so these modules
+        # are imported after the key listener has started, not before
+        from usage_history import UsageHistory
+        from usage_rollups import UsageRollups
+        self.history = UsageHistory.for_csv(self.csv_log_path, **self.history_settings)
+        self.rollups = UsageRollups.for_csv(self.csv_log_path, history=self.history, **self.rollup_settings)
+        self.storage.sinks.append(self.rollups)
+        if self.live_counters:
+            from live_counters import LiveCounters
             try:
-                with open(self.csv_log_path, 'r', newline='', encoding='utf-8') as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    for row in reader:
-                        if row['code']:
-                            # Use safe_int to handle empty or invalid count values
-                            counts[row['code']] = self.safe_int(row.get('count', 0))
+                # Live counts for other processes (sheet.py, status bar widgets), mapped from `<name>.live`
+                live = LiveCounters.for_csv(self.csv_log_path)
             except Exception as e:
-                logging.error(f"Error loading action counts: {e}")
-        self.action_counts = counts
+                logging.error(f"Error opening live counters, running without them: {e}")
+            else:
+                with self.lock:
+                    self.live = live
 
-    def log_action(self, code, comment=""):
+    def _load(self):
         try:
-            self.action_counts[code] += 1
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            existing_data = {}
-            if self.csv_log_path.exists():
-                with open(self.csv_log_path, 'r', newline='', encoding='utf-8') as csvfile:
-                    reader = csv.DictReader(csvfile)
-                    for row in reader:
-                        if row['code']:
-                            existing_data[row['code']] = row
-
-            existing_data[code] = {
-                'code': code,
-                'count': str(self.action_counts[code]),
-                'last_action': current_time,
-                'comment': comment
-            }
+            self._open_stores()
+        except Exception as e:
+            logging.error(f"Error opening usage history and rollups: {e}")
+        self.load_action_counts()
+        if self.rollups is not None:
+            try:
+                self.rollups.load()
+            except Exception as e:
+                logging.error(f"Error loading usage rollups: {e}")
+        self.loaded.set()
+
+    def wait_loaded(self, timeout=None):
+        """Block until the stored usage data is in memory"""
+        return self.loaded.wait(timeout)
+
+    def load_action_counts(self):
+        try:
+            entries = self.backend.load()
+        except Exception as e:
+            logging.error(f"Error loading action counts: {e}")
+            entries = {}
+        with self.lock:
+            for event in self.pending or ():
+                UsageEventLog.apply(entries, event)
+            self.pending = None
+            self.entries = entries
+            self.index.load(entries, lambda entry: self.safe_int(entry['count']))
+            self.index.set_configured(self.configured_comments)
+            self.version += 1
+            self._publish_live()
+
+    def _publish_live(self, code=None, epoch=None):
+        # Called with self.lock held. Nothing is published before the stored
+        # data is loaded, so readers never see partial counts.
+        if self.live is None or self.pending is not None:
+            return
+        try:
+            if code is None:
+                self.live.publish(self.entries)
+            else:
+                self.live.update(code, self.safe_int(self.entries[code]['count']), epoch)
+        except Exception as e:
+            logging.error(f"Error publishing live counters, disabling them: {e}")
+            self.live.close()
+            self.live = None
 
-            with open(self.csv_log_path, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=['code', 'count', 'last_action', 'comment'])
-                writer.writeheader()
-                for code_key in sorted(existing_data.keys()):
-                    writer.writerow(existing_data[code_key])
+    def set_configured_actions(self, actions):
+        """Tell the usage indexes which combos are configured ({code: action})"""
+        comments = {code: action.comment for code, action in actions.items()}
+        with self.lock:
+            self.configured_comments = comments
+            self.index.set_configured(comments)
+            self.version += 1
+
+    def log_action(self, code, comment=""):
+        """Count an action; returns an id to pass to log_completion() once its run ends"""
+        try:
+            epoch = time.time()
+            current_time = datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M:%S")
+            event = {"op": "action", "code": code, "ts": current_time, "epoch": round(epoch, 3), "comment": comment,
+                     "id": next(self.event_ids)}
+            with self.lock:
+                UsageEventLog.apply(self.entries, event)
+                if self.pending is not None:
+                    self.pending.append(event)
+                self.index.record(code)
+                self.version += 1
+                self._publish_live(code, epoch)
+                self.storage.submit(event)
 
             # Action logged silently to reduce console noise
+            return event["id"]
 
         except Exception as e:
-            logging.error(f"Error logging action to CSV: {e}")
+            logging.error(f"Error logging action: {e}")
+            return None
+
+    def log_completion(self, event_id, duration, status):
+        """Record how long the run of a logged action took and how it ended"""
+        if event_id is not None:
+            self.storage.submit({"op": "completion", "id": event_id, "duration": duration, "status": status})
+
+    def remove_entries(self, codes):
+        """Drop codes from the usage data; returns the entries that were removed"""
+        with self.lock:
+            removed = [self.entries[code] for code in codes if code in self.entries]
+            if not removed:
+                return []
+            event = {"op": "prune", "codes": [entry['code'] for entry in removed]}
+            UsageEventLog.apply(self.entries, event)
+            if self.pending is not None:
+                self.pending.append(event)
+            for entry in removed:
+                self.index.remove(entry['code'])
+            self.version += 1
+            self._publish_live()
+            self.storage.submit(event)
+        return removed
+
+    def rename_entries(self, renames):
+        """Move usage from old to new codes ({old: new}); returns the codes that moved"""
+        with self.lock:
+            moved = [[old, new] for old, new in renames.items() if old in self.entries]
+            if not moved:
+                return []
+            event = {"op": "rename", "renames": moved}
+            UsageEventLog.apply(self.entries, event)
+            if self.pending is not None:
+                self.pending.append(event)
+            # Renames only come with config reloads, so a rebuild is fine here
+            self.index.load(self.entries, lambda entry: self.safe_int(entry['count']))
+            self.index.set_configured(self.configured_comments)
+            self.version += 1
+            self._publish_live()
+            self.storage.submit(event)
+        return [old for old, _ in moved]
+
+    def flush(self, timeout=None):
+        return self.storage.flush(timeout)
+
+    def close(self, timeout=5.0):
+        """Flush pending events and close the backend (compacts and refreshes the CSV view)"""
+        self.storage.stop(timeout)
+        if self.history is not None:
+            self.history.close()
+        with self.lock:
+            if self.live is not None:
+                self.live.close()
 
     def get_action_count(self, code):
-        return self.action_counts.get(code, 0)
+        entry = self.entries.get(code)
+        return self.safe_int(entry['count']) if entry else 0
 
-    def get_stats(self):
-        if not self.csv_log_path.exists():
-            return []
+    def get_entries(self):
+        with self.lock:
+            return [dict(entry) for entry in self.entries.values()]
 
+    def _query(self, query, *args):
+        # Reports read from the backend, so make sure the last burst is in it
+        self.flush(timeout=2.0)
         try:
-            with open(self.csv_log_path, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                actions = list(reader)
-
-            # Use safe_int for sorting to handle empty or invalid count values
-            actions.sort(key=lambda x: self.safe_int(x.get('count')), reverse=True)
-            return actions
+            return query(*args)
         except Exception as e:
-            logging.error(f"Error reading CSV stats: {e}")
+            logging.error(f"Error reading usage stats: {e}")
             return []
 
-    def get_recent_actions(self):
-        """Get actions sorted by timestamp (most recent first)"""
-        if not self.csv_log_path.exists():
-            return []
+    def _rows(self, codes):
+        # Called with self.lock held
+        rows = []
+        for code in codes:
+            entry = self.entries.get(code)
+            if entry is not None:
+                rows.append(dict(entry))
+            else:
+                rows.append({'code': code, 'count': '0', 'last_action': 'Never',
+                             'comment': self.configured_comments.get(code, '')})
+        return rows
 
-        try:
-            with open(self.csv_log_path, 'r', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                actions = list(reader)
+    def get_logged_codes(self):
+        with self.lock:
+            return set(self.entries)
 
-            # Sort by last_action timestamp in descending order (most recent first)
-            actions.sort(key=lambda x: x.get('last_action', ''), reverse=True)
-            return actions
-        except Exception as e:
-            logging.error(f"Error reading CSV recent actions: {e}")
-            return []
\ No newline at end of file
+    def get_report_data(self, codes, limit=10, least_used_limit=8):
+        """Everything the console reports need, read from the in-memory indexes under one lock acquisition"""
+        with self.lock:
+            return {
+                'version': self.version,
+                'counts': {code: self.safe_int(self.entries[code]['count']) if code in self.entries else 0
+                           for code in codes},
+                'stats': self._rows(self.index.top(limit)),
+                'recent': self._rows(self.index.recent(limit)),
+                'least_used': self._rows(self.index.least_used(least_used_limit)),
+                'totals': (self.index.total, len(self.entries)),
+            }
+
+    def get_windowed_stats(self):
+        """Per-code usage over the last 24h/7d/30d with the previous window for trends"""
+        if self.rollups is None:
+            return []
+        return self._query(self.rollups.windowed_stats)
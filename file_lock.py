@@ -0,0 +1,21 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Hold an advisory flock on `path` (created if missing) for the duration of the block.
+
+    Writers take the lock exclusively; readers that need a consistent view of
+    several files (e.g. snapshot + log) take it shared.
+    """
+    path = Path(path)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
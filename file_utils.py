@@ -189,9 +189,10 @@ def organize_files_by_date(source_dir, destination_dir, copy_files=False):
     return organized
 
 
-def main():
+def main(argv=None):
     """Main function to handle command line arguments and operations"""
-    if len(sys.argv) < 2:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 1:
         print("Usage:")
         print("  python file_utils.py open <directory> [count] [file_extensions...]")
         print("  python file_utils.py organize <source_dir> <destination_dir> [--copy | --replace]")
@@ -211,12 +212,12 @@ def main():
         print("      based on the most recent file within them.")
         sys.exit(1)
     
-    operation = sys.argv[1].lower()
+    operation = argv[0].lower()
     
     if operation == "open":
-        handle_open_operation(sys.argv[2:])
+        handle_open_operation(argv[1:])
     elif operation == "organize":
-        handle_organize_operation(sys.argv[2:])
+        handle_organize_operation(argv[1:])
     else:
         print(f"Error: Unknown operation '{operation}'")
         print("Valid operations: open, organize")
@@ -0,0 +1,134 @@
+import ast
+import importlib.util
+import io
+import logging
+import sys
+import threading
+from pathlib import Path
+
+IN_PROCESS = "in_process"
+SUBPROCESS = "subprocess"
+ISOLATED = "isolated"
+FILE_COMMAND_MODES = (IN_PROCESS, SUBPROCESS, ISOLATED)
+
+
+def accepts_argv(path):
+    """Whether the script defines a top-level `main` that takes an argv argument"""
+    try:
+        tree = ast.parse(Path(path).read_text(encoding='utf-8'), filename=str(path))
+    except (OSError, SyntaxError, ValueError):
+        return False
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == "main":
+            return bool(node.args.args or node.args.vararg)
+    return False
+
+
+class _ThreadOutput:
+    """Stands in for sys.stdout/sys.stderr and sends a thread's writes to its own buffer, if it has one"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def _target(self):
+        return getattr(self.local, "buffer", None) or self.stream
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        return self._target().flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class HelperRunner:
+    """Runs file_command helper scripts inside the listener process.
+
+    A helper runs in-process if it defines `main(argv=None)`; argv is passed
+    explicitly instead of through sys.argv, so helpers can run in parallel.
+    Modules are imported once and re-imported when the file's mtime
+    changes. Each run gets its own thread with stdout and stderr captured
+    per thread, and the output is written in one piece when the run ends.
+    A run that outlives `timeout` is reported as failed and left to finish
+    in the background. Helpers without `main(argv)` return None from run(),
+    and the caller starts them as a subprocess as before.
+    """
+
+    def __init__(self, timeout=60.0):
+        self.timeout = timeout
+        # path -> (mtime, module or None if it cannot run in-process)
+        self.modules = {}
+        self.lock = threading.Lock()
+        self.output = None
+
+    def module(self, path):
+        """The helper's module, imported again if the file changed; None if it has no main(argv)"""
+        mtime = path.stat().st_mtime_ns
+        with self.lock:
+            cached = self.modules.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            module = None
+            if accepts_argv(path):
+                spec = importlib.util.spec_from_file_location(f"file_command_{path.stem}", path)
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+            self.modules[path] = (mtime, module)
+            return module
+
+    def _capture_output(self):
+        # Installed once, on the first in-process run; other threads write through unchanged
+        with self.lock:
+            if self.output is None:
+                self.output = (_ThreadOutput(sys.stdout), _ThreadOutput(sys.stderr))
+                sys.stdout, sys.stderr = self.output
+
+    def run(self, path, args, timeout=None):
+        """Run the helper's main(args); True/False for success, None if it must run as a subprocess"""
+        path = Path(path)
+        try:
+            module = self.module(path)
+        except Exception as e:
+            logging.error(f"Could not import {path.name}, running it as a subprocess: {e}")
+            with self.lock:
+                self.modules[path] = (path.stat().st_mtime_ns, None)
+            return None
+        if module is None:
+            return None
+
+        self._capture_output()
+        outcome = {}
+
+        def target():
+            buffer = io.StringIO()
+            for stream in self.output:
+                stream.local.buffer = buffer
+            try:
+                code = module.main(list(args))
+                outcome["ok"] = not code
+            except SystemExit as e:
+                outcome["ok"] = e.code in (None, 0)
+            except Exception as e:
+                logging.error(f"Error running {path.name}: {e}", exc_info=True)
+                outcome["ok"] = False
+            finally:
+                for stream in self.output:
+                    stream.local.buffer = None
+                outcome["output"] = buffer.getvalue()
+
+        thread = threading.Thread(target=target, name=f"file-command-{path.stem}", daemon=True)
+        thread.start()
+        thread.join(self.timeout if timeout is None else timeout)
+        if thread.is_alive():
+            logging.warning(f"{path.name} still running after {self.timeout if timeout is None else timeout}s; "
+                            f"leaving it to finish in the background")
+            return False
+
+        output = outcome.get("output")
+        if output:
+            self.output[0].stream.write(output)
+            self.output[0].stream.flush()
+        return outcome.get("ok", False)
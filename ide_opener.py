@@ -1,5 +1,6 @@
 import subprocess
 import os
+import sys
 
 class IDEOpener:
     def __init__(self):
@@ -25,16 +26,15 @@ class IDEOpener:
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"Failed to open {folder_path} in PyCharm: {e}")
 
-if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 3:
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
         print("Usage: python ide_opener.py <ide> <folder_path>")
         print("  ide: cursor or pycharm")
         sys.exit(1)
     
-    ide = sys.argv[1].lower()
-    folder_path = sys.argv[2]
+    ide = argv[0].lower()
+    folder_path = argv[1]
     
     opener = IDEOpener()
     
@@ -44,4 +44,8 @@ if __name__ == "__main__":
         opener.open_in_pycharm(folder_path)
     else:
         print(f"Unsupported IDE: {ide}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
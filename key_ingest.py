@@ -0,0 +1,116 @@
+import logging
+import queue
+import threading
+import time
+
+
+class KeyEventQueue:
+    """Hands keystrokes from the event tap callback to a processing thread.
+
+    The pynput callbacks only build a compact (pressed, char, modifier flag,
+    monotonic timestamp) tuple and put it on a SimpleQueue, which never
+    blocks the producer. Everything else - modifier tracking, combo matching,
+    logging and dispatch - runs on the processing thread via `handler`.
+
+    A watchdog thread samples queue depth, callback duration and processing
+    lag and logs a warning when the tap is falling behind, since macOS
+    disables an event tap whose callbacks are too slow.
+    """
+
+    def __init__(self, handler, modifier_flags, lag_warning_ms=250, callback_warning_ms=5,
+                 watchdog_interval=1.0):
+        self.handler = handler
+        self.modifier_flags = modifier_flags
+        self.lag_warning = lag_warning_ms / 1000.0
+        self.callback_warning = callback_warning_ms / 1000.0
+        self.watchdog_interval = watchdog_interval
+        self.events = queue.SimpleQueue()
+
+        # Written only by the callback thread
+        self.events_in = 0
+        self.callback_total = 0.0
+        self.callback_max = 0.0
+        # Written only by the processing thread
+        self.events_processed = 0
+        self.processing_since = None
+        self.max_queue_depth = 0
+
+        self.stop_event = threading.Event()
+        self.processor = threading.Thread(target=self._process, name="key-processor", daemon=True)
+        self.watchdog = threading.Thread(target=self._watch, name="key-watchdog", daemon=True)
+
+    def start(self):
+        self.processor.start()
+        self.watchdog.start()
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        self.events.put(None)
+        if self.processor.is_alive():
+            self.processor.join(timeout)
+
+    def on_press(self, key):
+        self._enqueue(key, True)
+
+    def on_release(self, key):
+        self._enqueue(key, False)
+
+    def _enqueue(self, key, pressed):
+        now = time.monotonic()
+        modifier = self.modifier_flags.get(key, 0)
+        if modifier:
+            self.events.put((pressed, None, modifier, now))
+        elif pressed:
+            char = getattr(key, 'char', None)
+            if char:
+                self.events.put((True, char, 0, now))
+            else:
+                return
+        else:
+            return
+        self.events_in += 1
+        elapsed = time.monotonic() - now
+        self.callback_total += elapsed
+        if elapsed > self.callback_max:
+            self.callback_max = elapsed
+
+    def _process(self):
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            depth = self.events.qsize()
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+            self.processing_since = event[3]
+            try:
+                self.handler(event)
+            except Exception as e:
+                logging.error(f"Error processing key event {event[:3]}: {e}", exc_info=True)
+            finally:
+                self.processing_since = None
+                self.events_processed += 1
+
+    def get_metrics(self):
+        events_in = self.events_in
+        processing_since = self.processing_since
+        return {
+            "events_in": events_in,
+            "events_processed": self.events_processed,
+            "queue_depth": self.events.qsize(),
+            "max_queue_depth": self.max_queue_depth,
+            "callback_avg_ms": (self.callback_total / events_in * 1000.0) if events_in else 0.0,
+            "callback_max_ms": self.callback_max * 1000.0,
+            "lag_ms": (time.monotonic() - processing_since) * 1000.0 if processing_since else 0.0,
+        }
+
+    def _watch(self):
+        last_reported_max = 0.0
+        while not self.stop_event.wait(self.watchdog_interval):
+            metrics = self.get_metrics()
+            if metrics["lag_ms"] > self.lag_warning * 1000.0:
+                logging.warning(f"Key processing is falling behind: {metrics['lag_ms']:.0f} ms lag, "
+                                f"{metrics['queue_depth']} events queued")
+            if self.callback_max > self.callback_warning and self.callback_max > last_reported_max:
+                last_reported_max = self.callback_max
+                logging.warning(f"Slow event tap callback: {metrics['callback_max_ms']:.2f} ms")
@@ -1,51 +1,75 @@
 import time
+from collections import deque
 from pynput import keyboard
+from combo_matcher import ComboMatcher
+
+MOD_CMD = 1
+MOD_SHIFT = 2
+MOD_OPTION = 4
+
+MODIFIER_FLAGS = {
+    keyboard.Key.cmd: MOD_CMD,
+    keyboard.Key.shift: MOD_SHIFT,
+    keyboard.Key.alt: MOD_OPTION,
+}
 
 
 class KeyTracker:
-    def __init__(self, combo_timeout=5.0, max_combo_length=3):
+    def __init__(self, combo_timeout=5.0, matcher=None):
         self.combo_timeout = combo_timeout
-        self.max_combo_length = max_combo_length
-        self.last_keys = []
-        self.last_key_times = []
+        self.matcher = matcher if matcher is not None else ComboMatcher()
+        self.state = ComboMatcher.ROOT
+        self.last_key_times = deque(maxlen=max(self.matcher.max_length, 1))
         self.cmd_pressed = False
         self.shift_pressed = False
         self.option_pressed = False
 
-    def cleanup_old_keys(self, current_time):
-        while (self.last_key_times and
-               current_time - self.last_key_times[0] > self.combo_timeout):
-            self.last_keys.pop(0)
-            self.last_key_times.pop(0)
+    def set_matcher(self, matcher):
+        """Switch to a rebuilt matcher; partial combos from the old one are dropped"""
+        if matcher is self.matcher:
+            return
+        self.matcher = matcher
+        self.last_key_times = deque(maxlen=max(matcher.max_length, 1))
+        self.state = ComboMatcher.ROOT
+
+    def add_key(self, char, timestamp=None):
+        """Advance the automaton by one key and return the completed combo, if any"""
+        current_time = time.monotonic() if timestamp is None else timestamp
+        last_key_times = self.last_key_times
 
-    def add_key(self, char):
-        current_time = time.time()
-        self.cleanup_old_keys(current_time)
+        if last_key_times and current_time - last_key_times[-1] > self.combo_timeout:
+            self.state = ComboMatcher.ROOT
 
-        self.last_keys.append(char)
-        self.last_key_times.append(current_time)
+        state = self.matcher.transitions[self.state].get(char, ComboMatcher.ROOT)
+        self.state = state
+        if state == ComboMatcher.ROOT:
+            return None
 
-        if len(self.last_keys) > self.max_combo_length:
-            self.last_keys.pop(0)
-            self.last_key_times.pop(0)
+        last_key_times.append(current_time)
+        # Longest combo first; a match only counts if all of its keys were
+        # typed within the timeout window
+        for combo in self.matcher.outputs[state]:
+            if current_time - last_key_times[-len(combo)] <= self.combo_timeout:
+                return combo
+        return None
 
     def get_current_combo(self):
-        return ''.join(self.last_keys)
+        return self.matcher.prefixes[self.state]
 
     def clear_combo(self):
-        self.last_keys.clear()
+        self.state = ComboMatcher.ROOT
         self.last_key_times.clear()
 
-    def set_modifier_state(self, key, pressed):
-        if key == keyboard.Key.cmd:
+    def set_modifier_state(self, modifier, pressed):
+        if modifier == MOD_CMD:
             self.cmd_pressed = pressed
-        elif key == keyboard.Key.shift:
+        elif modifier == MOD_SHIFT:
             self.shift_pressed = pressed
-        elif key == keyboard.Key.alt:
+        elif modifier == MOD_OPTION:
             self.option_pressed = pressed
 
     def backspace_combo(self, count):
         controller = keyboard.Controller()
         for _ in range(count):
             controller.press(keyboard.Key.backspace)
-            controller.release(keyboard.Key.backspace)
\ No newline at end of file
+            controller.release(keyboard.Key.backspace)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
-import subprocess
 import sys
+from script_library import run_script
 
 
 def send_keystroke(app_name, key, modifiers=None):
@@ -15,33 +15,23 @@ def send_keystroke(app_name, key, modifiers=None):
     if modifiers is None:
         modifiers = []
 
-    # Build the modifier string
-    modifier_str = ", ".join([f"{mod} down" for mod in modifiers])
-    modifier_clause = f" using {{{modifier_str}}}" if modifier_str else ""
-
-    # Build the AppleScript command
-    script = f'''
-    tell application "{app_name}" to activate
-    tell application "System Events" to keystroke "{key}"{modifier_clause}
-    '''
-
-    try:
-        subprocess.run(['osascript', '-e', script], check=True)
-        print(f"Sent {'+'.join(modifiers + [key])} to {app_name}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error: {e}")
+    result = run_script("keystroke", app_name, key, *modifiers)
+    if not result.ok:
+        print(f"Error: {result.error}")
         sys.exit(1)
+    print(f"Sent {'+'.join(modifiers + [key])} to {app_name}")
 
 
-def main():
-    if len(sys.argv) < 3:
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2:
         print("Usage: python keystroke.py <app_name> <key> [modifiers...]")
         print("Example: python keystroke.py 'Microsoft Outlook' 2 command option")
         sys.exit(1)
 
-    app_name = sys.argv[1]
-    key = sys.argv[2]
-    modifiers = sys.argv[3:] if len(sys.argv) > 3 else []
+    app_name = argv[0]
+    key = argv[1]
+    modifiers = argv[2:]
 
     send_keystroke(app_name, key, modifiers)
 
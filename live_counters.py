@@ -0,0 +1,251 @@
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from usage_merge import parse_last_action
+
+MAGIC = b"KLLIVE1\0"
+# magic, sequence, retired, capacity, used; padded to 64 bytes so the columns stay aligned
+HEADER = struct.Struct("=8sQIII36x")
+SEQUENCE_OFFSET = 8
+RETIRED_OFFSET = 16
+USED_OFFSET = 24
+CODE_SIZE = 32
+SLOT = struct.Struct("=Qd")
+MIN_CAPACITY = 64
+
+
+def publishable(code):
+    """Whether the writer can publish `code`: its UTF-8 form must fit in CODE_SIZE bytes"""
+    return len(code.encode('utf-8')) <= CODE_SIZE
+
+
+def _layout(capacity):
+    """Byte offsets of the code, count and last-used columns, and the file size"""
+    codes = HEADER.size
+    counts = codes + capacity * CODE_SIZE
+    last_used = counts + capacity * 8
+    return codes, counts, last_used, last_used + capacity * 8
+
+
+class LiveCounters:
+    """Publishes live usage counts into a fixed-layout, memory-mapped file.
+
+    The file is a 64-byte header followed by three fixed-width columns: the
+    combo code (UTF-8, NUL padded), its count (uint64) and its last use
+    (epoch seconds, float64). Slot i is the same index in every column;
+    slots are assigned in order and never move while the file is in use.
+
+    The header holds a sequence word used as a seqlock: the writer makes it
+    odd before changing anything and even again after, so a reader that
+    sees the same even value before and after reading has a consistent
+    snapshot. The listener is the only writer.
+
+    When a new code does not fit, or codes are pruned or renamed, a new file
+    is written next to it and swapped in with os.replace(); the old mapping
+    is then marked retired so readers know to map the new file.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.map = None
+        self.capacity = 0
+        self.slots = {}
+
+    @classmethod
+    def for_csv(cls, csv_path):
+        return cls(Path(csv_path).with_suffix(".live"))
+
+    def publish(self, entries):
+        """Lay out a fresh file with every entry ({code: CSV row}) and swap it in"""
+        values = {code: (self._count(entry), parse_last_action(entry.get('last_action')))
+                  for code, entry in entries.items()}
+        self._rewrite(values)
+
+    def update(self, code, count, last_used):
+        """Set one code's count and last use in place"""
+        if self.map is None:
+            return
+        slot = self.slots.get(code)
+        if slot is None:
+            if len(self.slots) >= self.capacity:
+                values = self.read_values()
+                values[code] = (count, last_used)
+                self._rewrite(values)
+                return
+            encoded = self._encode(code)
+            if encoded is None:
+                return
+            slot = len(self.slots)
+            with self._write():
+                self.map[self.codes_offset + slot * CODE_SIZE:self.codes_offset + (slot + 1) * CODE_SIZE] = encoded
+                self._set_slot(slot, count, last_used)
+                struct.pack_into("=I", self.map, USED_OFFSET, slot + 1)
+            self.slots[code] = slot
+            return
+        with self._write():
+            self._set_slot(slot, count, last_used)
+
+    def read_values(self):
+        """{code: (count, last_used)} as currently published by this writer"""
+        return {code: (struct.unpack_from("=Q", self.map, self.counts_offset + slot * 8)[0],
+                       struct.unpack_from("=d", self.map, self.last_used_offset + slot * 8)[0])
+                for code, slot in self.slots.items()}
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    @staticmethod
+    def _count(entry):
+        try:
+            return int(entry.get('count') or 0)
+        except ValueError:
+            return 0
+
+    @staticmethod
+    def _encode(code):
+        if not publishable(code):
+            logging.warning(f"Not publishing live count for {code!r}: longer than {CODE_SIZE} bytes")
+            return None
+        return code.encode('utf-8').ljust(CODE_SIZE, b"\0")
+
+    def _set_slot(self, slot, count, last_used):
+        struct.pack_into("=Q", self.map, self.counts_offset + slot * 8, count)
+        struct.pack_into("=d", self.map, self.last_used_offset + slot * 8, last_used)
+
+    def _write(self):
+        return _SequenceWrite(self.map)
+
+    def _rewrite(self, values):
+        encoded = [(code, self._encode(code), count, last_used) for code, (count, last_used) in values.items()]
+        encoded = [row for row in encoded if row[1] is not None]
+        capacity = MIN_CAPACITY
+        while capacity < len(encoded) * 2:
+            capacity *= 2
+        codes_offset, counts_offset, last_used_offset, size = _layout(capacity)
+
+        data = bytearray(size)
+        HEADER.pack_into(data, 0, MAGIC, 0, 0, capacity, len(encoded))
+        for slot, (_, code_bytes, count, last_used) in enumerate(encoded):
+            data[codes_offset + slot * CODE_SIZE:codes_offset + (slot + 1) * CODE_SIZE] = code_bytes
+            struct.pack_into("=Q", data, counts_offset + slot * 8, count)
+            struct.pack_into("=d", data, last_used_offset + slot * 8, last_used)
+
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+        old_map = self.map
+        with open(self.path, 'r+b') as f:
+            self.map = mmap.mmap(f.fileno(), size)
+        self.capacity = capacity
+        self.codes_offset, self.counts_offset, self.last_used_offset = codes_offset, counts_offset, last_used_offset
+        self.slots = {code: slot for slot, (code, _, _, _) in enumerate(encoded)}
+        if old_map is not None:
+            with _SequenceWrite(old_map):
+                struct.pack_into("=I", old_map, RETIRED_OFFSET, 1)
+            old_map.close()
+
+
+class _SequenceWrite:
+    """Makes the sequence word odd for the duration of a write"""
+
+    def __init__(self, mapped):
+        self.map = mapped
+
+    def __enter__(self):
+        sequence = struct.unpack_from("=Q", self.map, SEQUENCE_OFFSET)[0]
+        struct.pack_into("=Q", self.map, SEQUENCE_OFFSET, sequence + 1)
+
+    def __exit__(self, *exc):
+        sequence = struct.unpack_from("=Q", self.map, SEQUENCE_OFFSET)[0]
+        struct.pack_into("=Q", self.map, SEQUENCE_OFFSET, sequence + 1)
+
+
+class LiveCountersReader:
+    """Reads consistent snapshots of the live counters without parsing or locking.
+
+    The counts and last-use columns are memoryviews straight over the
+    mapping; codes are decoded once per slot. A snapshot is retried while
+    the writer is mid-update and remapped when the file has been replaced.
+    """
+
+    VIEWS = ("sequence", "header", "code_bytes", "counts", "last_used")
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.map = None
+        self.codes = []
+        for name in self.VIEWS:
+            setattr(self, name, None)
+
+    @classmethod
+    def for_csv(cls, csv_path):
+        return cls(Path(csv_path).with_suffix(".live"))
+
+    def _open(self):
+        self.close()
+        with open(self.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, _, capacity, _ = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{self.path} is not a live counters file")
+        codes_offset, counts_offset, last_used_offset, size = _layout(capacity)
+        view = memoryview(self.map)
+        self.sequence = view[SEQUENCE_OFFSET:SEQUENCE_OFFSET + 8].cast("Q")
+        self.header = view[RETIRED_OFFSET:USED_OFFSET + 4].cast("I")
+        self.code_bytes = view[codes_offset:counts_offset]
+        self.counts = view[counts_offset:last_used_offset].cast("Q")
+        self.last_used = view[last_used_offset:size].cast("d")
+        self.codes = []
+
+    def snapshot(self, retries=1000):
+        """{code: (count, last_used)}, or None if nothing has been published"""
+        for _ in range(retries):
+            if self.map is None:
+                if not self.path.exists():
+                    return None
+                self._open()
+            before = self.sequence[0]
+            if before & 1:
+                time.sleep(0)
+                continue
+            retired, _, used = self.header[0], self.header[1], self.header[2]
+            if retired:
+                self._open()
+                continue
+            while len(self.codes) < used:
+                slot = len(self.codes)
+                raw = bytes(self.code_bytes[slot * CODE_SIZE:(slot + 1) * CODE_SIZE])
+                self.codes.append(raw.rstrip(b"\0").decode('utf-8'))
+            values = dict(zip(self.codes[:used], zip(self.counts[:used], self.last_used[:used])))
+            if self.sequence[0] == before:
+                return values
+        raise TimeoutError(f"Could not read a consistent snapshot of {self.path}")
+
+    def version(self):
+        """The sequence word; changes whenever anything is published"""
+        if self.map is None:
+            if not self.path.exists():
+                return None
+            self._open()
+        if self.header[0]:
+            self._open()
+        return self.sequence[0]
+
+    def close(self):
+        if self.map is not None:
+            # After a bad header only the mapping exists, not the views over it
+            for name in self.VIEWS:
+                view = getattr(self, name)
+                if view is not None:
+                    view.release()
+                    setattr(self, name, None)
+            self.map.close()
+            self.map = None
@@ -1,114 +1,223 @@
+import atexit
 import os
 import logging
+import sys
+import threading
+import time
 from pathlib import Path
 from pynput import keyboard
 from config_manager import ConfigManager
+from config_snapshot import APP
+from config_watcher import ConfigWatcher
 from csv_logger import CSVLogger
 from csv_cleaner import CSVCleaner
-from key_tracker import KeyTracker
+from key_tracker import KeyTracker, MODIFIER_FLAGS
+from key_ingest import KeyEventQueue
 from command_executor import CommandExecutor
+from action_executor import ActionExecutor, ActionQueueFull, RUN_OK, RUN_FAILED
 from display_manager import DisplayManager
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-
 
 class MacKeyListener:
-    def __init__(self):
+    def __init__(self, profile=None):
         self.app_dir = Path(os.path.dirname(os.path.abspath(__file__)))
+        self.stopped = False
+        self.profile = profile
 
         # Initialize components
         self.config_manager = ConfigManager(self.app_dir / "config.json")
-        self.csv_logger = CSVLogger(self.app_dir / "key_listener_actions.csv")
+        self._mark("config loaded")
+        # Stored usage data loads on the storage thread; nothing here waits for it
+        self.csv_logger = CSVLogger(
+            self.app_dir / "key_listener_actions.csv",
+            compact_every=self.config_manager.get_setting("usage_compact_every", 1000),
+            flush_interval=self.config_manager.get_setting("usage_flush_interval_seconds", 1.0),
+            flush_batch=self.config_manager.get_setting("usage_flush_batch", 64),
+            backend=self.config_manager.get_setting("usage_backend", "eventlog"),
+            hourly_retention_days=self.config_manager.get_setting("rollup_hourly_retention_days", 14),
+            daily_retention_days=self.config_manager.get_setting("rollup_daily_retention_days", 730),
+            history_segment_max_bytes=self.config_manager.get_setting("history_segment_max_bytes", 1_000_000),
+            history_segment_max_hours=self.config_manager.get_setting("history_segment_max_hours", 168),
+            history_retention_days=self.config_manager.get_setting("history_retention_days", 730),
+            live_counters=self.config_manager.get_setting("live_counters", True)
+        )
+        self.csv_logger.set_configured_actions(self.config_manager.snapshot.actions)
         self.csv_cleaner = CSVCleaner(self.csv_logger, self.config_manager)
         self.key_tracker = KeyTracker(
             combo_timeout=self.config_manager.get_setting("combo_timeout_seconds", 5.0),
-            max_combo_length=3
+            matcher=self.config_manager.snapshot.matcher
+        )
+        # Installed in start_listening(), once keys are already being taken
+        self.script_runner = None
+        self.command_executor = CommandExecutor(
+            self.app_dir,
+            file_command_mode=self.config_manager.get_setting("file_command_mode", "in_process"),
+            file_command_timeout=self.config_manager.get_setting("file_command_timeout_seconds", 60.0),
+            isolated_workers=self.config_manager.get_setting("isolated_workers", 2),
+            isolated_worker_max_jobs=self.config_manager.get_setting("isolated_worker_max_jobs", 100),
+            isolated_worker_max_rss_growth_mb=self.config_manager.get_setting("isolated_worker_max_rss_growth_mb", 200)
+        )
+        self.action_executor = ActionExecutor(
+            self.command_executor,
+            workers=self.config_manager.get_setting("executor_workers", 4),
+            queue_size=self.config_manager.get_setting("executor_queue_size", 32),
+            overflow=self.config_manager.get_setting("executor_overflow", "drop"),
+            on_complete=self.on_run_complete
         )
-        self.command_executor = CommandExecutor(self.app_dir)
         self.display_manager = DisplayManager(self.config_manager, self.csv_logger)
 
-        # Clean up CSV file on startup
-        self.csv_cleaner.cleanup_outdated_entries()
-
-        # Initialize keyboard listener
-        self.listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
+        # Clean up CSV file in the background; startup does not wait for it
+        self.csv_cleaner.schedule(self.config_manager.snapshot)
 
-    def on_press(self, key):
-        try:
-            if key in [keyboard.Key.cmd, keyboard.Key.shift, keyboard.Key.alt]:
-                self.key_tracker.set_modifier_state(key, True)
-            elif hasattr(key, 'char') and key.char:
-                self.key_tracker.add_key(key.char)
-
-                # Check for custom combos
-                combo = self.key_tracker.get_current_combo()
-                custom_combo_keys = self.config_manager.get_custom_combo_keys()
-
-                if combo in custom_combo_keys:
-                    backspace_custom_combo = self.config_manager.get_setting("backspace_custom_combo", True)
-                    if backspace_custom_combo:
-                        self.key_tracker.backspace_combo(len(combo))
-                    self.handle_key_combo(combo)
-                    self.key_tracker.clear_combo()
-
-                # Check for cmd+ combos
-                if self.key_tracker.cmd_pressed and key.char:
-                    if not self.key_tracker.shift_pressed and not self.key_tracker.option_pressed:
-                        self.handle_key_combo(f"cmd+{key.char}")
-                    else:
-                        # Shift+Cmd combination not configured - skip silently
-                        pass
-
-        except Exception as e:
-            logging.error(f"Error handling key {key}: {str(e)}", exc_info=True)
-
-    def on_release(self, key):
-        if key in [keyboard.Key.cmd, keyboard.Key.shift, keyboard.Key.alt]:
-            self.key_tracker.set_modifier_state(key, False)
+        # Config changes are picked up off the key path
+        self.config_watcher = ConfigWatcher(
+            self.config_manager,
+            interval=self.config_manager.get_setting("config_poll_interval_seconds", 1.0)
+        )
+        self.config_watcher.add_listener(self.on_config_reload)
 
-    def handle_key_combo(self, key_combo):
-        # Check for config updates
-        config_updated = self.config_manager.check_for_updates()
+        # The event tap callbacks only enqueue; keys are processed on a separate thread
+        self.key_events = KeyEventQueue(
+            self.process_key_event,
+            MODIFIER_FLAGS,
+            lag_warning_ms=self.config_manager.get_setting("key_lag_warning_ms", 250)
+        )
 
-        if config_updated:
-            # Update key tracker timeout if config changed
-            self.key_tracker.combo_timeout = self.config_manager.get_setting("combo_timeout_seconds", 5.0)
-            # Clean up CSV file when config is updated
-            self.csv_cleaner.cleanup_outdated_entries()
-            self.display_manager.print_cheatsheet()
+        # Initialize keyboard listener
+        self.listener = keyboard.Listener(on_press=self.key_events.on_press, on_release=self.key_events.on_release)
+        self._mark("components created")
+
+    def _mark(self, phase):
+        if self.profile is not None:
+            self.profile.mark(phase)
+
+    def process_key_event(self, event):
+        pressed, char, modifier, timestamp = event
+        if modifier:
+            self.key_tracker.set_modifier_state(modifier, pressed)
+            return
+
+        snapshot = self.config_manager.snapshot
+        self.key_tracker.set_matcher(snapshot.matcher)
+
+        # Check for custom combos
+        combo = self.key_tracker.add_key(char, timestamp)
+
+        if combo is not None:
+            backspace_custom_combo = snapshot.settings.get("backspace_custom_combo", True)
+            if backspace_custom_combo:
+                self.key_tracker.backspace_combo(len(combo))
+            self.handle_key_combo(combo)
+            self.key_tracker.clear_combo()
+
+        # Check for cmd+ combos
+        if self.key_tracker.cmd_pressed:
+            if not self.key_tracker.shift_pressed and not self.key_tracker.option_pressed:
+                action = snapshot.cmd_actions.get(char)
+                if action is not None:
+                    self.handle_key_combo(action.code)
+            else:
+                # Shift+Cmd combination not configured - skip silently
+                pass
+
+    def on_config_reload(self, snapshot):
+        # Runs on the watcher thread; the key tracker picks up the new
+        # matcher itself on the next keystroke
+        self.key_tracker.combo_timeout = snapshot.get_setting("combo_timeout_seconds", 5.0)
+        # Prune/rename usage for the combos that changed, in the background
+        self.csv_logger.set_configured_actions(snapshot.actions)
+        self.csv_cleaner.schedule(snapshot)
+        self.display_manager.print_cheatsheet()
 
+    def handle_key_combo(self, key_combo):
         # Only process configured shortcuts
-        if self.config_manager.is_configured_shortcut(key_combo):
-            # Get comment for logging
-            comment = self.display_manager.get_action_comment(key_combo)
-
-            # Log the action
-            self.csv_logger.log_action(key_combo, comment)
-
-            # Execute the action
-            apps = self.config_manager.get_apps()
-            commands = self.config_manager.get_commands()
-
-            if key_combo in apps:
-                self.command_executor.open_app(apps[key_combo])
-            elif key_combo in commands:
-                self.command_executor.run_commands(commands[key_combo], key_combo)
+        action = self.config_manager.snapshot.actions.get(key_combo)
+        if action is not None:
+            self.handle_action(action)
+
+    def handle_action(self, action):
+        # Log the action
+        event_id = self.csv_logger.log_action(action.code, action.comment)
+
+        # Execute the action
+        if action.kind == APP:
+            started = time.monotonic()
+            opened = self.command_executor.open_app(action.target)
+            self.csv_logger.log_completion(event_id, time.monotonic() - started, RUN_OK if opened else RUN_FAILED)
+        else:
+            try:
+                self.action_executor.submit(action.code, action.target, action.policy, tag=event_id)
+            except ActionQueueFull as e:
+                logging.warning(str(e))
+
+    def on_run_complete(self, event_id, key_combo, duration, status):
+        # Called by the executor with its lock held; this only queues a write
+        self.csv_logger.log_completion(event_id, duration, status)
+
+    def start_listening(self):
+        """Start taking keystrokes; everything else happens on background threads"""
+        self.key_events.start()
+        self.listener.start()
+        self.config_watcher.start()
+        # AppleScript goes to one long-lived osascript worker instead of a new
+        # process per script; start it now so the first action does not wait for it
+        if sys.platform == "darwin" and self.config_manager.get_setting("persistent_osascript", True):
+            import script_runner
+            self.script_runner = script_runner.PersistentScriptRunner(
+                timeout=self.config_manager.get_setting("osascript_timeout_seconds", 30.0),
+                workers=self.config_manager.get_setting("osascript_workers", 2))
+            script_runner.set_runner(self.script_runner)
+            self.script_runner.start()
+        self.command_executor.start()
+        # Make sure buffered usage data reaches disk however the process exits
+        atexit.register(self.shutdown)
+
+    def print_startup_reports(self):
+        self.csv_logger.wait_loaded()
+        self.display_manager.print_startup_summary()
+        print("\nPress Ctrl+C to exit.")
 
     def start(self):
         print(f"MacKeyListener started. Using config: {self.config_manager.config_path}")
-        print(f"CSV logging to: {self.csv_logger.csv_log_path}")
-        print("Config auto-reload enabled - changes will be detected on next key press")
-        self.display_manager.print_cheatsheet()
-        self.display_manager.print_csv_stats()
-        self.display_manager.print_recent_commands()
-        self.display_manager.print_least_used_commands()
-        print("\nPress Ctrl+C to exit.")
+        print(f"Usage logging to: {self.csv_logger.backend.path} (CSV view: {self.csv_logger.csv_log_path})")
+        print("Config auto-reload enabled - changes are picked up in the background")
 
-        with self.listener as listener:
-            try:
-                listener.join()
-            except KeyboardInterrupt:
-                print("\nMacKeyListener stopped.")
-                print("Final usage statistics:")
-                self.display_manager.print_csv_stats()
-                self.display_manager.print_recent_commands()
\ No newline at end of file
+        self.start_listening()
+        # Reports need the stored usage data, which is still loading
+        threading.Thread(target=self.print_startup_reports, name="startup-reports", daemon=True).start()
+
+        try:
+            self.listener.join()
+        except KeyboardInterrupt:
+            print("\nMacKeyListener stopped.")
+            print("Final usage statistics:")
+            self.display_manager.print_shutdown_summary()
+        finally:
+            self.listener.stop()
+            self.shutdown()
+
+    def profile_startup(self):
+        """Start up as usual, report how long each phase took, then stop"""
+        self.start_listening()
+        self.listener.wait()
+        self._mark("listening for keys")
+        self.csv_logger.wait_loaded()
+        self._mark("usage data loaded")
+        self.listener.stop()
+        self.shutdown()
+        self._mark("shut down")
+        print(self.profile.report())
+
+    def shutdown(self):
+        """Stop background threads and flush usage data; safe to call more than once"""
+        if self.stopped:
+            return
+        self.stopped = True
+        self.key_events.stop(timeout=2.0)
+        self.config_watcher.stop(timeout=2.0)
+        self.csv_cleaner.stop(timeout=2.0)
+        self.action_executor.shutdown(wait=True, timeout=2.0)
+        if self.script_runner is not None:
+            self.script_runner.close()
+        self.command_executor.close()
+        self.csv_logger.close()
\ No newline at end of file
@@ -3,8 +3,39 @@
 MacKeyListener - A configurable keyboard shortcut manager for macOS
 """
 
-from mac_key_listener import MacKeyListener
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import logging
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Configurable keyboard shortcut manager for macOS")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="time each startup phase up to the first keystroke, then exit")
+    parser.add_argument("--debug", action="store_true", help="log at DEBUG level")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+
+    profile = None
+    if args.startup_profile:
+        from startup_profile import StartupProfile
+        profile = StartupProfile(STARTED)
+
+    from mac_key_listener import MacKeyListener
+    if profile is not None:
+        profile.mark("imports")
+
+    mac_listener = MacKeyListener(profile=profile)
+    if profile is not None:
+        mac_listener.profile_startup()
+    else:
+        mac_listener.start()
+
 
 if __name__ == "__main__":
-    mac_listener = MacKeyListener()
-    mac_listener.start()
+    main()
@@ -1,6 +1,6 @@
-import subprocess
 import sys
 import time
+from script_library import run_script
 
 
 def find_note_by_name(note_name):
@@ -10,38 +10,11 @@ def find_note_by_name(note_name):
     Args:
         note_name (str): The name of the note to search for
     """
-    # AppleScript to open Notes and search for the specified note
-    applescript = f'''
-    tell application "Notes"
-        activate
-        delay 0.5
+    # Open Notes, search for the note and show the first match
+    result = run_script("notes_find", note_name)
+    print(result.output)
 
-        -- Use search functionality
-        tell application "System Events"
-            keystroke "f" using command down
-            delay 0.3
-            keystroke "{note_name}"
-            delay 1
-        end tell
-
-        -- Try to find the note in the current account
-        set foundNotes to notes where name contains "{note_name}"
-
-        if length of foundNotes > 0 then
-            set targetNote to item 1 of foundNotes
-            show targetNote
-            return "Note found: " & name of targetNote
-        else
-            return "No note found with name containing: {note_name}"
-        end if
-    end tell
-    '''
-
-    # Execute the AppleScript and capture the output
-    result = subprocess.run(["osascript", "-e", applescript], capture_output=True, text=True)
-    print(result.stdout.strip())
-
-    if "No note found" in result.stdout:
+    if not result.ok or "No note found" in result.output:
         return False
     return True
 
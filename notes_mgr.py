@@ -1,10 +1,10 @@
 #!/usr/bin/env python3
 
-import subprocess
 import datetime
 import sys
 import time
 import argparse
+from script_library import run_script
 
 
 class NotesManager:
@@ -16,19 +16,20 @@ class NotesManager:
         if sys.platform != "darwin":
             raise SystemError("This script only works on macOS")
 
-    def _run_applescript(self, script):
-        """Execute an AppleScript and return the result.
+    def _run_applescript(self, name, *args):
+        """Execute one of the AppleScript templates and return the result.
 
         Args:
-            script (str): The AppleScript to execute
+            name (str): The template in applescripts/ to run
+            *args (str): Arguments passed to the template's run handler
 
         Returns:
             str: The output of the AppleScript
         """
-        result = subprocess.run(["osascript", "-e", script], capture_output=True, text=True)
-        if result.stderr:
-            print(f"AppleScript Error: {result.stderr}")
-        return result.stdout.strip()
+        result = run_script(name, *args)
+        if result.error:
+            print(f"AppleScript Error: {result.error}")
+        return result.output
 
     def find_note(self, note_name):
         """Find a note by name.
@@ -41,33 +42,7 @@ class NotesManager:
         """
         print(f"Searching for note: '{note_name}'")
 
-        applescript = f'''
-        tell application "Notes"
-            activate
-            delay 0.5
-
-            -- Use search functionality
-            tell application "System Events"
-                keystroke "f" using command down
-                delay 0.3
-                keystroke "{note_name}"
-                delay 1
-            end tell
-
-            -- Try to find the note in the current account
-            set foundNotes to notes where name contains "{note_name}"
-
-            if length of foundNotes > 0 then
-                set targetNote to item 1 of foundNotes
-                show targetNote
-                return "Note found: " & name of targetNote
-            else
-                return "No note found with name containing: {note_name}"
-            end if
-        end tell
-        '''
-
-        result = self._run_applescript(applescript)
+        result = self._run_applescript("notes_find", note_name)
         print(result)
         return "No note found" not in result
 
@@ -86,24 +61,8 @@ class NotesManager:
 
         print(f"Creating new note with title: '{title}'")
 
-        # Escape double quotes in content and title
-        content = content.replace('"', '\\"')
-        title = title.replace('"', '\\"')
-
-        applescript = f'''
-        tell application "Notes"
-            activate
-            delay 0.5
-
-            -- Create a new note
-            set newNote to make new note with properties {{body:"{title}\\n{content}"}}
-            show newNote
-
-            return "Note created: " & name of newNote
-        end tell
-        '''
-
-        result = self._run_applescript(applescript)
+        # Title and content are passed as arguments, so quotes need no escaping
+        result = self._run_applescript("notes_create", title, content)
         print(result)
         return "Note created" in result
 
@@ -119,26 +78,8 @@ class NotesManager:
         """
         print(f"Appending to note: '{note_name}'")
 
-        # Escape double quotes in content and note_name
-        content = content.replace('"', '\\"')
-        note_name = note_name.replace('"', '\\"')
-
-        applescript = f'''
-        tell application "Notes"
-            set foundNotes to notes where name contains "{note_name}"
-
-            if length of foundNotes > 0 then
-                set targetNote to item 1 of foundNotes
-                set body of targetNote to (body of targetNote) & "\\n{content}"
-                show targetNote
-                return "Content appended to note: " & name of targetNote
-            else
-                return "No note found with name containing: {note_name}"
-            end if
-        end tell
-        '''
-
-        result = self._run_applescript(applescript)
+        # Note name and content are passed as arguments, so quotes need no escaping
+        result = self._run_applescript("notes_append", note_name, content)
         print(result)
         return "Content appended" in result
 
@@ -159,7 +100,7 @@ class NotesManager:
             return ""
 
 
-def main():
+def main(argv=None):
     """Main function to parse arguments and call appropriate methods."""
     parser = argparse.ArgumentParser(description="Manage notes in the macOS Notes app")
 
@@ -182,7 +123,7 @@ def main():
     append_parser.add_argument("--content", help="Content to append")
     append_parser.add_argument("--file", help="File containing content to append")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Initialize the NotesManager
     manager = NotesManager()
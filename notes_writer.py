@@ -1,29 +1,23 @@
-import subprocess
 import datetime
 import time
+from script_library import run_script
 
 
 def open_notes_and_create_note():
     # Get today's date in the specified format
     today = datetime.datetime.now().strftime("%B %d, %Y")
 
-    # AppleScript to open Notes and create a new note with today's date
-    applescript = f'''
-    tell application "Notes"
-        activate
-        delay 1
-        tell application "System Events"
-            keystroke "n" using command down
-            delay 0.5
-            keystroke "{today}"
-        end tell
-    end tell
-    '''
-
-    # Execute the AppleScript
-    subprocess.run(["osascript", "-e", applescript])
+    # Open Notes, start a new note and type today's date into it
+    result = run_script("notes_type_new", today)
+    if not result.ok:
+        print(f"AppleScript error: {result.error}")
+        return
     print(f"Created new note with date: {today}")
 
 
+def main(argv=None):
+    open_notes_and_create_note()
+
+
 if __name__ == "__main__":
-    open_notes_and_create_note()
\ No newline at end of file
+    main()
\ No newline at end of file
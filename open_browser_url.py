@@ -1,12 +1,10 @@
 #!/usr/bin/env python3
 
 import sys
-import subprocess
-import socket
 import urllib.parse
-from urllib.request import urlopen
-from urllib.error import URLError
 import time
+from readiness import http_status, port_open
+from script_library import run_script
 
 
 def check_url_availability(url):
@@ -17,42 +15,25 @@ def check_url_availability(url):
         hostname = parsed_url.hostname
         port = parsed_url.port or (443 if parsed_url.scheme == 'https' else 80)
 
-        # First try a quick socket connection
-        try:
-            with socket.create_connection((hostname, port), timeout=1) as sock:
-                return True
-        except (socket.timeout, socket.error):
-            # If socket connection fails, try a full HTTP request
-            try:
-                with urlopen(url, timeout=2) as response:
-                    return response.status == 200
-            except URLError:
-                return False
+        # First try a quick socket connection, then a full HTTP request
+        return port_open(hostname, port, timeout=1) or http_status(url, timeout=2) == 200
     except Exception:
         return False
 
 
 def open_or_focus_browser_url(url):
     """Open or focus on a URL in Google Chrome."""
-    # Use a simpler approach that just opens the URL without tab searching
-    # This avoids the AppleScript syntax issues with URL property access
-    applescript = f'''
-    tell application "Google Chrome"
-        activate
-        open location "{url}"
-    end tell
-    '''
+    result = run_script("chrome_open_location", url)
+    if not result.ok:
+        print(f"AppleScript error: {result.error}")
 
-    subprocess.run(["osascript", "-e", applescript])
 
-
-def main():
-    if len(sys.argv) < 2:
-        print(f"Usage: {sys.argv[0]} <url1> [url2] [url3] ...")
+def main(argv=None):
+    urls = sys.argv[1:] if argv is None else argv
+    if len(urls) < 1:
+        print("Usage: open_browser_url.py <url1> [url2] [url3] ...")
         sys.exit(1)
 
-    urls = sys.argv[1:]
-
     # If only one URL is provided, open it directly without checking
     if len(urls) == 1:
         open_or_focus_browser_url(urls[0])
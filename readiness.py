@@ -0,0 +1,173 @@
+import os
+import re
+import socket
+import subprocess
+import time
+
+DEFAULT_TIMEOUT = 60.0
+FIRST_INTERVAL = 0.1
+MAX_INTERVAL = 2.0
+
+
+def port_open(hostname, port, timeout=1.0):
+    """Whether something accepts TCP connections on hostname:port"""
+    try:
+        with socket.create_connection((hostname, port), timeout=timeout):
+            return True
+    except (socket.timeout, OSError):
+        return False
+
+
+def http_status(url, timeout=2.0):
+    """The HTTP status `url` answers with, or None if it cannot be reached"""
+    # Imported here: urllib.request is slow to import and only HTTP probes need it
+    from urllib.error import HTTPError, URLError
+    from urllib.request import urlopen
+    try:
+        with urlopen(url, timeout=timeout) as response:
+            return response.status
+    except HTTPError as e:
+        return e.code
+    except (URLError, OSError, ValueError):
+        return None
+
+
+class PortProbe:
+    def __init__(self, port, host="localhost"):
+        self.port = int(port)
+        self.host = host
+
+    def check(self):
+        return port_open(self.host, self.port)
+
+    def __str__(self):
+        return f"port {self.host}:{self.port}"
+
+
+class HttpProbe:
+    def __init__(self, url, status=200):
+        if not isinstance(status, int) or isinstance(status, bool):
+            raise ValueError(f"status must be an integer, got {status!r}")
+        self.url = url
+        self.status = status
+
+    def check(self):
+        return http_status(self.url) == self.status
+
+    def __str__(self):
+        return f"HTTP {self.status} from {self.url}"
+
+
+class FileProbe:
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+
+    def check(self):
+        return os.path.exists(self.path)
+
+    def __str__(self):
+        return f"file {self.path}"
+
+
+class ProcessProbe:
+    def __init__(self, pattern):
+        self.pattern = pattern
+
+    def check(self):
+        # Matches against full command lines, so "uvicorn app:main" finds a python process
+        try:
+            return subprocess.run(["pgrep", "-f", self.pattern], capture_output=True, timeout=5).returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+
+    def __str__(self):
+        return f"process {self.pattern!r}"
+
+
+class ITermProbe:
+    def __init__(self, pattern):
+        self.pattern = re.compile(pattern)
+
+    def check(self):
+        from script_library import run_script
+        result = run_script("iterm_tab_text", timeout=5)
+        return result.ok and self.pattern.search(result.output) is not None
+
+    def __str__(self):
+        return f"iTerm output matching {self.pattern.pattern!r}"
+
+
+# wait_for key -> (probe class, other keys it takes)
+PROBES = {
+    "port": (PortProbe, ("host",)),
+    "http": (HttpProbe, ("status",)),
+    "file": (FileProbe, ()),
+    "process": (ProcessProbe, ()),
+    "iterm": (ITermProbe, ()),
+}
+
+
+def parse_wait_for(spec):
+    """(probe, timeout) pairs for a step's `wait_for`: one condition object or a list of them.
+
+    Each condition names one probe and may add a `timeout` in seconds:
+    {"port": 8002}, {"port": 5432, "host": "db.local"},
+    {"http": "http://localhost:8002/health", "status": 200},
+    {"file": "~/tmp/ready"}, {"process": "uvicorn"}, {"iterm": "Listening on"}.
+    Raises ValueError for anything else.
+    """
+    conditions = spec if isinstance(spec, list) else [spec]
+    probes = []
+    for condition in conditions:
+        if not isinstance(condition, dict):
+            raise ValueError(f"wait_for conditions must be objects, got {condition!r}")
+        kinds = [kind for kind in PROBES if kind in condition]
+        if len(kinds) != 1:
+            raise ValueError(f"wait_for condition {condition!r} must have exactly one of: {', '.join(PROBES)}")
+        probe_class, options = PROBES[kinds[0]]
+        unknown = set(condition) - {kinds[0], "timeout", *options}
+        if unknown:
+            raise ValueError(f"wait_for condition {condition!r} has unknown keys: {', '.join(sorted(unknown))}")
+        try:
+            probe = probe_class(condition[kinds[0]], **{key: condition[key] for key in options if key in condition})
+            timeout = condition.get("timeout", DEFAULT_TIMEOUT)
+            if not isinstance(timeout, (int, float)) or isinstance(timeout, bool) or not timeout >= 0:
+                raise ValueError(f"timeout must be a number of seconds >= 0, got {timeout!r}")
+        except (TypeError, ValueError, re.error) as e:
+            raise ValueError(f"bad wait_for condition {condition!r}: {e}")
+        probes.append((probe, float(timeout)))
+    return probes
+
+
+class ReadinessWait:
+    """Polls a step's wait_for conditions until they all hold or one runs out of time.
+
+    Conditions that held once are not checked again. Between polls the
+    caller waits next_delay(), which starts at FIRST_INTERVAL and doubles
+    up to MAX_INTERVAL, never past the nearest deadline.
+    """
+
+    def __init__(self, spec):
+        self.started = time.monotonic()
+        self.pending = [(probe, self.started + timeout) for probe, timeout in parse_wait_for(spec)]
+        self.interval = FIRST_INTERVAL
+
+    def poll(self):
+        """Check the conditions still pending; True once none are"""
+        self.pending = [(probe, deadline) for probe, deadline in self.pending if not probe.check()]
+        return not self.pending
+
+    def expired(self):
+        """The pending conditions whose timeout has passed"""
+        now = time.monotonic()
+        return [probe for probe, deadline in self.pending if deadline <= now]
+
+    def next_delay(self):
+        delay = self.interval
+        self.interval = min(self.interval * 2, MAX_INTERVAL)
+        if self.pending:
+            delay = min(delay, max(min(deadline for _, deadline in self.pending) - time.monotonic(), 0))
+        return delay
+
+    def elapsed(self):
+        return time.monotonic() - self.started
@@ -0,0 +1,226 @@
+import logging
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+CHEATSHEET = "cheatsheet"
+STATS = "stats"
+RECENT = "recent"
+LEAST_USED = "least_used"
+TRENDS = "trends"
+GLOBAL = "global"
+
+STARTUP_REPORTS = (CHEATSHEET, STATS, GLOBAL, RECENT, LEAST_USED, TRENDS)
+SHUTDOWN_REPORTS = (STATS, RECENT)
+
+
+class ReportEngine:
+    """Renders the console reports from one config snapshot and one usage capture.
+
+    Stale views are built together from data read once, and the rendered
+    text is cached per (config version, usage version). The trends view is
+    also keyed by the hour, because its windows move with time, and the
+    global view by the merged usage file, which `usage_merge.py merge`
+    rewrites from outside; it only reads that one small file. A summary
+    with nothing new is a dict lookup, and each write() makes a single
+    buffered write to the output stream.
+    """
+
+    def __init__(self, config_manager, csv_logger, out=None, limit=10, least_used_limit=8):
+        self.config_manager = config_manager
+        self.csv_logger = csv_logger
+        self.out = out
+        self.limit = limit
+        self.least_used_limit = least_used_limit
+        # usage_merge and usage_rollups are imported where they are used: no
+        # report renders before the key listener is up
+        self.merged_path = None
+        self.merged = (None, None)
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.renderers = {
+            CHEATSHEET: self._render_cheatsheet,
+            STATS: self._render_stats,
+            RECENT: self._render_recent,
+            LEAST_USED: self._render_least_used,
+            TRENDS: self._render_trends,
+            GLOBAL: self._render_global,
+        }
+
+    def _key(self, view, config_version, usage_version, now, merged_stamp):
+        if view == TRENDS:
+            from usage_rollups import hour_bucket
+            return config_version, usage_version, hour_bucket(now)
+        if view == GLOBAL:
+            return config_version, usage_version, merged_stamp
+        return config_version, usage_version
+
+    def _merged_stamp(self):
+        if self.merged_path is None:
+            from usage_merge import merged_path
+            self.merged_path = merged_path(self.csv_logger.csv_log_path)
+        try:
+            return self.merged_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _merged_counters(self, stamp):
+        """The merged usage of every host, re-read only when the file changes"""
+        if stamp is None:
+            return None
+        if self.merged[0] != stamp:
+            from usage_merge import UsageCounters
+            try:
+                self.merged = (stamp, UsageCounters.load(self.merged_path))
+            except (OSError, ValueError) as e:
+                logging.error(f"Error reading merged usage from {self.merged_path}: {e}")
+                self.merged = (stamp, None)
+        return self.merged[1]
+
+    def render(self, views):
+        with self.lock:
+            snapshot = self.config_manager.snapshot
+            now = time.time()
+            merged_stamp = self._merged_stamp() if GLOBAL in views else None
+            stale = [view for view in views
+                     if self.cache.get(view, (None,))[0] != self._key(view, snapshot.version, self.csv_logger.version,
+                                                                     now, merged_stamp)]
+            if stale:
+                data = self.csv_logger.get_report_data(snapshot.actions, self.limit, self.least_used_limit)
+                if TRENDS in stale:
+                    data['windowed'] = [row for row in self.csv_logger.get_windowed_stats() if row['30d']]
+                if GLOBAL in stale:
+                    data['merged'] = self._merged_counters(merged_stamp)
+                for view in stale:
+                    lines = []
+                    self.renderers[view](lines, snapshot, data)
+                    key = self._key(view, snapshot.version, data['version'], now, merged_stamp)
+                    self.cache[view] = (key, "\n".join(lines) + "\n" if lines else "")
+            return "".join(self.cache[view][1] for view in views)
+
+    def write(self, *views):
+        out = self.out or sys.stdout
+        out.write(self.render(views))
+        out.flush()
+
+    @staticmethod
+    def _comment(snapshot, code):
+        action = snapshot.actions.get(code)
+        return action.comment if action is not None else ""
+
+    @staticmethod
+    def _usage_rows(lines, actions):
+        lines.append(f"{'Code':<12} {'Count':<8} {'Last Used':<20} {'Comment'}")
+        lines.append("-" * 60)
+        for action in actions:
+            if action['code']:
+                lines.append(f"{action['code']:<12} {action['count']:<8} {action['last_action']:<20} {action['comment'][:25]}")
+
+    @staticmethod
+    def _title(lines, title, width=60):
+        lines.extend(["", "=" * width, title.center(width), "=" * width])
+
+    def _render_cheatsheet(self, lines, snapshot, data):
+        self._title(lines, "MacKeyListener Cheatsheet", 50)
+        counts = data['counts']
+
+        backspace_combo = snapshot.get_setting("backspace_custom_combo", True)
+        combo_timeout = snapshot.get_setting("combo_timeout_seconds", 5.0)
+
+        lines.append("\nSettings:")
+        lines.append(f"  Backspace Custom Combo: {'Yes' if backspace_combo else 'No'}")
+        lines.append(f"  Combo Timeout: {combo_timeout} seconds")
+
+        lines.append("\nConfigured App Shortcuts:")
+        for key, app in snapshot.apps.items():
+            lines.append(f"  {key:<10} : {Path(app).stem} ({counts.get(key, 0)})")
+
+        lines.append("\nShortcuts:")
+        for key, commands in snapshot.commands.items():
+            count = counts.get(key, 0)
+            if commands:
+                first_cmd = commands[0]
+                if 'comment' in first_cmd:
+                    lines.append(f"  {key:<10} : {first_cmd['comment']} ({count})")
+                elif 'command' in first_cmd:
+                    lines.append(f"  {key:<10} : {first_cmd['command']} ({count})")
+                else:
+                    lines.append(f"  {key:<10} : {len(commands)} commands ({count})")
+
+        lines.append("=" * 50)
+
+    def _render_stats(self, lines, snapshot, data):
+        self._title(lines, "Action Usage Statistics")
+        if not data['stats']:
+            lines.append("No usage data available yet.")
+            return
+        self._usage_rows(lines, data['stats'])
+
+        total_actions, unique_actions = data['totals']
+        lines.append(f"\nTotal actions logged: {total_actions}")
+        lines.append(f"Unique shortcuts used: {unique_actions}")
+
+    def _render_recent(self, lines, snapshot, data):
+        self._title(lines, f"{self.limit} Most Recent Commands")
+        if not data['recent']:
+            lines.append("No usage data available yet.")
+            return
+        self._usage_rows(lines, data['recent'])
+        lines.append("=" * 60)
+
+    def _render_least_used(self, lines, snapshot, data):
+        self._title(lines, "Least Used Commands")
+        # Configured commands and apps that have never been logged come first
+        self._usage_rows(lines, data['least_used'])
+        lines.append("=" * 60)
+
+    def _render_trends(self, lines, snapshot, data):
+        self._title(lines, "Recent Usage Trends")
+        rows = data['windowed']
+        if not rows:
+            lines.append("No usage in the last 30 days.")
+            return
+
+        lines.append(f"{'Code':<12} {'24h':>6} {'7d':>6} {'30d':>6}  {'7d trend':<9} {'Comment'}")
+        lines.append("-" * 60)
+        from usage_rollups import UsageRollups
+        for row in rows[:self.limit]:
+            trend = UsageRollups.trend(row['7d'], row['7d_prev'])
+            comment = self._comment(snapshot, row['code'])
+            lines.append(f"{row['code']:<12} {row['24h']:>6} {row['7d']:>6} {row['30d']:>6}  {trend:<9} {comment[:18]}")
+        lines.append("=" * 60)
+
+    def _render_global(self, lines, snapshot, data):
+        from usage_merge import host_name
+        # Nothing to compare against until usage from another machine has been merged
+        merged = data['merged']
+        host = host_name()
+        if merged is None or not set(merged.hosts) - {host}:
+            return
+
+        # This machine's count is always the live one; the merged file only
+        # has what it had at the last export
+        rows = []
+        for code in snapshot.actions:
+            local = data['counts'].get(code, 0)
+            total = merged.total(code, exclude_host=host) + local
+            if total:
+                hosts = sum(1 for name, count in merged.counts.get(code, {}).items() if count and name != host)
+                rows.append((code, local, total, hosts + (1 if local else 0)))
+        rows.sort(key=lambda row: (-row[2], row[0]))
+
+        self._title(lines, "Usage Across Machines")
+        if not rows:
+            lines.append("No usage data available yet.")
+            return
+        lines.append(f"{'Code':<12} {'Local':>7} {'Global':>8} {'Hosts':>6}  {'Comment'}")
+        lines.append("-" * 60)
+        for code, local, total, hosts in rows[:self.limit]:
+            comment = self._comment(snapshot, code) or merged.comments.get(code, "")
+            lines.append(f"{code:<12} {local:>7} {total:>8} {hosts:>6}  {comment[:22]}")
+
+        exported = datetime.fromtimestamp(max(merged.hosts.values())).strftime("%Y-%m-%d %H:%M")
+        lines.append(f"\nMerged from {len(merged.hosts)} host(s), latest export {exported}")
+        lines.append("=" * 60)
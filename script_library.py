@@ -0,0 +1,90 @@
+import hashlib
+import logging
+import os
+import subprocess
+import threading
+from pathlib import Path
+from script_runner import get_runner
+
+TEMPLATE_DIR = Path(__file__).parent / "applescripts"
+CACHE_DIR = Path.home() / "Library" / "Caches" / "KeyLab" / "applescripts"
+
+
+class ScriptLibrary:
+    """The AppleScript templates in `applescripts/`, compiled once and run with arguments.
+
+    Each template is a plain `.applescript` file with an `on run argv`
+    handler, so values are passed as arguments rather than pasted into the
+    source: nothing needs escaping and the script text never changes. A
+    template is compiled with osacompile into `<name>-<content hash>.scpt`
+    in the cache directory; editing the template changes the hash, and the
+    stale compiled copy is removed. Templates are re-read only when their
+    mtime changes. If osacompile is not available or fails, the source text
+    is run instead.
+    """
+
+    def __init__(self, template_dir=TEMPLATE_DIR, cache_dir=CACHE_DIR):
+        self.template_dir = Path(template_dir)
+        self.cache_dir = Path(cache_dir)
+        # name -> (template mtime, source, compiled path or None)
+        self.templates = {}
+        self.lock = threading.Lock()
+
+    def template_path(self, name):
+        return self.template_dir / f"{name}.applescript"
+
+    def _load(self, name):
+        path = self.template_path(name)
+        mtime = path.stat().st_mtime_ns
+        with self.lock:
+            cached = self.templates.get(name)
+            if cached is not None and cached[0] == mtime:
+                return cached
+            source = path.read_text(encoding='utf-8')
+            cached = self.templates[name] = (mtime, source, self._compile(name, path, source))
+            return cached
+
+    def _compile(self, name, path, source):
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+        compiled = self.cache_dir / f"{name}-{digest}.scpt"
+        if compiled.exists():
+            return compiled
+        tmp_path = compiled.with_name(f"{compiled.stem}.{os.getpid()}.tmp.scpt")
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            result = subprocess.run(["osacompile", "-o", str(tmp_path), str(path)],
+                                    capture_output=True, text=True, timeout=30)
+            if result.returncode != 0:
+                logging.warning(f"Could not compile {path.name}, running it from source: {result.stderr.strip()}")
+                return None
+            os.replace(tmp_path, compiled)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            logging.debug(f"Could not compile {path.name}, running it from source: {e}")
+            return None
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+        for stale in self.cache_dir.glob(f"{name}-*.scpt"):
+            if stale != compiled:
+                stale.unlink(missing_ok=True)
+        return compiled
+
+    def compiled_path(self, name):
+        """Path of the compiled template, or None if it runs from source"""
+        return self._load(name)[2]
+
+    def run(self, name, *args, timeout=None):
+        """Run template `name` with `args` through the current script runner"""
+        _, source, compiled = self._load(name)
+        runner = get_runner()
+        if compiled is not None:
+            return runner.run_file(compiled, args, timeout)
+        return runner.run(source, args, timeout)
+
+
+_library = ScriptLibrary()
+
+
+def run_script(name, *args, timeout=None):
+    """Run one of the templates in `applescripts/` with `args` as its argv; returns a ScriptResult"""
+    return _library.run(name, *args, timeout=timeout)
@@ -0,0 +1,357 @@
+import itertools
+import json
+import logging
+import queue
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+# ok: the script ran without error; output: its result as text (what osascript
+# would print); error: the AppleScript or runner error message
+ScriptResult = namedtuple("ScriptResult", ["ok", "output", "error"])
+
+# The worker: a JXA program for `osascript -l JavaScript` that reads one JSON
+# request per line from stdin, runs the AppleScript (source text, or a compiled
+# .scpt file) through NSAppleScript and writes one JSON response per line to
+# stdout. Loaded scripts are kept per source text or path, so a repeated script
+# skips compilation too. Arguments are passed to the script's `on run argv`
+# handler the same way osascript passes them.
+WORKER_SOURCE = r'''
+ObjC.import('Foundation');
+
+function code(s) {
+    return ((s.charCodeAt(0) << 24) | (s.charCodeAt(1) << 16) | (s.charCodeAt(2) << 8) | s.charCodeAt(3)) >>> 0;
+}
+
+var compiled = {};
+var output = $.NSFileHandle.fileHandleWithStandardOutput;
+
+function reply(message) {
+    output.writeData($(JSON.stringify(message) + "\n").dataUsingEncoding($.NSUTF8StringEncoding));
+}
+
+function errorText(error) {
+    var info = ObjC.deepUnwrap(error[0]);
+    return info ? (info.NSAppleScriptErrorMessage || JSON.stringify(info)) : "unknown error";
+}
+
+function text(desc) {
+    if (!desc || desc.isNil()) return "";
+    var type = desc.descriptorType;
+    if (type === code('true')) return "true";
+    if (type === code('fals')) return "false";
+    if (type === code('bool')) return desc.booleanValue ? "true" : "false";
+    if (type === code('list')) {
+        var items = [];
+        for (var i = 1; i <= desc.numberOfItems; i++) items.push(text(desc.descriptorAtIndex(i)));
+        return items.join(", ");
+    }
+    var value = desc.stringValue;
+    return (!value || value.isNil()) ? "" : ObjC.unwrap(value);
+}
+
+function runEvent(args) {
+    var event = $.NSAppleEventDescriptor.appleEventWithEventClassEventIDTargetDescriptorReturnIDTransactionID(
+        code('aevt'), code('oapp'), $.NSAppleEventDescriptor.currentProcessDescriptor, -1, 0);
+    var list = $.NSAppleEventDescriptor.listDescriptor;
+    for (var i = 0; i < args.length; i++) {
+        list.insertDescriptorAtIndex($.NSAppleEventDescriptor.descriptorWithString(args[i]), i + 1);
+    }
+    event.setParamDescriptorForKeyword(list, code('----'));
+    return event;
+}
+
+function handle(request) {
+    var error = Ref();
+    var key = request.path ? "file:" + request.path : request.source;
+    var script = compiled[key];
+    if (!script) {
+        if (request.path) {
+            script = $.NSAppleScript.alloc.initWithContentsOfURLError($.NSURL.fileURLWithPath(request.path), error);
+            if (!script || script.isNil()) return {id: request.id, ok: false, error: errorText(error)};
+        } else {
+            script = $.NSAppleScript.alloc.initWithSource(request.source);
+            if (!script.compileAndReturnError(error)) return {id: request.id, ok: false, error: errorText(error)};
+        }
+        compiled[key] = script;
+    }
+    var args = request.args || [];
+    var result = args.length ? script.executeAppleEventError(runEvent(args), error)
+                             : script.executeAndReturnError(error);
+    if (!result || result.isNil()) return {id: request.id, ok: false, error: errorText(error)};
+    return {id: request.id, ok: true, output: text(result)};
+}
+
+function run() {
+    var input = $.NSFileHandle.fileHandleWithStandardInput;
+    var buffer = "";
+    reply({id: 0, ok: true, output: "ready"});
+    while (true) {
+        var data = input.availableData;
+        if (data.length === 0) return;
+        // Requests are ASCII-only JSON, so chunks never split a character
+        buffer += ObjC.unwrap($.NSString.alloc.initWithDataEncoding(data, $.NSUTF8StringEncoding));
+        var lines = buffer.split("\n");
+        buffer = lines.pop();
+        for (var i = 0; i < lines.length; i++) {
+            if (!lines[i]) continue;
+            var request;
+            try {
+                request = JSON.parse(lines[i]);
+            } catch (e) {
+                continue;
+            }
+            var response;
+            try {
+                response = handle(request);
+            } catch (e) {
+                response = {id: request.id, ok: false, error: String(e)};
+            }
+            reply(response);
+        }
+    }
+}
+'''
+
+
+class ScriptRunner(ABC):
+    """Runs AppleScript source with optional `on run argv` arguments"""
+
+    @abstractmethod
+    def run(self, source, args=(), timeout=None):
+        """Run AppleScript source text; returns a ScriptResult"""
+
+    @abstractmethod
+    def run_file(self, path, args=(), timeout=None):
+        """Run a script file, e.g. one compiled with osacompile"""
+
+    def start(self):
+        """Get ready ahead of the first run(); optional"""
+
+    def close(self):
+        """Release whatever the runner holds; run() may start it again"""
+
+
+class OsascriptRunner(ScriptRunner):
+    """One osascript process per script: compiles and runs from scratch every time"""
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    def run(self, source, args=(), timeout=None):
+        return self._osascript(["-e", source], args, timeout)
+
+    def run_file(self, path, args=(), timeout=None):
+        return self._osascript([str(path)], args, timeout)
+
+    def _osascript(self, script, args, timeout):
+        try:
+            result = subprocess.run(["osascript", *script, *[str(arg) for arg in args]], capture_output=True,
+                                    text=True, timeout=self.timeout if timeout is None else timeout)
+        except subprocess.TimeoutExpired:
+            return ScriptResult(False, "", f"osascript timed out after {timeout or self.timeout}s")
+        except OSError as e:
+            return ScriptResult(False, "", f"Could not run osascript: {e}")
+        return ScriptResult(result.returncode == 0, result.stdout.strip(), result.stderr.strip())
+
+
+class _Worker:
+    """One osascript worker process and the queue its reader thread fills"""
+
+    def __init__(self, command):
+        self.command = command
+        self.lock = threading.Lock()
+        self.process = None
+        self.responses = None
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def spawn(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        text=True, encoding='utf-8', bufsize=1)
+        self.responses = queue.SimpleQueue()
+        threading.Thread(target=self._read, args=(self.process.stdout, self.responses),
+                         name="osascript-reader", daemon=True).start()
+
+    @staticmethod
+    def _read(stdout, responses):
+        for line in stdout:
+            responses.put(line)
+        responses.put(None)
+
+    def stop(self, kill=False):
+        # Called with self.lock held
+        process, self.process = self.process, None
+        if process is None:
+            return
+        if kill:
+            process.kill()
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+class PersistentScriptRunner(ScriptRunner):
+    """Runs scripts in long-lived osascript workers instead of a process each.
+
+    Requests and responses are JSON lines over a worker's stdin/stdout, one
+    script at a time per worker. Up to `workers` workers run scripts side by
+    side; the first starts with start(), the others the first time every
+    started one is busy. A script that finds all of them busy runs in its
+    own osascript process rather than waiting behind a slow one.
+
+    A script that runs past its timeout gets its worker killed; a worker
+    that exits is restarted on its next script. After `max_failures` starts
+    in a row that die before answering, the runner gives up on workers and
+    falls back to one osascript process per script. `command` replaces the
+    worker command, e.g. with a stand-in that speaks the same protocol.
+    """
+
+    def __init__(self, timeout=30.0, max_failures=3, command=None, workers=2):
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.command = command or ["osascript", "-l", "JavaScript", "-e", WORKER_SOURCE]
+        self.fallback = OsascriptRunner(timeout)
+        self.workers = [_Worker(self.command) for _ in range(max(workers, 1))]
+        self.ids = itertools.count(1)
+        self.failures_lock = threading.Lock()
+        self.failures = 0
+
+    def start(self):
+        worker = self.workers[0]
+        with worker.lock:
+            self._ensure_worker(worker)
+
+    def _ensure_worker(self, worker):
+        # Called with worker.lock held
+        if worker.alive():
+            return True
+        worker.stop()
+        if self.failures >= self.max_failures:
+            return False
+        try:
+            worker.spawn()
+        except OSError as e:
+            logging.error(f"Could not start the osascript worker: {e}")
+            self.failures = self.max_failures
+            return False
+        return True
+
+    def _worker_died(self, worker):
+        with self.failures_lock:
+            self.failures += 1
+            failures = self.failures
+        worker.stop()
+        if failures == self.max_failures:
+            logging.error(f"osascript workers died {failures} times in a row; "
+                          f"running each script in its own osascript process from now on")
+
+    def _idle_worker(self):
+        """An idle worker, locked for the caller, or None if all are busy; running ones go first"""
+        for worker in sorted(self.workers, key=lambda worker: not worker.alive()):
+            if worker.lock.acquire(blocking=False):
+                return worker
+        return None
+
+    def run(self, source, args=(), timeout=None):
+        return self._request({"source": source}, args, timeout, self.fallback.run, source)
+
+    def run_file(self, path, args=(), timeout=None):
+        return self._request({"path": str(path)}, args, timeout, self.fallback.run_file, path)
+
+    def _request(self, script, args, timeout, fallback, fallback_script):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        worker = self._idle_worker()
+        if worker is None:
+            return fallback(fallback_script, args, timeout)
+        try:
+            if not self._ensure_worker(worker):
+                return fallback(fallback_script, args, timeout)
+
+            request_id = next(self.ids)
+            request = json.dumps(dict(script, id=request_id, args=[str(arg) for arg in args]))
+            try:
+                worker.process.stdin.write(request + "\n")
+                worker.process.stdin.flush()
+            except (OSError, ValueError):
+                # Died while idle: the script never reached it, so it is safe to retry once
+                self._worker_died(worker)
+                if not self._ensure_worker(worker):
+                    return fallback(fallback_script, args, max(deadline - time.monotonic(), 0.1))
+                worker.process.stdin.write(request + "\n")
+                worker.process.stdin.flush()
+
+            while True:
+                try:
+                    line = worker.responses.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    # The script is stuck; the worker goes with it
+                    worker.stop(kill=True)
+                    return ScriptResult(False, "", f"Script timed out after {timeout}s")
+                if line is None:
+                    self._worker_died(worker)
+                    return ScriptResult(False, "", "The osascript worker exited while running the script")
+                try:
+                    response = json.loads(line)
+                except ValueError:
+                    continue
+                if response.get("id") != request_id:
+                    continue
+                with self.failures_lock:
+                    self.failures = 0
+                return ScriptResult(bool(response.get("ok")), response.get("output") or "",
+                                    response.get("error") or "")
+        except (OSError, ValueError) as e:
+            self._worker_died(worker)
+            return ScriptResult(False, "", f"Script runner error: {e}")
+        finally:
+            worker.lock.release()
+
+    def close(self):
+        for worker in self.workers:
+            with worker.lock:
+                worker.stop()
+
+
+class RecordingScriptRunner(ScriptRunner):
+    """Stand-in runner that runs nothing: records each call and returns `results[script]` or success"""
+
+    def __init__(self, results=None):
+        self.results = results or {}
+        self.calls = []
+
+    def run(self, source, args=(), timeout=None):
+        self.calls.append((source, tuple(args)))
+        return self.results.get(source, ScriptResult(True, "", ""))
+
+    def run_file(self, path, args=(), timeout=None):
+        return self.run(str(path), args, timeout)
+
+
+_runner = OsascriptRunner()
+
+
+def get_runner():
+    return _runner
+
+
+def set_runner(runner):
+    """Make `runner` the one run_applescript() uses; returns the previous one"""
+    global _runner
+    previous, _runner = _runner, runner
+    return previous
+
+
+def run_applescript(source, *args, timeout=None):
+    """Run AppleScript through the current runner and return a ScriptResult"""
+    return _runner.run(source, args, timeout)
@@ -4,6 +4,12 @@ from tkinter import ttk, filedialog, scrolledtext
 import os
 from datetime import datetime
 from pathlib import Path
+from live_counters import LiveCountersReader, publishable
+from usage_log import UsageEventLog
+from usage_rollups import UsageRollups
+
+# How often the view picks up counts published by a running listener
+LIVE_REFRESH_MS = 2000
 
 
 class ShortcutViewer(tk.Tk):
@@ -55,7 +61,7 @@ class ShortcutViewer(tk.Tk):
         self.shortcuts_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
         # Create treeview for shortcuts
-        columns = ("Shortcut", "Count", "Last Used", "Description")
+        columns = ("Shortcut", "Count", "24h", "7d", "30d", "Trend", "Last Used", "Description")
         self.shortcuts_tree = ttk.Treeview(self.shortcuts_frame, columns=columns, show="headings")
 
         # Define headings
@@ -65,8 +71,11 @@ class ShortcutViewer(tk.Tk):
 
         self.shortcuts_tree.column("Shortcut", width=120)
         self.shortcuts_tree.column("Count", width=80)
-        self.shortcuts_tree.column("Last Used", width=180)
-        self.shortcuts_tree.column("Description", width=400)
+        for col in ("24h", "7d", "30d"):
+            self.shortcuts_tree.column(col, width=50)
+        self.shortcuts_tree.column("Trend", width=70)
+        self.shortcuts_tree.column("Last Used", width=160)
+        self.shortcuts_tree.column("Description", width=300)
 
         # Add scrollbar
         shortcuts_scrollbar = ttk.Scrollbar(self.shortcuts_frame, orient=tk.VERTICAL, command=self.shortcuts_tree.yview)
@@ -88,12 +97,22 @@ class ShortcutViewer(tk.Tk):
 
         # Load default CSV data
         self.csv_data = []
+        self.windowed = {}
+        self.live = None
+        self.live_version = None
         self.load_default_csv()
+        self.after(LIVE_REFRESH_MS, self.refresh_live_counts)
 
     def load_default_csv(self):
         # Try to load key_listener_actions.csv from the script directory
         default_file = self.script_dir / "key_listener_actions.csv"
 
+        # The CSV is a view over the usage log; bring it up to date first
+        try:
+            UsageEventLog(default_file).materialize_if_stale()
+        except Exception as e:
+            print(f"Could not refresh {default_file} from the usage log: {e}")
+
         if default_file.exists():
             try:
                 self.load_csv_from_file(default_file)
@@ -134,37 +153,90 @@ class ShortcutViewer(tk.Tk):
             for row in reader:
                 self.csv_data.append(row)
 
+        # Windowed counts come from the rollups kept next to the CSV, if any
+        try:
+            rollups = UsageRollups.for_csv(file_path).load(read_only=True)
+            self.windowed = {row['code']: row for row in rollups.windowed_stats()}
+        except Exception as e:
+            print(f"Could not load usage rollups for {file_path}: {e}")
+            self.windowed = {}
+
+        # Counts the listener publishes are newer than the CSV view
+        self.live = LiveCountersReader.for_csv(file_path)
+        self.live_version = None
+        self.apply_live_counts()
+
         # Sort by count (ascending)
         self.csv_data.sort(key=lambda x: int(x.get('count', 0)))
         self.display_csv_data()
 
+    def apply_live_counts(self):
+        """Overlay the counts and last use published by the listener; False if there are none"""
+        try:
+            version = self.live.version()
+            values = self.live.snapshot() if version is not None else None
+        except Exception as e:
+            print(f"Could not read live counters: {e}")
+            return False
+        if values is None:
+            return False
+
+        self.live_version = version
+        rows = {row.get('code'): row for row in self.csv_data}
+        # Codes missing from the snapshot were pruned, unless they are too long to publish
+        self.csv_data = [row for row in self.csv_data
+                         if row.get('code') in values or not publishable(row.get('code') or '')]
+        for code, (count, last_used) in values.items():
+            row = rows.get(code)
+            if row is None:
+                row = {'code': code, 'comment': '', 'last_action': ''}
+                self.csv_data.append(row)
+            row['count'] = str(count)
+            if last_used:
+                row['last_action'] = datetime.fromtimestamp(last_used).strftime("%Y-%m-%d %H:%M:%S")
+        return True
+
+    def refresh_live_counts(self):
+        try:
+            changed = self.live is not None and self.live.version() not in (None, self.live_version)
+        except Exception as e:
+            print(f"Could not read live counters: {e}")
+            changed = False
+        if changed and self.apply_live_counts():
+            self.apply_filter()
+        self.after(LIVE_REFRESH_MS, self.refresh_live_counts)
+
     def display_csv_data(self):
         # Clear existing data
         self.shortcuts_tree.delete(*self.shortcuts_tree.get_children())
 
         # Display data
         for row in self.csv_data:
-            code = row.get('code', '')
-            count = row.get('count', '0')
-            last_action = row.get('last_action', '')
-            comment = row.get('comment', '')
+            self.shortcuts_tree.insert("", tk.END, values=self.row_values(row))
 
-            # Format the date if it's valid
-            try:
-                date_obj = datetime.strptime(last_action, "%Y-%m-%d %H:%M:%S")
-                last_action = date_obj.strftime("%Y-%m-%d %H:%M:%S")
-            except (ValueError, TypeError):
-                pass
+    def row_values(self, row):
+        code = row.get('code', '')
+        last_action = row.get('last_action', '')
+
+        # Format the date if it's valid
+        try:
+            date_obj = datetime.strptime(last_action, "%Y-%m-%d %H:%M:%S")
+            last_action = date_obj.strftime("%Y-%m-%d %H:%M:%S")
+        except (ValueError, TypeError):
+            pass
 
-            self.shortcuts_tree.insert("", tk.END, values=(code, count, last_action, comment))
+        windowed = self.windowed.get(code, {})
+        trend = UsageRollups.trend(windowed.get('7d', 0), windowed.get('7d_prev', 0))
+        return (code, row.get('count', '0'), windowed.get('24h', 0), windowed.get('7d', 0),
+                windowed.get('30d', 0), trend, last_action, row.get('comment', ''))
 
     def sort_treeview(self, col):
         # Get all items
         items = [(self.shortcuts_tree.set(item, col), item) for item in self.shortcuts_tree.get_children('')]
 
         # Sort items
-        if col == "Count":
-            # Sort numerically for the Count column
+        if col in ("Count", "24h", "7d", "30d"):
+            # Sort numerically for the count columns
             items.sort(key=lambda x: int(x[0]) if x[0].isdigit() else 0)
         else:
             # Sort alphabetically for other columns
@@ -186,12 +258,7 @@ class ShortcutViewer(tk.Tk):
             comment = row.get('comment', '').lower()
 
             if filter_text in code or filter_text in comment:
-                self.shortcuts_tree.insert("", tk.END, values=(
-                    row.get('code', ''),
-                    row.get('count', '0'),
-                    row.get('last_action', ''),
-                    row.get('comment', '')
-                ))
+                self.shortcuts_tree.insert("", tk.END, values=self.row_values(row))
 
     def clear_filter(self):
         self.filter_var.set("")
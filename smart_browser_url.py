@@ -1,13 +1,11 @@
 #!/usr/bin/env python3
 
 import sys
-import subprocess
-import socket
 import urllib.parse
 import argparse
-from urllib.request import urlopen
-from urllib.error import URLError
 import time
+from readiness import http_status, port_open
+from script_library import run_script
 
 
 def check_url_availability(url):
@@ -18,17 +16,8 @@ def check_url_availability(url):
         hostname = parsed_url.hostname
         port = parsed_url.port or (443 if parsed_url.scheme == 'https' else 80)
 
-        # First try a quick socket connection
-        try:
-            with socket.create_connection((hostname, port), timeout=1) as sock:
-                return True
-        except (socket.timeout, socket.error):
-            # If socket connection fails, try a full HTTP request
-            try:
-                with urlopen(url, timeout=2) as response:
-                    return response.status == 200
-            except URLError:
-                return False
+        # First try a quick socket connection, then a full HTTP request
+        return port_open(hostname, port, timeout=1) or http_status(url, timeout=2) == 200
     except Exception:
         return False
 
@@ -42,42 +31,11 @@ def get_origin(url):
 
 def find_and_focus_tab_by_origin(target_origin):
     """Find and focus a Chrome tab with the same origin. Returns True if found."""
-    applescript = f'''
-    tell application "Google Chrome"
-        set foundTab to false
-        set targetOrigin to "{target_origin}"
-        
-        set windowCount to count of windows
-        repeat with i from 1 to windowCount
-            set w to window i
-            set tabCount to count of tabs of w
-            repeat with j from 1 to tabCount
-                set t to tab j of w
-                set tabURL to URL of t
-                if tabURL starts with targetOrigin then
-                    tell w
-                        set active tab index to j
-                    end tell
-                    activate
-                    set index of w to 1
-                    set foundTab to true
-                    exit repeat
-                end if
-            end repeat
-            if foundTab then exit repeat
-        end repeat
-        
-        return foundTab
-    end tell
-    '''
-    
-    try:
-        result = subprocess.run(["osascript", "-e", applescript], 
-                              capture_output=True, text=True, timeout=5)
-        return result.stdout.strip() == "true"
-    except (subprocess.TimeoutExpired, subprocess.CalledProcessError) as e:
-        print(f"AppleScript error: {e}")
+    result = run_script("chrome_focus_origin", target_origin, timeout=5)
+    if not result.ok:
+        print(f"AppleScript error: {result.error}")
         return False
+    return result.output == "true"
 
 
 def open_or_focus_browser_url(url, reuse_origin=False):
@@ -91,34 +49,21 @@ def open_or_focus_browser_url(url, reuse_origin=False):
         if find_and_focus_tab_by_origin(target_origin):
             print(f"Found existing tab with same origin, navigating to: {url}")
             # Navigate the existing tab to the new URL
-            applescript = f'''
-            tell application "Google Chrome"
-                activate
-                set URL of active tab of front window to "{url}"
-            end tell
-            '''
+            script = "chrome_navigate_active_tab"
         else:
             print(f"No existing tab found with origin {target_origin}, creating new tab")
             # Create new tab
-            applescript = f'''
-            tell application "Google Chrome"
-                activate
-                open location "{url}"
-            end tell
-            '''
+            script = "chrome_open_location"
     else:
         # Simple approach - just open the URL (creates new tab)
-        applescript = f'''
-        tell application "Google Chrome"
-            activate
-            open location "{url}"
-        end tell
-        '''
-    
-    subprocess.run(["osascript", "-e", applescript])
+        script = "chrome_open_location"
+
+    result = run_script(script, url)
+    if not result.ok:
+        print(f"AppleScript error: {result.error}")
 
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(
         description='Open URLs in Chrome with smart tab management',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -134,7 +79,7 @@ Examples:
     parser.add_argument('--no-reuse', '-n', action='store_true',
                        help='Force new tab instead of reusing existing tabs with same origin')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Default behavior is now to reuse origin, unless --no-reuse is specified
     reuse_origin = not args.no_reuse
@@ -8,60 +8,20 @@ Usage:
 
 import sys
 import os
-import subprocess
+from script_library import run_script
 
 
-def create_applescript(split_type, commands):
-    """Generate AppleScript to create splits in iTerm2 with the given commands."""
+def run_split(split_type, commands):
+    """Open a new iTerm tab split into one pane per command."""
+    result = run_script("iterm_split", split_type, *commands)
+    if not result.ok:
+        print(f"Error executing AppleScript: {result.error}", file=sys.stderr)
+    return result.ok
 
-    # Start the AppleScript
-    script = """
-    tell application "iTerm"
-        activate
-        tell current window
-            set newTab to create tab with default profile
-            tell newTab
-                tell current session
-    """
 
-    # Add the first command to the initial session
-    if commands:
-        script += f'\n                    write text "{commands[0]}"'
-
-    # For each additional command, create a split and run the command
-    for i, cmd in enumerate(commands[1:], 1):
-        split_cmd = "split vertically with default profile" if split_type == "vertical" else "split horizontally with default profile"
-        script += f"""
-                    set newSession to {split_cmd}
-                    tell newSession
-                        write text "{cmd}"
-                    end tell
-        """
-
-    # Close the AppleScript
-    script += """
-                end tell
-            end tell
-        end tell
-    end tell
-    """
-
-    return script
-
-
-def run_applescript(script):
-    """Execute the given AppleScript."""
-    try:
-        subprocess.run(['osascript', '-e', script], check=True)
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error executing AppleScript: {e}", file=sys.stderr)
-        return False
-
-
-def main():
+def main(argv=None):
     # Parse arguments
-    args = sys.argv[1:]
+    args = sys.argv[1:] if argv is None else list(argv)
 
     if not args:
         print("Usage: it-split [vertical|horizontal] \"command1\" \"command2\" ...")
@@ -78,9 +38,8 @@ def main():
         print("Usage: it-split [vertical|horizontal] \"command1\" \"command2\" ...")
         return 1
 
-    # Create and run the AppleScript
-    script = create_applescript(split_type, args)
-    success = run_applescript(script)
+    # Run the split script with the commands as its arguments
+    success = run_split(split_type, args)
 
     return 0 if success else 1
 
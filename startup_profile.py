@@ -0,0 +1,24 @@
+import time
+
+
+class StartupProfile:
+    """Timestamps for the phases of startup, measured from `origin`.
+
+    `origin` is a time.perf_counter() value taken as early as possible in
+    main.py, so the first phase includes the module imports.
+    """
+
+    def __init__(self, origin=None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.marks = []
+
+    def mark(self, phase):
+        self.marks.append((phase, time.perf_counter()))
+
+    def report(self):
+        lines = ["", "Startup profile", f"  {'Phase':<24} {'Step ms':>9} {'Total ms':>9}"]
+        previous = self.origin
+        for phase, at in self.marks:
+            lines.append(f"  {phase:<24} {(at - previous) * 1000:>9.1f} {(at - self.origin) * 1000:>9.1f}")
+            previous = at
+        return "\n".join(lines)
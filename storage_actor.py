@@ -0,0 +1,109 @@
+import logging
+import queue
+import threading
+import time
+
+_FLUSH = "flush"
+_STOP = "stop"
+
+
+class StorageActor(threading.Thread):
+    """The single thread that writes usage data to disk.
+
+    Callers hand events to submit() and return immediately. The actor
+    collects events until `flush_batch` are pending or `flush_interval`
+    seconds have passed since the first one, and passes the whole batch to
+    the storage backend in one call. Backends do their own atomic writes and
+    cross-process locking (see csv_logger.py). `sinks` receive the same
+    batches after the backend and keep derived data such as rollups; they
+    implement write_batch(events) and close() as well. `on_start` runs on
+    the actor thread before the first write, so loading can happen off the
+    caller's thread while events already queue up behind it.
+    """
+
+    def __init__(self, backend, flush_interval=1.0, flush_batch=64, sinks=(), on_start=None):
+        super().__init__(name="usage-storage", daemon=True)
+        self.backend = backend
+        self.sinks = list(sinks)
+        self.on_start = on_start
+        self.flush_interval = flush_interval
+        self.flush_batch = max(1, flush_batch)
+        self.inbox = queue.SimpleQueue()
+        self.flushes = 0
+        self.events_written = 0
+
+    def submit(self, event):
+        self.inbox.put(event)
+
+    def flush(self, timeout=None):
+        """Block until everything submitted so far is on disk"""
+        done = threading.Event()
+        self.inbox.put((_FLUSH, done))
+        return done.wait(timeout)
+
+    def stop(self, timeout=None):
+        """Write pending events, close the backend and stop the thread"""
+        if not self.is_alive():
+            return
+        done = threading.Event()
+        self.inbox.put((_STOP, done))
+        done.wait(timeout)
+        self.join(timeout)
+
+    def run(self):
+        if self.on_start is not None:
+            try:
+                self.on_start()
+            except Exception as e:
+                logging.error(f"Error starting usage storage: {e}", exc_info=True)
+
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if not batch else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.inbox.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, dict):
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.flush_batch:
+                    continue
+                item = None
+
+            self._write(batch)
+            batch = []
+            if item is None:
+                continue
+
+            command, done = item
+            if command == _STOP:
+                self._write_final()
+                done.set()
+                return
+            done.set()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        try:
+            self.backend.write_batch(batch)
+            self.flushes += 1
+            self.events_written += len(batch)
+        except Exception as e:
+            logging.error(f"Error writing {len(batch)} usage events: {e}", exc_info=True)
+        for sink in self.sinks:
+            try:
+                sink.write_batch(batch)
+            except Exception as e:
+                logging.error(f"Error writing usage events to {type(sink).__name__}: {e}", exc_info=True)
+
+    def _write_final(self):
+        for target in [self.backend] + self.sinks:
+            try:
+                target.close()
+            except Exception as e:
+                logging.error(f"Error closing {type(target).__name__}: {e}", exc_info=True)
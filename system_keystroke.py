@@ -1,8 +1,8 @@
 #!/usr/bin/env python3
 
-import subprocess
 import sys
 import argparse
+from script_library import run_script
 
 def send_system_keystroke(key, modifiers=None):
     """
@@ -14,31 +14,20 @@ def send_system_keystroke(key, modifiers=None):
     """
     if modifiers is None:
         modifiers = []
-    
-    # Build the modifier string for AppleScript
-    modifier_str = ", ".join([f"{mod} down" for mod in modifiers])
-    modifier_clause = f" using {{{modifier_str}}}" if modifier_str else ""
-    
-    # Build the AppleScript command for system-wide keystrokes
-    script = f'''
-    tell application "System Events"
-        keystroke "{key}"{modifier_clause}
-    end tell
-    '''
-    
-    try:
-        subprocess.run(['osascript', '-e', script], check=True)
-        print(f"Sent system keystroke: {'+'.join(modifiers + [key])}")
-    except subprocess.CalledProcessError as e:
-        print(f"Error: {e}")
+
+    # No application name: the keystroke goes to whatever is frontmost
+    result = run_script("keystroke", "", key, *modifiers)
+    if not result.ok:
+        print(f"Error: {result.error}")
         sys.exit(1)
+    print(f"Sent system keystroke: {'+'.join(modifiers + [key])}")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Send system-wide keystrokes')
     parser.add_argument('key', help='The key to press')
     parser.add_argument('modifiers', nargs='*', help='Modifiers like command, shift, option, control')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     send_system_keystroke(args.key, args.modifiers)
 
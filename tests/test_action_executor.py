@@ -0,0 +1,288 @@
+import threading
+import time
+
+import pytest
+
+import readiness
+from action_executor import (ActionExecutor, ActionQueueFull, ComboPolicy, DROP, OLDEST, REJECT,
+                             RUN_CANCELLED, RUN_FAILED, RUN_OK, RUN_SKIPPED, step_graph)
+
+
+class RecordingCommands:
+    """Stands in for CommandExecutor: records the `name` of each step it runs"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ran = []
+
+    def run_step(self, step):
+        with self.lock:
+            self.ran.append((step["name"], time.monotonic()))
+        time.sleep(step.get("sleep", 0))
+        return not step.get("fail")
+
+    def report_completion(self, key_combo, steps):
+        pass
+
+    def names(self):
+        with self.lock:
+            return [name for name, _ in self.ran]
+
+    def started(self, name):
+        with self.lock:
+            return next(at for ran, at in self.ran if ran == name)
+
+    def wait_started(self, name, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while name not in self.names():
+            assert time.monotonic() < deadline, f"{name} never started"
+            time.sleep(0.005)
+
+
+class Results:
+    """on_complete callback that lets a test wait for a number of reports"""
+
+    def __init__(self):
+        self.reports = []
+        self.changed = threading.Condition()
+
+    def __call__(self, tag, key_combo, duration, status):
+        with self.changed:
+            self.reports.append((key_combo, status))
+            self.changed.notify_all()
+
+    def wait(self, count, timeout=5.0):
+        with self.changed:
+            assert self.changed.wait_for(lambda: len(self.reports) >= count, timeout), self.reports
+            return list(self.reports)
+
+
+class FakeProbe:
+    """Holds after `checks` polls; a negative count never holds"""
+
+    polls = {}
+
+    def __init__(self, name, checks=0):
+        self.name = name
+        self.checks = checks
+        FakeProbe.polls[name] = 0
+
+    def check(self):
+        FakeProbe.polls[self.name] += 1
+        return 0 <= self.checks < FakeProbe.polls[self.name]
+
+    def __str__(self):
+        return f"fake {self.name}"
+
+
+@pytest.fixture
+def fake_probes(monkeypatch):
+    monkeypatch.setitem(readiness.PROBES, "fake", (FakeProbe, ("checks",)))
+    monkeypatch.setattr(readiness, "FIRST_INTERVAL", 0.01)
+    monkeypatch.setattr(readiness, "MAX_INTERVAL", 0.02)
+    FakeProbe.polls.clear()
+
+
+@pytest.fixture
+def make_executor():
+    executors = []
+
+    def make(**kwargs):
+        executor = ActionExecutor(RecordingCommands(), on_complete=Results(), **kwargs)
+        executor.commands, executor.results = executor.command_executor, executor.on_complete
+        executors.append(executor)
+        return executor
+
+    yield make
+    for executor in executors:
+        executor.shutdown(timeout=2.0)
+
+
+@pytest.fixture
+def executor(make_executor):
+    return make_executor(workers=4)
+
+
+def statuses(reports):
+    return {key_combo: status for key_combo, status in reports}
+
+
+@pytest.mark.parametrize("overflow, queued_status, new_status", [
+    (DROP, RUN_OK, RUN_SKIPPED),
+    (OLDEST, RUN_SKIPPED, RUN_OK),
+])
+def test_overflow_policy_decides_who_is_skipped(make_executor, overflow, queued_status, new_status):
+    executor = make_executor(workers=1, queue_size=1, overflow=overflow)
+    executor.submit("busy", [{"name": "busy", "sleep": 0.2}])
+    executor.commands.wait_started("busy")
+    assert executor.submit("queued", [{"name": "queued"}])
+
+    executor.submit("new", [{"name": "new"}])
+
+    reports = statuses(executor.results.wait(3))
+    assert reports == {"busy": RUN_OK, "queued": queued_status, "new": new_status}
+
+
+def test_reject_overflow_raises(make_executor):
+    executor = make_executor(workers=1, queue_size=1, overflow=REJECT)
+    executor.submit("busy", [{"name": "busy", "sleep": 0.2}])
+    executor.commands.wait_started("busy")
+    executor.submit("queued", [{"name": "queued"}])
+
+    with pytest.raises(ActionQueueFull):
+        executor.submit("new", [{"name": "new"}])
+    assert executor.results.wait(1)[0] == ("new", RUN_SKIPPED)
+
+
+def test_coalesce_skips_presses_while_a_run_is_in_flight(executor):
+    policy = ComboPolicy(coalesce=True)
+    assert executor.submit("k", [{"name": "a", "sleep": 0.2}], policy)
+    executor.commands.wait_started("a")
+
+    assert not executor.submit("k", [{"name": "b"}], policy)
+
+    assert executor.results.wait(2) == [("k", RUN_SKIPPED), ("k", RUN_OK)]
+    assert executor.commands.names() == ["a"]
+    assert executor.submit("k", [{"name": "c"}], policy)
+
+
+def test_debounce_skips_presses_too_close_to_the_last_one(executor):
+    policy = ComboPolicy(debounce_ms=150)
+    assert executor.submit("k", [{"name": "a"}], policy)
+    assert not executor.submit("k", [{"name": "b"}], policy)
+    time.sleep(0.2)
+    assert executor.submit("k", [{"name": "c"}], policy)
+
+    executor.results.wait(3)
+    assert sorted(executor.commands.names()) == ["a", "c"]
+    assert executor.get_metrics()["debounced"] == 1
+
+
+def test_cancel_previous_stops_the_run_in_flight(executor):
+    policy = ComboPolicy(cancel_previous=True)
+    executor.submit("k", [{"name": "first", "sleep": 0.2}, {"name": "never"}], policy)
+    executor.commands.wait_started("first")
+
+    executor.submit("k", [{"name": "second"}], policy)
+
+    assert executor.results.wait(2) == [("k", RUN_CANCELLED), ("k", RUN_OK)]
+    assert executor.commands.names() == ["first", "second"]
+
+
+def test_runs_of_one_combo_do_not_overlap_but_other_combos_do(executor):
+    executor.submit("k", [{"name": "k1", "sleep": 0.2}])
+    executor.submit("k", [{"name": "k2"}])
+    executor.submit("other", [{"name": "other"}])
+
+    executor.results.wait(3)
+    commands = executor.commands
+    assert commands.started("other") < commands.started("k2")
+    assert commands.started("k2") - commands.started("k1") >= 0.2
+
+
+def test_failed_step_fails_the_run_but_the_rest_still_runs(executor):
+    executor.submit("k", [{"name": "a", "fail": True}, {"name": "b"}])
+
+    assert executor.results.wait(1) == [("k", RUN_FAILED)]
+    assert executor.commands.names() == ["a", "b"]
+
+
+def test_steps_start_once_everything_they_wait_for_is_done(executor):
+    executor.submit("k", [
+        {"id": "sso", "name": "sso"},
+        {"id": "left", "name": "left", "after": ["sso"], "sleep": 0.2},
+        {"id": "right", "name": "right", "after": ["sso"], "sleep": 0.2},
+        {"name": "open", "after": ["left", "right"]},
+    ])
+
+    assert executor.results.wait(1) == [("k", RUN_OK)]
+    commands = executor.commands
+    assert commands.names()[0] == "sso" and commands.names()[-1] == "open"
+    # The two branches run side by side, and the join waits for both
+    assert abs(commands.started("left") - commands.started("right")) < 0.1
+    assert commands.started("open") - max(commands.started("left"), commands.started("right")) >= 0.2
+
+
+def test_delay_holds_back_only_the_steps_waiting_for_it(executor):
+    executor.submit("k", [
+        {"id": "a", "name": "a", "delay": 0.3},
+        {"name": "after a", "after": ["a"]},
+        {"name": "independent"},
+    ])
+
+    executor.results.wait(1)
+    commands = executor.commands
+    assert commands.started("independent") - commands.started("a") < 0.1
+    assert commands.started("after a") - commands.started("a") >= 0.3
+
+
+def test_plain_lists_run_in_order_with_delays(executor):
+    executor.submit("k", [{"name": "a", "delay": 0.2}, {"name": "b"}, {"name": "c"}])
+
+    executor.results.wait(1)
+    commands = executor.commands
+    assert commands.names() == ["a", "b", "c"]
+    assert commands.started("b") - commands.started("a") >= 0.2
+
+
+def test_step_graph_of_a_plain_list_is_a_chain():
+    assert step_graph([{}, {}, {}]) == [[], [0], [1]]
+
+
+@pytest.mark.parametrize("steps, message", [
+    ([{"id": "a", "after": ["b"]}, {"id": "b", "after": ["a"]}], "wait for each other"),
+    ([{"id": "a", "after": ["a"]}], "wait for each other"),
+    ([{"id": "a"}, {"id": "a", "after": []}], "duplicate step id"),
+    ([{"id": "a", "after": ["missing"]}], "unknown step ids"),
+    ([{"id": "a", "after": "b"}], "must be a list"),
+    ([{"id": "a", "after": [["b"]]}, {"id": "b"}], "must be a list of step ids"),
+    ([{"id": ["x"], "after": []}], "must be a string"),
+])
+def test_step_graph_rejects_bad_graphs(steps, message):
+    with pytest.raises(ValueError, match=message):
+        step_graph(steps)
+
+
+def test_shutdown_reports_runs_in_flight_as_cancelled(make_executor):
+    executor = make_executor(workers=1)
+    executor.submit("k", [{"name": "a", "delay": 5}, {"name": "b"}])
+    # Queued behind the first run, which is waiting on its delay
+    executor.submit("k", [{"name": "c"}])
+    executor.commands.wait_started("a")
+
+    executor.shutdown(timeout=2.0)
+
+    assert executor.results.wait(2) == [("k", RUN_CANCELLED), ("k", RUN_CANCELLED)]
+    assert executor.commands.names() == ["a"]
+
+
+def test_wait_for_runs_the_step_once_the_probe_holds(fake_probes, executor):
+    executor.submit("k", [{"name": "start"},
+                          {"name": "open", "wait_for": {"fake": "server", "checks": 3}}])
+
+    assert executor.results.wait(1) == [("k", RUN_OK)]
+    assert executor.commands.names() == ["start", "open"]
+    assert FakeProbe.polls["server"] == 4
+    assert executor.get_metrics()["waits_timed_out"] == 0
+
+
+def test_wait_for_timeout_runs_the_step_anyway_and_fails_the_run(fake_probes, executor):
+    started = time.monotonic()
+    executor.submit("k", [{"name": "open", "wait_for": {"fake": "server", "checks": -1, "timeout": 0.2}}])
+
+    assert executor.results.wait(1) == [("k", RUN_FAILED)]
+    assert executor.commands.names() == ["open"]
+    assert time.monotonic() - started >= 0.2
+    assert executor.get_metrics()["waits_timed_out"] == 1
+
+
+def test_waiting_step_does_not_hold_a_worker(fake_probes):
+    commands = RecordingCommands()
+    results = Results()
+    executor = ActionExecutor(commands, workers=1, on_complete=results)
+    try:
+        executor.submit("slow", [{"name": "open", "wait_for": {"fake": "server", "checks": 10}}])
+        executor.submit("other", [{"name": "other"}])
+        assert results.wait(2)[0] == ("other", RUN_OK)
+    finally:
+        executor.shutdown(timeout=2.0)
@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from combo_matcher import ComboMatcher
+
+
+def feed(matcher, keys):
+    """The combos ending at each key, longest first, as the key tracker sees them"""
+    state = ComboMatcher.ROOT
+    ends = []
+    for char in keys:
+        state = matcher.step(state, char)
+        ends.append(matcher.outputs[state])
+    return ends, state
+
+
+def brute_force(combos, keys):
+    return [tuple(sorted((combo for combo in combos if keys[:end + 1].endswith(combo)), key=len, reverse=True))
+            for end in range(len(keys))]
+
+
+def test_finds_overlapping_and_suffix_matches():
+    matcher = ComboMatcher(["he", "she", "his", "hers"])
+    ends, _ = feed(matcher, "ushers")
+    assert ends == [(), (), (), ("she", "he"), (), ("hers",)]
+
+
+def test_keys_outside_every_combo_return_to_the_root():
+    matcher = ComboMatcher(["xdl", "xdr"])
+    _, state = feed(matcher, "xd")
+    assert matcher.prefixes[state] == "xd"
+    assert matcher.step(state, "q") == ComboMatcher.ROOT
+
+
+def test_mismatch_falls_back_to_the_longest_live_prefix():
+    matcher = ComboMatcher(["xxd", "xdl"])
+    ends, state = feed(matcher, "xxdl")
+    assert ends[2] == ("xxd",)
+    assert ends[3] == ("xdl",)
+    assert matcher.prefixes[state] == "xdl"
+
+
+def test_ignores_empty_and_duplicate_combos():
+    matcher = ComboMatcher(["", "v1k", "v1k", "v1d"])
+    assert len(matcher) == 2
+    assert "v1k" in matcher and "" not in matcher
+    assert matcher.max_length == 3
+
+
+def test_empty_matcher_never_leaves_the_root():
+    matcher = ComboMatcher()
+    ends, state = feed(matcher, "abc")
+    assert state == ComboMatcher.ROOT
+    assert ends == [(), (), ()]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_agrees_with_brute_force(seed):
+    rng = random.Random(seed)
+    combos = {"".join(rng.choice("xyz1") for _ in range(rng.randint(1, 4))) for _ in range(12)}
+    keys = "".join(rng.choice("xyz1q") for _ in range(200))
+    matcher = ComboMatcher(combos)
+
+    ends, _ = feed(matcher, keys)
+
+    assert ends == brute_force(combos, keys)
+
+
+def test_tracker_only_counts_keys_typed_within_the_timeout():
+    pytest.importorskip("pynput")
+    from key_tracker import KeyTracker
+
+    tracker = KeyTracker(combo_timeout=1.0, matcher=ComboMatcher(["xdl", "dl"]))
+    assert tracker.add_key("x", 0.0) is None
+    assert tracker.add_key("d", 0.5) is None
+    # Too slow for xdl, but d-l alone still fits in the window
+    assert tracker.add_key("l", 1.2) == "dl"
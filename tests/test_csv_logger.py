@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from csv_logger import create_backend
+
+
+def action(code, ts="2026-01-01 09:00:00"):
+    return {"op": "action", "code": code, "ts": ts, "comment": ""}
+
+
+def run(name, csv_path, codes):
+    """Start a backend, log one action per code and shut it down; returns the counts it loaded"""
+    backend = create_backend(name, csv_path)
+    loaded = {code: int(entry["count"]) for code, entry in backend.load().items()}
+    backend.write_batch([action(code) for code in codes])
+    backend.close()
+    return loaded
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return tmp_path / "usage.csv"
+
+
+def test_switching_backends_carries_the_counts_over(csv_path):
+    assert run("eventlog", csv_path, ["a"]) == {}
+    assert run("sqlite", csv_path, ["a", "b"]) == {"a": 1}
+    assert run("eventlog", csv_path, ["a"]) == {"a": 2, "b": 1}
+    assert run("sqlite", csv_path, []) == {"a": 3, "b": 1}
+    assert run("eventlog", csv_path, []) == {"a": 3, "b": 1}
+    assert csv_path.read_text().splitlines()[1:] == ["a,3,2026-01-01 09:00:00,", "b,1,2026-01-01 09:00:00,"]
+
+
+def test_the_backend_taking_over_retires_the_other_ones_files(csv_path):
+    run("eventlog", csv_path, ["a"])
+    run("sqlite", csv_path, ["a"])
+
+    assert not csv_path.with_suffix(".snapshot.json").exists()
+    assert not csv_path.with_suffix(".log").exists()
+    assert csv_path.with_name("usage.snapshot.json.migrated").exists()
+
+    run("eventlog", csv_path, [])
+
+    assert not csv_path.with_suffix(".db").exists()
+    assert csv_path.with_name("usage.db.migrated").exists()
+
+
+def test_sqlite_migrates_a_plain_csv_once(csv_path):
+    csv_path.write_text("code,count,last_action,comment\nxdl,4,2026-01-01 09:00:00,Local\n")
+
+    assert run("sqlite", csv_path, ["xdl"]) == {"xdl": 4}
+    assert run("sqlite", csv_path, []) == {"xdl": 5}
+
+
+def test_stale_event_log_left_next_to_the_database_is_ignored(csv_path):
+    # Databases migrated before the event log was retired still have it next to them
+    run("eventlog", csv_path, ["a"])
+    stale = {path: path.read_bytes() for path in (csv_path.with_suffix(".snapshot.json"), csv_path.with_suffix(".log"))}
+    run("sqlite", csv_path, ["a", "a"])
+    for path, data in stale.items():
+        path.write_bytes(data)
+        os.utime(path, (0, 0))
+
+    assert run("eventlog", csv_path, []) == {"a": 3}
@@ -0,0 +1,98 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from helper_runner import HelperRunner
+
+
+@pytest.fixture
+def runner():
+    stdout, stderr = sys.stdout, sys.stderr
+    yield HelperRunner(timeout=5.0)
+    # The runner swaps in per-thread streams on its first run
+    sys.stdout, sys.stderr = stdout, stderr
+
+
+@pytest.fixture
+def helper(tmp_path):
+    def write(source, name="helper"):
+        path = tmp_path / f"{name}.py"
+        mtime = path.stat().st_mtime_ns if path.exists() else None
+        path.write_text(source)
+        if mtime is not None:
+            os.utime(path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+        return path
+    return write
+
+
+def test_passes_argv_and_leaves_sys_argv_alone(runner, helper, capsys):
+    path = helper("import sys\n"
+                  "ARGV = list(sys.argv)\n"
+                  "def main(argv=None):\n"
+                  "    print(argv, sys.argv == ARGV)\n")
+
+    assert runner.run(path, ["--repo", "keylab"]) is True
+
+    assert capsys.readouterr().out == "['--repo', 'keylab'] True\n"
+
+
+def test_scripts_without_main_argv_run_as_a_subprocess(runner, helper):
+    assert runner.run(helper("print('top level')\n"), []) is None
+    assert runner.run(helper("def main():\n    pass\n", name="no_argv"), []) is None
+    assert runner.run(helper("def main(argv:\n", name="broken"), []) is None
+
+
+@pytest.mark.parametrize("body, ok", [
+    ("return None", True),
+    ("return 0", True),
+    ("return 2", False),
+    ("sys.exit()", True),
+    ("sys.exit(0)", True),
+    ("sys.exit(3)", False),
+    ("sys.exit('usage: helper')", False),
+    ("raise RuntimeError('boom')", False),
+])
+def test_exit_codes_decide_success(runner, helper, body, ok):
+    path = helper(f"import sys\ndef main(argv):\n    {body}\n")
+    assert runner.run(path, []) is ok
+
+
+def test_output_is_captured_per_run_and_written_in_one_piece(runner, helper, capsys):
+    path = helper("import time\n"
+                  "def main(argv):\n"
+                  "    for i in range(3):\n"
+                  "        print(argv[0], i, flush=True)\n"
+                  "        time.sleep(0.05)\n")
+    threads = [threading.Thread(target=runner.run, args=(path, [name])) for name in ("a", "b")]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    lines = capsys.readouterr().out.splitlines()
+    assert sorted(lines) == ["a 0", "a 1", "a 2", "b 0", "b 1", "b 2"]
+    assert lines[:3] in (["a 0", "a 1", "a 2"], ["b 0", "b 1", "b 2"])
+
+
+def test_run_that_outlives_the_timeout_fails(runner, helper):
+    path = helper("import time\ndef main(argv):\n    time.sleep(1)\n")
+
+    started = time.monotonic()
+    assert runner.run(path, [], timeout=0.2) is False
+    assert time.monotonic() - started < 0.8
+
+
+def test_edited_helper_is_imported_again(runner, helper, capsys):
+    path = helper("def main(argv):\n    print('v1')\n")
+    runner.run(path, [])
+    runner.run(path, [])
+    module = runner.module(path)
+
+    helper("def main(argv):\n    print('v2')\n")
+    runner.run(path, [])
+
+    assert capsys.readouterr().out == "v1\nv1\nv2\n"
+    assert runner.module(path) is not module
@@ -0,0 +1,121 @@
+import types
+
+import pytest
+
+from live_counters import CODE_SIZE, MIN_CAPACITY, LiveCounters, LiveCountersReader
+
+
+def row(count, last_action="2026-01-01 09:00:00"):
+    return {"count": str(count), "last_action": last_action, "comment": ""}
+
+
+@pytest.fixture
+def pair(tmp_path):
+    path = tmp_path / "usage.live"
+    writer, reader = LiveCounters(path), LiveCountersReader(path)
+    yield writer, reader
+    reader.close()
+    writer.close()
+
+
+def test_nothing_published_yet(pair):
+    _, reader = pair
+    assert reader.snapshot() is None
+    assert reader.version() is None
+
+
+def test_update_in_place_is_seen_without_remapping(pair):
+    writer, reader = pair
+    writer.publish({"xdl": row(3)})
+    assert reader.snapshot()["xdl"][0] == 3
+    mapped = reader.map
+    version = reader.version()
+
+    writer.update("xdl", 4, 100.0)
+    writer.update("v1k", 1, 200.0)
+
+    assert reader.snapshot() == {"xdl": (4, 100.0), "v1k": (1, 200.0)}
+    assert reader.map is mapped
+    # Two writes, each bumping the sequence word twice
+    assert reader.version() == version + 4
+
+
+def test_growing_past_capacity_swaps_in_a_larger_file(pair):
+    writer, reader = pair
+    writer.publish({})
+    assert reader.snapshot() == {}
+    mapped = reader.map
+
+    for i in range(MIN_CAPACITY + 1):
+        writer.update(f"c{i}", i, float(i))
+
+    assert writer.capacity > MIN_CAPACITY
+    snapshot = reader.snapshot()
+    assert reader.map is not mapped
+    assert snapshot == {f"c{i}": (i, float(i)) for i in range(MIN_CAPACITY + 1)}
+
+
+def test_rewrite_retires_the_old_file_and_readers_remap(pair):
+    writer, reader = pair
+    writer.publish({"a": row(1)})
+    reader.snapshot()
+    mapped, header = reader.map, reader.header
+
+    writer.publish({"a": row(2), "b": row(5)})
+
+    # The reader still maps the replaced file, which the writer marked retired
+    assert header[0] == 1
+    snapshot = reader.snapshot()
+    assert reader.map is not mapped
+    assert {code: count for code, (count, _) in snapshot.items()} == {"a": 2, "b": 5}
+
+
+def test_prune_and_rename_drop_the_old_codes(pair):
+    writer, reader = pair
+    writer.publish({"old": row(2), "gone": row(1), "kept": row(1)})
+    reader.snapshot()
+
+    # CSVLogger republishes everything after a prune or rename
+    writer.publish({"new": row(2), "kept": row(1)})
+
+    assert set(reader.snapshot()) == {"new", "kept"}
+
+
+def test_codes_too_long_to_publish_are_left_out(pair):
+    writer, reader = pair
+    long_code = "x" * (CODE_SIZE + 1)
+    writer.publish({long_code: row(1), "ok": row(1)})
+    writer.update(long_code, 2, 0.0)
+
+    assert set(reader.snapshot()) == {"ok"}
+
+
+def test_a_file_that_is_not_live_counters_raises_value_error(tmp_path):
+    path = tmp_path / "usage.live"
+    path.write_bytes(b"\0" * 4096)
+    reader = LiveCountersReader(path)
+
+    with pytest.raises(ValueError, match="not a live counters file"):
+        reader.snapshot()
+    assert reader.map is None
+    reader.close()
+
+
+def test_sheet_keeps_rows_the_writer_could_not_publish(tmp_path):
+    pytest.importorskip("tkinter")
+    from sheet import ShortcutViewer
+
+    path = tmp_path / "usage.live"
+    long_code = "x" * (CODE_SIZE + 1)
+    writer = LiveCounters(path)
+    writer.publish({"xdl": row(5), long_code: row(7)})
+    viewer = types.SimpleNamespace(live=LiveCountersReader(path), live_version=None,
+                                   csv_data=[dict(row(4), code="xdl"), dict(row(7), code=long_code),
+                                             dict(row(1), code="pruned")])
+    try:
+        assert ShortcutViewer.apply_live_counts(viewer)
+    finally:
+        viewer.live.close()
+        writer.close()
+
+    assert {row["code"]: row["count"] for row in viewer.csv_data} == {"xdl": "5", long_code: "7"}
@@ -0,0 +1,36 @@
+import pytest
+
+from readiness import DEFAULT_TIMEOUT, FileProbe, HttpProbe, PortProbe, parse_wait_for
+
+
+def test_parses_one_condition_or_a_list():
+    (probe, timeout), = parse_wait_for({"port": 8002})
+    assert isinstance(probe, PortProbe) and probe.port == 8002 and probe.host == "localhost"
+    assert timeout == DEFAULT_TIMEOUT
+
+    probes = parse_wait_for([{"http": "http://localhost:8002/health", "status": 204, "timeout": 5},
+                             {"file": "~/ready", "timeout": 0}])
+    assert [type(probe) for probe, _ in probes] == [HttpProbe, FileProbe]
+    assert probes[0][0].status == 204
+    assert [timeout for _, timeout in probes] == [5.0, 0.0]
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("port 8002", "must be objects"),
+    ({"timeout": 5}, "exactly one of"),
+    ({"port": 8002, "file": "~/ready"}, "exactly one of"),
+    ({"port": 8002, "retries": 3}, "unknown keys: retries"),
+    ({"port": "eighty"}, "bad wait_for condition"),
+    ({"port": None}, "bad wait_for condition"),
+    ({"port": 8002, "timeout": None}, "timeout must be a number"),
+    ({"port": 8002, "timeout": "60"}, "timeout must be a number"),
+    ({"port": 8002, "timeout": True}, "timeout must be a number"),
+    ({"port": 8002, "timeout": -1}, "timeout must be a number"),
+    ({"port": 8002, "timeout": float("nan")}, "timeout must be a number"),
+    ({"http": "http://localhost:8002", "status": "200"}, "status must be an integer"),
+    ({"http": "http://localhost:8002", "status": 200.0}, "status must be an integer"),
+    ({"iterm": "("}, "bad wait_for condition"),
+])
+def test_rejects_bad_conditions(spec, message):
+    with pytest.raises(ValueError, match=message):
+        parse_wait_for(spec)
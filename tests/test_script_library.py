@@ -0,0 +1,115 @@
+import os
+import subprocess
+
+import pytest
+
+import script_library
+from script_library import ScriptLibrary
+from script_runner import ScriptResult
+
+
+class FakeOsacompile:
+    """Stands in for subprocess.run(["osacompile", "-o", out, src]); copies the source to `out`"""
+
+    def __init__(self, returncode=0, error=None):
+        self.returncode = returncode
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, command, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        _, _, out, src = command
+        if self.returncode == 0:
+            with open(src, 'rb') as source, open(out, 'wb') as compiled:
+                compiled.write(source.read())
+        return subprocess.CompletedProcess(command, self.returncode, "", "syntax error")
+
+
+class RecordingRunner:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, source, args=(), timeout=None):
+        self.calls.append(("source", source, tuple(args)))
+        return ScriptResult(True, "", "")
+
+    def run_file(self, path, args=(), timeout=None):
+        self.calls.append(("file", path.name, tuple(args)))
+        return ScriptResult(True, "", "")
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    runner = RecordingRunner()
+    monkeypatch.setattr(script_library, "get_runner", lambda: runner)
+    return runner
+
+
+@pytest.fixture
+def osacompile(monkeypatch):
+    fake = FakeOsacompile()
+    monkeypatch.setattr(script_library.subprocess, "run", fake)
+    return fake
+
+
+@pytest.fixture
+def template(tmp_path):
+    path = tmp_path / "templates" / "greet.applescript"
+    path.parent.mkdir()
+    path.write_text("on run argv\n  return item 1 of argv\nend run\n")
+    return path
+
+
+def library(template):
+    return ScriptLibrary(template.parent, template.parent.parent / "cache")
+
+
+def edit(path, text):
+    mtime = path.stat().st_mtime_ns
+    path.write_text(text)
+    # Make sure the edit shows up even on filesystems with coarse mtimes
+    os.utime(path, ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+
+
+def test_compiles_once_and_runs_the_compiled_file_with_argv(template, osacompile, runner):
+    scripts = library(template)
+    scripts.run("greet", "hello", timeout=5)
+    scripts.run("greet", "again")
+
+    assert osacompile.calls == 1
+    compiled = scripts.compiled_path("greet")
+    assert compiled.name.startswith("greet-") and compiled.suffix == ".scpt"
+    assert runner.calls == [("file", compiled.name, ("hello",)), ("file", compiled.name, ("again",))]
+
+
+def test_compiled_copy_is_found_by_content_hash_after_a_restart(template, osacompile, runner):
+    compiled = library(template).compiled_path("greet")
+
+    assert library(template).compiled_path("greet") == compiled
+    assert osacompile.calls == 1
+
+
+def test_editing_a_template_recompiles_it_and_removes_the_stale_copy(template, osacompile, runner):
+    scripts = library(template)
+    old = scripts.compiled_path("greet")
+
+    edit(template, "on run argv\n  return item 2 of argv\nend run\n")
+    new = scripts.compiled_path("greet")
+
+    assert new != old
+    assert osacompile.calls == 2
+    assert sorted(new.parent.glob("greet-*.scpt")) == [new]
+
+
+@pytest.mark.parametrize("fake", [FakeOsacompile(returncode=1), FakeOsacompile(error=FileNotFoundError("osacompile"))])
+def test_runs_from_source_when_osacompile_fails(template, runner, monkeypatch, fake):
+    monkeypatch.setattr(script_library.subprocess, "run", fake)
+    scripts = library(template)
+
+    scripts.run("greet", "hello")
+
+    assert scripts.compiled_path("greet") is None
+    assert runner.calls == [("source", template.read_text(), ("hello",))]
+    assert list((template.parent.parent / "cache").glob("*.scpt")) == []
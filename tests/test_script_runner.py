@@ -0,0 +1,109 @@
+import os
+import sys
+import threading
+import time
+
+from script_runner import PersistentScriptRunner, ScriptResult
+
+# Speaks the worker protocol: "sleep <seconds>" sleeps first, "exit" dies
+# without answering; every answer is the worker's pid, so tests can tell
+# which worker ran a script.
+FAKE_WORKER = r'''
+import json, os, sys, time
+print(json.dumps({"id": 0, "ok": True, "output": "ready"}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    source = request.get("source", "")
+    if source == "exit":
+        sys.exit(1)
+    if source.startswith("sleep "):
+        time.sleep(float(source.split()[1]))
+    print(json.dumps({"id": request["id"], "ok": True, "output": str(os.getpid())}), flush=True)
+'''
+
+
+class FakeOneShot:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, source, args=(), timeout=None):
+        self.calls.append(source)
+        return ScriptResult(True, "one-shot", "")
+
+
+def make_runner(workers, **kwargs):
+    runner = PersistentScriptRunner(command=[sys.executable, "-c", FAKE_WORKER], workers=workers, **kwargs)
+    runner.fallback = FakeOneShot()
+    return runner
+
+
+def run_together(runner, sources):
+    results = [None] * len(sources)
+
+    def run(i, source):
+        results[i] = runner.run(source)
+
+    threads = [threading.Thread(target=run, args=(i, source)) for i, source in enumerate(sources)]
+    for thread in threads:
+        thread.start()
+        # Keep the order in which workers are taken deterministic
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+
+def test_runs_scripts_in_a_warm_worker():
+    runner = make_runner(workers=1)
+    try:
+        first, second = runner.run("a"), runner.run("b")
+        assert first.ok and second.ok
+        assert first.output == second.output != str(os.getpid())
+        assert runner.fallback.calls == []
+    finally:
+        runner.close()
+
+
+def test_busy_worker_does_not_serialize_other_scripts():
+    runner = make_runner(workers=2)
+    runner.start()
+    try:
+        started = time.monotonic()
+        slow, fast = run_together(runner, ["sleep 1", "quick"])
+        assert fast.ok and slow.ok
+        assert fast.output != slow.output
+        assert time.monotonic() - started < 1.5
+    finally:
+        runner.close()
+
+
+def test_falls_back_to_one_shot_when_every_worker_is_busy():
+    runner = make_runner(workers=1)
+    runner.start()
+    try:
+        slow, overflow = run_together(runner, ["sleep 0.5", "quick"])
+        assert slow.ok and slow.output != "one-shot"
+        assert overflow.output == "one-shot"
+        assert runner.fallback.calls == ["quick"]
+    finally:
+        runner.close()
+
+
+def test_timeout_kills_only_the_stuck_worker():
+    runner = make_runner(workers=1)
+    try:
+        result = runner.run("sleep 5", timeout=0.3)
+        assert not result.ok and "timed out" in result.error
+        assert runner.run("quick").ok
+    finally:
+        runner.close()
+
+
+def test_gives_up_on_workers_that_keep_dying():
+    runner = make_runner(workers=1, max_failures=2)
+    try:
+        for _ in range(2):
+            assert not runner.run("exit").ok
+        assert runner.run("quick").output == "one-shot"
+    finally:
+        runner.close()
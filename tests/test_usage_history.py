@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from usage_history import DAY, RECORD_SIZE, STATUS_UNKNOWN, UsageHistory
+
+NOW = time.time()
+
+
+def action(i, code=None, epoch=None):
+    return {"id": i, "code": code or f"c{i % 3}", "epoch": NOW - 1000 + i if epoch is None else epoch}
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return tmp_path / "history"
+
+
+def test_rotates_when_the_active_segment_is_full(directory):
+    history = UsageHistory(directory, segment_max_bytes=10 * RECORD_SIZE).load()
+    for i in range(25):
+        history.append_many([action(i)])
+
+    assert len(history.indexes) == 2
+    assert all(index["events"] == 10 for index in history.indexes.values())
+    assert history.active_count == 5
+    assert len(list(directory.glob("*.cols.gz"))) == 2
+    assert [code for _, code in history.read_from()] == [f"c{i % 3}" for i in range(25)]
+
+
+def test_rotates_when_the_active_segment_is_too_old(directory):
+    history = UsageHistory(directory, segment_max_hours=1).load()
+    history.append_many([action(0, epoch=NOW - 2 * 3600)])
+    history.append_many([action(1, epoch=NOW)])
+
+    assert len(history.indexes) == 1
+    assert history.active_count == 1
+
+
+def test_closed_segments_survive_a_restart(directory):
+    history = UsageHistory(directory, segment_max_bytes=10 * RECORD_SIZE).load()
+    for i in range(15):
+        history.append_many([action(i)])
+    history.close()
+
+    reopened = UsageHistory(directory, segment_max_bytes=10 * RECORD_SIZE).load()
+
+    assert sorted(reopened.indexes) == sorted(history.indexes)
+    assert reopened.active == history.active and reopened.active_count == 5
+    assert [epoch for epoch, *_ in reopened.read_range()] == [NOW - 1000 + i for i in range(15)]
+
+
+def test_queries_skip_segments_outside_the_range_or_combos(directory):
+    history = UsageHistory(directory, segment_max_bytes=10 * RECORD_SIZE).load()
+    for i in range(30):
+        history.append_many([action(i, code="early" if i < 10 else "late")])
+
+    # The active segment has no index yet, so it is always read
+    assert len(list(history.columns(start=NOW - 1000 + 25))) == 1
+    assert len(list(history.columns(end=NOW - 1000 + 5))) == 2
+    assert len(list(history.columns(codes=["early"]))) == 2
+    assert {code for _, code, _, _ in history.read_range(codes=["late"])} == {"late"}
+
+
+def test_retention_deletes_expired_segments(directory):
+    history = UsageHistory(directory, segment_max_bytes=2 * RECORD_SIZE, retention_days=30).load()
+    for i in range(4):
+        history.append_many([action(i, epoch=NOW - 40 * DAY + i)])
+    assert len(history.indexes) == 1
+
+    # Rotating for the new action also applies retention
+    history.append_many([action(4)])
+
+    assert history.indexes == {}
+    assert list(directory.glob("*.cols.gz")) == []
+    assert [code for _, code in history.read_from()] == ["c1"]
+
+
+def test_complete_fills_in_the_active_segment(directory):
+    history = UsageHistory(directory).load()
+    for i in range(3):
+        history.append_many([action(i)])
+
+    assert history.complete(1, 1.5, 0)
+    assert not history.complete(1, 9.0, 0)
+
+    assert [(duration, status) for _, _, duration, status in history.read_range()] == [
+        (0.0, STATUS_UNKNOWN), (1.5, 0), (0.0, STATUS_UNKNOWN)]
+
+
+def test_complete_patches_records_in_closed_segments(directory):
+    history = UsageHistory(directory, segment_max_bytes=10 * RECORD_SIZE).load()
+    for i in range(12):
+        history.append_many([action(i)])
+
+    assert history.complete(3, 1.5, 0)
+    assert history.complete(11, 0.25, 1)
+    assert not history.complete(3, 9.0, 0)
+
+    completed = {epoch: (duration, status) for epoch, _, duration, status in history.read_range()
+                 if status != STATUS_UNKNOWN}
+    assert completed == {NOW - 1000 + 3: (1.5, 0), NOW - 1000 + 11: (0.25, 1)}
+
+
+def test_close_releases_the_mapped_columns(directory):
+    history = UsageHistory(directory).load()
+    history.append_many([action(0)])
+    columns = history.read_columns(history.active)
+    assert history.maps[history.active]
+
+    for column in columns.values():
+        column.release()
+    history.close()
+
+    assert history.maps == {}
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from usage_log import UsageEventLog
+
+
+def action(code, ts="2026-01-01 09:00:00", comment=""):
+    return {"op": "action", "code": code, "ts": ts, "comment": comment}
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    return tmp_path / "usage.csv"
+
+
+def reopen(csv_path):
+    log = UsageEventLog(csv_path)
+    return log, log.load()
+
+
+def test_replays_the_log_after_a_restart(csv_path):
+    log, entries = reopen(csv_path)
+    events = [action("xdl"), action("xdl", "2026-01-01 10:00:00", "Local"), action("v1k")]
+    for event in events:
+        log.append(event)
+    log.close()
+
+    log, entries = reopen(csv_path)
+
+    assert entries["xdl"] == {"code": "xdl", "count": "2", "last_action": "2026-01-01 10:00:00", "comment": "Local"}
+    assert entries["v1k"]["count"] == "1"
+    assert log.records_since_compaction == 3
+
+
+def test_compaction_folds_the_log_into_the_snapshot(csv_path):
+    log, entries = reopen(csv_path)
+    for event in [action("xdl"), action("xdl")]:
+        log.append(event)
+        UsageEventLog.apply(entries, event)
+    log.compact(entries)
+    log.append(action("xdl"))
+    log.close()
+
+    log, entries = reopen(csv_path)
+
+    assert entries["xdl"]["count"] == "3"
+    assert log.records_since_compaction == 1
+    assert len(log.log_path.read_text().splitlines()) == 2
+
+
+def test_log_of_an_older_generation_is_not_counted_twice(csv_path):
+    log, entries = reopen(csv_path)
+    log.append(action("xdl"))
+    UsageEventLog.apply(entries, action("xdl"))
+    stale_log = log.log_path.read_text()
+    log.compact(entries)
+    # Crash after the snapshot was written but before the log was reset
+    log.log_path.write_text(stale_log)
+
+    _, entries = reopen(csv_path)
+
+    assert entries["xdl"]["count"] == "1"
+
+
+def test_torn_last_line_is_ignored(csv_path):
+    log, _ = reopen(csv_path)
+    log.append(action("xdl"))
+    log.close()
+    with open(log.log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(action("v1k"))[:20])
+
+    _, entries = reopen(csv_path)
+
+    assert list(entries) == ["xdl"]
+
+
+def test_prune_and_rename_replay(csv_path):
+    log, _ = reopen(csv_path)
+    for event in [action("old"), action("old"), action("new", "2026-01-02 09:00:00"), action("gone"),
+                  {"op": "rename", "renames": [["old", "new"]]},
+                  {"op": "prune", "codes": ["gone"]}]:
+        log.append(event)
+    log.close()
+
+    _, entries = reopen(csv_path)
+
+    assert set(entries) == {"new"}
+    assert entries["new"]["count"] == "3"
+    assert entries["new"]["last_action"] == "2026-01-02 09:00:00"
+
+
+def test_first_load_migrates_an_existing_csv(csv_path):
+    csv_path.write_text("code,count,last_action,comment\nxdl,4,2026-01-01 09:00:00,Local\nbad,x,,\n")
+
+    log, entries = reopen(csv_path)
+
+    assert entries["xdl"]["count"] == "4"
+    assert entries["bad"]["count"] == "0"
+    assert log.snapshot_path.exists()
+
+
+def test_materialized_csv_round_trips(csv_path):
+    log, _ = reopen(csv_path)
+    log.append(action("b"))
+    log.append(action("a", comment="with, comma"))
+    log.close()
+    log, entries = reopen(csv_path)
+
+    log.materialize_csv(entries)
+
+    assert log.read_csv() == entries
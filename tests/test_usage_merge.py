@@ -0,0 +1,89 @@
+import itertools
+import random
+
+import pytest
+
+from usage_merge import UsageCounters, local_counters, merged_path
+
+
+def state(observations, hosts=()):
+    counters = UsageCounters()
+    for host, code, count, last_action, comment in observations:
+        counters.observe(host, code, count, last_action, comment)
+    for host in hosts:
+        counters.hosts[host] = 100.0
+    return counters
+
+
+def merged(*states):
+    result = UsageCounters()
+    for counters in states:
+        result.merge(counters)
+    return result.to_dict()
+
+
+def random_state(rng, host):
+    return state([(host, rng.choice("abcd"), rng.randint(0, 20), float(rng.randint(0, 50)),
+                   rng.choice(["", "x", "y"]))
+                  for _ in range(rng.randint(0, 6))], hosts=[host])
+
+
+def test_keeps_the_max_per_host_and_sums_hosts():
+    mac = state([("mac", "xdl", 3, 10.0, "")])
+    later = state([("mac", "xdl", 5, 20.0, "")])
+    mini = state([("mini", "xdl", 2, 15.0, "")])
+
+    counters = UsageCounters().merge(mac).merge(later).merge(mini).merge(mac)
+
+    assert counters.counts["xdl"] == {"mac": 5, "mini": 2}
+    assert counters.total("xdl") == 7
+    assert counters.total("xdl", exclude_host="mac") == 2
+
+
+def test_newest_last_action_wins_and_brings_its_comment():
+    old = state([("mac", "xdl", 1, 10.0, "Old label")])
+    new = state([("mini", "xdl", 1, 20.0, "New label")])
+
+    for first, second in [(old, new), (new, old)]:
+        counters = UsageCounters().merge(first).merge(second)
+        assert counters.last_action["xdl"] == 20.0
+        assert counters.comments["xdl"] == "New label"
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_merge_is_commutative_associative_and_idempotent(seed):
+    rng = random.Random(seed)
+    states = [random_state(rng, host) for host in ("mac", "mini", "air")]
+    expected = merged(*states)
+
+    for order in itertools.permutations(states):
+        assert merged(*order) == expected
+    a, b, c = states
+    assert merged(UsageCounters().merge(a).merge(b), c) == merged(a, UsageCounters().merge(b).merge(c))
+    assert merged(*states, *states) == expected
+
+
+def test_snapshot_round_trips(tmp_path):
+    counters = state([("mac", "xdl", 3, 10.5, "Local"), ("mini", "v1k", 1, 2.0, "")], hosts=["mac"])
+    path = tmp_path / "snapshot.json"
+
+    counters.save(path)
+
+    assert UsageCounters.load(path).to_dict() == counters.to_dict()
+    assert UsageCounters.load(tmp_path / "missing.json").to_dict()["entries"] == {}
+
+
+def test_unknown_snapshot_format_is_rejected():
+    with pytest.raises(ValueError, match="format"):
+        UsageCounters.from_dict({"format": 99})
+
+
+def test_local_counters_add_this_host_to_the_merged_state(tmp_path):
+    csv_path = tmp_path / "usage.csv"
+    csv_path.write_text("code,count,last_action,comment\nxdl,4,2026-01-01 09:00:00,Local\n")
+    state([("mini", "xdl", 2, 0.0, "")]).save(merged_path(csv_path))
+
+    counters = local_counters(csv_path, host="mac")
+
+    assert counters.counts["xdl"] == {"mac": 4, "mini": 2}
+    assert counters.comments["xdl"] == "Local"
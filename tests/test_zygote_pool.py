@@ -0,0 +1,120 @@
+import shutil
+import sys
+
+import pytest
+
+import zygote_pool
+from zygote_pool import ZygotePool
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="workers need POSIX pipes")
+
+# Appends the worker's pid to the file named in argv, then does what the second argument says
+HELPER = '''
+import os, sys, time
+
+def main(argv):
+    with open(argv[0], "a") as f:
+        f.write(f"{os.getpid()}\\n")
+    action = argv[1] if len(argv) > 1 else ""
+    if action == "crash":
+        os._exit(1)
+    if action == "hang":
+        time.sleep(10)
+    if action == "grow":
+        main.ballast = b"x" * (64 * 1024 * 1024)
+    if action == "fail":
+        return 1
+'''
+
+
+@pytest.fixture
+def helper(tmp_path):
+    path = tmp_path / "helper.py"
+    path.write_text(HELPER)
+    return path
+
+
+@pytest.fixture
+def make_pool(tmp_path):
+    pools = []
+
+    def make(**kwargs):
+        kwargs.setdefault("size", 1)
+        pool = ZygotePool(tmp_path, preload=(), timeout=10.0, **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def pids(tmp_path):
+    return (tmp_path / "pids").read_text().split()
+
+
+def run(pool, helper, tmp_path, *args, timeout=None):
+    return pool.run(helper, [str(tmp_path / "pids"), *args], timeout=timeout)
+
+
+def test_runs_main_argv_in_a_reused_worker(make_pool, helper, tmp_path):
+    pool = make_pool()
+
+    assert run(pool, helper, tmp_path) is True
+    assert run(pool, helper, tmp_path, "fail") is False
+
+    first, second = pids(tmp_path)
+    assert first == second != str(zygote_pool.os.getpid())
+
+
+def test_worker_is_replaced_after_max_jobs(make_pool, helper, tmp_path):
+    pool = make_pool(max_jobs=2)
+    for _ in range(3):
+        assert run(pool, helper, tmp_path)
+
+    first, second, third = pids(tmp_path)
+    assert first == second != third
+
+
+def test_worker_is_replaced_when_its_memory_grows(make_pool, helper, tmp_path):
+    pool = make_pool(max_rss_growth_mb=16)
+    assert run(pool, helper, tmp_path, "grow")
+    assert run(pool, helper, tmp_path)
+
+    first, second = pids(tmp_path)
+    assert first != second
+
+
+def test_crashing_helper_only_takes_its_worker_down(make_pool, helper, tmp_path):
+    pool = make_pool(max_failures=1)
+    assert run(pool, helper, tmp_path)
+
+    assert run(pool, helper, tmp_path, "crash") is False
+    assert run(pool, helper, tmp_path) is True
+
+    first, crashed, replacement = pids(tmp_path)
+    assert first == crashed != replacement
+    # Workers that were ready when they died do not count towards max_failures
+    assert pool.failures == 0
+
+
+def test_hanging_helper_is_killed_at_the_timeout(make_pool, helper, tmp_path):
+    pool = make_pool()
+
+    assert run(pool, helper, tmp_path, "hang", timeout=0.5) is False
+    assert run(pool, helper, tmp_path) is True
+
+    hung, replacement = pids(tmp_path)
+    assert hung != replacement
+
+
+def test_falls_back_to_subprocesses_when_workers_keep_failing_to_start(make_pool, helper, tmp_path, monkeypatch):
+    # Every worker exits before it reports ready
+    monkeypatch.setattr(zygote_pool.sys, "executable", shutil.which("false"))
+    pool = make_pool(max_failures=2)
+
+    results = [run(pool, helper, tmp_path) for _ in range(4)]
+
+    assert results[-1] is None
+    assert pool.failures >= 2
+    assert not (tmp_path / "pids").exists()
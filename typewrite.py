@@ -32,13 +32,13 @@ def typewrite(text, press_enter=False, delay=0.01):
 
     print(f"Typed: {text}{' + Enter' if press_enter else ''}")
 
-def main():
+def main(argv=None):
     parser = argparse.ArgumentParser(description='Type text using keyboard simulation')
     parser.add_argument('text', nargs='+', help='The text to type')
     parser.add_argument('-e', '--enter', action='store_true', help='Press Enter after typing')
     parser.add_argument('-d', '--delay', type=float, default=0.01, help='Delay between keypresses in seconds')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     # Join all text arguments into a single string
     text = ' '.join(args.text)
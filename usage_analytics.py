@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+
+import argparse
+import array
+import sys
+import time
+from collections import Counter, defaultdict, deque
+from datetime import datetime
+from pathlib import Path
+from action_executor import RUN_OK, RUN_FAILED
+from usage_history import COLUMNS, DAY, UsageHistory
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+PERCENTILES = (50, 90, 99)
+# Only runs that actually ran have a meaningful duration
+TIMED_STATUSES = (RUN_OK, RUN_FAILED)
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+
+
+def _utc_offsets(days):
+    """UTC offset in seconds of each day (days since the epoch), so local hours follow DST changes"""
+    return [datetime.fromtimestamp(day * DAY + DAY // 2).astimezone().utcoffset().total_seconds()
+            for day in days]
+
+
+def _rank(count, percentile):
+    """Index of the nearest-rank percentile in `count` sorted values"""
+    return max(-(-percentile * count // 100) - 1, 0)
+
+
+class UsageAnalytics:
+    """Whole-history analysis over the columnar usage history.
+
+    The history columns are concatenated once, into NumPy arrays when NumPy
+    is installed and into array.array otherwise. Every analysis has a
+    vectorized NumPy path and a plain loop over the arrays as fallback; both
+    return the same results.
+    """
+
+    def __init__(self, columns, dictionary, use_numpy=None):
+        self.columns = columns
+        self.dictionary = dictionary
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+
+    @classmethod
+    def from_history(cls, history, start=None, end=None, use_numpy=None):
+        use_numpy = np is not None if use_numpy is None else use_numpy
+        parts = {field: [] for field, _ in COLUMNS}
+        for segment in history.columns(start, end):
+            for field, _ in COLUMNS:
+                parts[field].append(segment[field])
+
+        if use_numpy:
+            columns = {field: np.concatenate([np.frombuffer(part, dtype=typecode) for part in parts[field]])
+                       if parts[field] else np.empty(0, dtype=typecode)
+                       for field, typecode in COLUMNS}
+            if start is not None or end is not None:
+                ts = columns["ts"]
+                keep = np.ones(len(ts), dtype=bool)
+                if start is not None:
+                    keep &= ts >= start
+                if end is not None:
+                    keep &= ts <= end
+                columns = {field: column[keep] for field, column in columns.items()}
+        else:
+            columns = {}
+            for field, typecode in COLUMNS:
+                column = array.array(typecode)
+                for part in parts[field]:
+                    column.frombytes(part.cast('B'))
+                columns[field] = column
+            if start is not None or end is not None:
+                keep = [(start is None or epoch >= start) and (end is None or epoch <= end)
+                        for epoch in columns["ts"]]
+                columns = {field: array.array(typecode, (value for value, kept in zip(columns[field], keep) if kept))
+                           for field, typecode in COLUMNS}
+        return cls(columns, history.dictionary, use_numpy)
+
+    @classmethod
+    def for_csv(cls, csv_path, days=None, use_numpy=None):
+        history = UsageHistory.for_csv(csv_path).load(read_only=True)
+        start = time.time() - days * DAY if days else None
+        return cls.from_history(history, start=start, use_numpy=use_numpy)
+
+    def __len__(self):
+        return len(self.columns["ts"])
+
+    @property
+    def engine(self):
+        return "numpy" if self.use_numpy else "array"
+
+    def heatmap(self):
+        """Action counts as 7 rows (Monday first) of 24 local hours"""
+        ts = self.columns["ts"]
+        if self.use_numpy:
+            days = (ts // DAY).astype(np.int64)
+            first = int(days.min()) if len(days) else 0
+            last = int(days.max()) if len(days) else -1
+            offsets = np.array(_utc_offsets(range(first, last + 1)), dtype=np.float64)
+            local = ts + offsets[days - first]
+            hours = (local // 3600 % 24).astype(np.int64)
+            weekdays = ((local // DAY + EPOCH_WEEKDAY) % 7).astype(np.int64)
+            return np.bincount(weekdays * 24 + hours, minlength=7 * 24).reshape(7, 24).tolist()
+
+        grid = [[0] * 24 for _ in range(7)]
+        offsets = {}
+        for epoch in ts:
+            day = int(epoch // DAY)
+            offset = offsets.get(day)
+            if offset is None:
+                offset = offsets[day] = _utc_offsets([day])[0]
+            local = epoch + offset
+            grid[int(local // DAY + EPOCH_WEEKDAY) % 7][int(local // 3600 % 24)] += 1
+        return grid
+
+    def latency(self, percentiles=PERCENTILES):
+        """(code, runs, failures, {percentile: seconds}) per combo with timed runs, slowest first"""
+        rows = []
+        if self.use_numpy:
+            status = self.columns["status"]
+            timed = np.isin(status, TIMED_STATUSES)
+            combos = self.columns["combo"][timed]
+            durations = self.columns["duration"][timed]
+            failed = status[timed] == RUN_FAILED
+            # One sort by combo, then duration: durations are non-negative and
+            # below the stride, so the combined float64 key orders both at once
+            stride = float(durations.max()) + 1 if len(durations) else 1.0
+            order = np.argsort(combos * stride + durations)
+            combos, durations, failed = combos[order], durations[order], failed[order]
+            ids, starts, counts = np.unique(combos, return_index=True, return_counts=True)
+            failures = np.add.reduceat(failed.astype(np.int64), starts) if len(starts) else starts
+            values = {p: durations[starts + np.maximum(-(-p * counts // 100) - 1, 0)].tolist()
+                      for p in percentiles}
+            for i, (combo_id, count, failure_count) in enumerate(zip(ids.tolist(), counts.tolist(),
+                                                                     failures.tolist())):
+                rows.append((self.dictionary.code(combo_id), count, failure_count,
+                             {p: values[p][i] for p in percentiles}))
+        else:
+            durations = defaultdict(list)
+            failures = Counter()
+            for combo_id, duration, status in zip(self.columns["combo"], self.columns["duration"],
+                                                  self.columns["status"]):
+                if status in TIMED_STATUSES:
+                    durations[combo_id].append(duration)
+                    if status == RUN_FAILED:
+                        failures[combo_id] += 1
+            for combo_id in sorted(durations):
+                values = sorted(durations[combo_id])
+                rows.append((self.dictionary.code(combo_id), len(values), failures[combo_id],
+                             {p: values[_rank(len(values), p)] for p in percentiles}))
+
+        median = percentiles[0] if percentiles else None
+        rows.sort(key=lambda row: (-row[3][median] if median is not None else 0, row[0]))
+        return rows
+
+    def sequences(self, n=2, gap=300, min_support=5):
+        """(prefix codes, next code, count, share) for every n-gram of consecutive actions.
+
+        Consecutive means no more than `gap` seconds between each action and
+        the next. `share` is how often the prefix is followed by that code,
+        out of every time it is followed by anything; prefixes seen fewer
+        than `min_support` times are left out. Actions with the same
+        timestamp count in the order they were recorded. Strongest rules first.
+        """
+        if n < 2:
+            raise ValueError("n-grams need at least two actions")
+        ts = self.columns["ts"]
+        combos = self.columns["combo"]
+        grams = {}
+
+        if self.use_numpy:
+            size = len(ts) - n + 1
+            if size > 0:
+                order = np.argsort(ts, kind="stable")
+                ts, combos = ts[order], combos[order].astype(np.int64)
+                base = int(combos.max()) + 1
+                if base ** n >= 2 ** 63:
+                    raise ValueError(f"{n}-grams over {base} combos do not fit in 64-bit keys")
+                within = np.diff(ts) <= gap
+                keep = np.ones(size, dtype=bool)
+                keys = np.zeros(size, dtype=np.int64)
+                for i in range(n):
+                    if i < n - 1:
+                        keep &= within[i:i + size]
+                    keys = keys * base + combos[i:i + size]
+                keys, counts = np.unique(keys[keep], return_counts=True)
+                for key, count in zip(keys.tolist(), counts.tolist()):
+                    gram = []
+                    for _ in range(n):
+                        key, combo_id = divmod(key, base)
+                        gram.append(combo_id)
+                    grams[tuple(reversed(gram))] = count
+        else:
+            window = deque(maxlen=n)
+            counts = Counter()
+            last = None
+            for epoch, combo_id in sorted(zip(ts, combos), key=lambda action: action[0]):
+                if last is not None and epoch - last > gap:
+                    window.clear()
+                last = epoch
+                window.append(combo_id)
+                if len(window) == n:
+                    counts[tuple(window)] += 1
+            grams = counts
+
+        support = Counter()
+        for gram, count in grams.items():
+            support[gram[:-1]] += count
+
+        code = self.dictionary.code
+        rows = [(tuple(code(combo_id) for combo_id in gram[:-1]), code(gram[-1]), count,
+                 count / support[gram[:-1]])
+                for gram, count in grams.items() if support[gram[:-1]] >= min_support]
+        rows.sort(key=lambda row: (-row[3], -row[2], row[0], row[1]))
+        return rows
+
+
+def print_heatmap(grid):
+    print("Actions by local hour")
+    print("     " + "".join(f"{hour:>5}" for hour in range(24)))
+    for weekday, counts in zip(WEEKDAYS, grid):
+        print(f"{weekday:<5}" + "".join(f"{count:>5}" if count else "    ." for count in counts))
+    busiest = max(((count, weekday, hour) for weekday, counts in enumerate(grid)
+                   for hour, count in enumerate(counts)), default=(0, 0, 0))
+    if busiest[0]:
+        print(f"Busiest: {WEEKDAYS[busiest[1]]} {busiest[2]:02d}:00 ({busiest[0]} actions)")
+
+
+def print_latency(rows, limit):
+    print("Run durations (seconds)")
+    if not rows:
+        print("  No timed runs recorded yet")
+        return
+    percentiles = list(rows[0][3])
+    print(f"  {'Combo':<12}{'Runs':>7}{'Failed':>8}" + "".join(f"{'p' + str(p):>9}" for p in percentiles))
+    for code, runs, failures, values in rows[:limit]:
+        print(f"  {code:<12}{runs:>7}{failures:>8}" + "".join(f"{values[p]:>9.3f}" for p in percentiles))
+
+
+def print_sequences(rows, limit):
+    print("Sequences")
+    if not rows:
+        print("  Not enough consecutive actions yet")
+        return
+    for prefix, follower, count, share in rows[:limit]:
+        print(f"  {' -> '.join(prefix)} is followed by {follower} {share:.0%} of the time ({count}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze the per-action usage history")
+    parser.add_argument("--file", type=Path,
+                        default=Path(__file__).parent.absolute() / "key_listener_actions.csv",
+                        help="Usage CSV whose history to analyze (default: key_listener_actions.csv)")
+    parser.add_argument("--days", type=float, help="Only analyze the last N days (default: everything)")
+    parser.add_argument("--report", choices=("heatmap", "latency", "sequences", "all"), default="all")
+    parser.add_argument("--top", type=int, default=15, help="Rows per report (default: 15)")
+    parser.add_argument("-n", "--ngram", type=int, default=2,
+                        help="Sequence length, including the follower (default: 2)")
+    parser.add_argument("--gap", type=float, default=300,
+                        help="Max seconds between actions in a sequence (default: 300)")
+    parser.add_argument("--min-support", type=int, default=5,
+                        help="Min occurrences of a sequence prefix (default: 5)")
+    parser.add_argument("--no-numpy", action="store_true", help="Use the array fallback even if NumPy is installed")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    analytics = UsageAnalytics.for_csv(args.file, days=args.days, use_numpy=False if args.no_numpy else None)
+    loaded = time.perf_counter()
+
+    reports = ("heatmap", "latency", "sequences") if args.report == "all" else (args.report,)
+    for report in reports:
+        if report == "heatmap":
+            print_heatmap(analytics.heatmap())
+        elif report == "latency":
+            print_latency(analytics.latency(), args.top)
+        else:
+            try:
+                print_sequences(analytics.sequences(args.ngram, args.gap, args.min_support), args.top)
+            except ValueError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+        print()
+
+    finished = time.perf_counter()
+    print(f"Analyzed {len(analytics)} actions with {analytics.engine} "
+          f"(load {(loaded - started) * 1000:.0f} ms, analysis {(finished - loaded) * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
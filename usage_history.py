@@ -0,0 +1,465 @@
+import array
+import csv
+import gzip
+import io
+import json
+import logging
+import mmap
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from usage_log import write_atomic
+
+DAY = 86400
+
+# One fixed-width column file per field; a record is the same index in every
+# column. Native byte order: the files are read on the machine that wrote them.
+COLUMNS = (("ts", "d"), ("combo", "I"), ("duration", "f"), ("status", "h"))
+TYPECODES = dict(COLUMNS)
+ITEM_SIZES = {field: array.array(typecode).itemsize for field, typecode in COLUMNS}
+RECORD_SIZE = sum(ITEM_SIZES.values())
+
+# Status of an action whose run never reported back (older history, app
+# launches before durations were recorded, or a run still in flight when
+# the listener stopped)
+STATUS_UNKNOWN = -1
+
+
+def event_epoch(event):
+    """Epoch seconds of a logged action, falling back to its formatted timestamp"""
+    epoch = event.get("epoch")
+    if epoch is not None:
+        return float(epoch)
+    try:
+        return datetime.strptime(event["ts"], "%Y-%m-%d %H:%M:%S").timestamp()
+    except (KeyError, ValueError):
+        return time.time()
+
+
+def _read_csv_rows(path):
+    """(epoch, code) rows of history written in the older CSV format"""
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, 'rb') as raw:
+        for row in csv.reader(io.TextIOWrapper(raw, encoding='utf-8', newline='')):
+            if len(row) != 3:
+                continue
+            try:
+                yield float(row[1]), row[2]
+            except ValueError:
+                continue
+
+
+def _map_column(path, field, count):
+    """(mmap, view): the first `count` items of a column file as a memoryview over an mmap
+    (no parsing, no copy). The mmap is None for an empty column; otherwise the caller closes it.
+    """
+    size = count * ITEM_SIZES[field]
+    if size == 0:
+        return None, memoryview(b"").cast(TYPECODES[field])
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    with memoryview(mapped) as whole:
+        return mapped, whole[:size].cast(TYPECODES[field])
+
+
+class ComboDictionary:
+    """Interns combo codes to small integer ids.
+
+    Stored as a text file with one code per line; a code's id is its line
+    number, so ids never change once assigned.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.codes = []
+        self.ids = {}
+
+    def load(self):
+        self.codes = []
+        self.ids = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8', newline='') as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        # Still being written by the listener
+                        break
+                    self._add(line[:-1])
+        return self
+
+    def _add(self, code):
+        self.ids[code] = len(self.codes)
+        self.codes.append(sys.intern(code))
+
+    def intern(self, code):
+        combo_id = self.ids.get(code)
+        if combo_id is None:
+            with open(self.path, 'a', encoding='utf-8', newline='') as f:
+                f.write(code + "\n")
+            self._add(code)
+            combo_id = len(self.codes) - 1
+        return combo_id
+
+    def code(self, combo_id):
+        if combo_id >= len(self.codes):
+            # Another process may have interned new codes since we loaded
+            self.load()
+        return self.codes[combo_id] if combo_id < len(self.codes) else f"#{combo_id}"
+
+
+class UsageHistory:
+    """One record per action, in rotated, compressed, columnar segments.
+
+    A record is (timestamp, combo id, duration, exit status) stored as
+    fixed-width columns. The active segment keeps one file per column
+    (`<name>.ts`, `.combo`, `.duration`, `.status`), appended to with
+    array.tofile() and read back through mmap without parsing. Combo codes
+    are interned to ids in `combos.txt`. Segments are named after the
+    epoch (ms) of their first event.
+
+    Once the active segment reaches `segment_max_bytes` or is
+    `segment_max_hours` old it is closed: its columns are concatenated into
+    one gzip file, which decompresses straight back into arrays, and a small
+    JSON index (time range, event count, combo ids) is written next to it.
+    Queries use the indexes to skip segments outside the requested range or
+    combos, and closed segments whose last event is older than
+    `retention_days` are deleted.
+
+    Actions are recorded when they are logged, with an unknown status;
+    complete() fills in the duration and status once the run reports back:
+    in place in the active segment, or by rewriting the compressed file if
+    the segment was closed in the meantime. Positions returned by
+    append_many() are (segment, record count) and stay valid after the
+    segment is compressed.
+
+    Open segments are read through mmaps, which stay listed in `maps` until
+    the segment is closed (or a later read finds nothing still using them).
+    """
+
+    def __init__(self, directory, segment_max_bytes=1_000_000, segment_max_hours=168, retention_days=730,
+                 legacy_path=None):
+        self.directory = Path(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_hours * 3600
+        self.retention_days = retention_days
+        self.legacy_path = Path(legacy_path) if legacy_path else None
+        self.dictionary = ComboDictionary(self.directory / "combos.txt")
+        self.indexes = {}
+        self.active = None
+        self.active_first = None
+        self.active_count = 0
+        # event id -> (segment, record index) of actions whose run has not reported back
+        self.pending = {}
+        # open segment -> mmaps of its column files handed out by _read_open()
+        self.maps = {}
+
+    @classmethod
+    def for_csv(cls, csv_path, **kwargs):
+        csv_path = Path(csv_path)
+        # Older versions kept the whole history in one flat <stem>_history.csv
+        return cls(csv_path.with_name(csv_path.stem + "_history"),
+                   legacy_path=csv_path.with_name(csv_path.stem + "_history.csv"), **kwargs)
+
+    def _path(self, name, suffix):
+        return self.directory / f"{name}{suffix}"
+
+    def load(self, read_only=False):
+        """Scan the segments; unless `read_only`, also finish interrupted rotations and apply retention"""
+        self.dictionary.load()
+        if read_only:
+            return self._scan_read_only()
+        self.directory.mkdir(exist_ok=True)
+        self._convert_csv_segments()
+
+        for gz_path in self.directory.glob("*.cols.gz"):
+            name = gz_path.name[:-len(".cols.gz")]
+            try:
+                with open(self._path(name, ".json"), 'r', encoding='utf-8') as f:
+                    self.indexes[name] = json.load(f)
+            except (OSError, ValueError):
+                # Crashed between compressing and indexing
+                self.indexes[name] = self._write_index(name, self._read_closed(name, None))
+            # Crashed after indexing, before removing the column files
+            for field, _ in COLUMNS:
+                self._path(name, "." + field).unlink(missing_ok=True)
+
+        open_segments = sorted(path.stem for path in self.directory.glob("*.ts"))
+        for name in open_segments[:-1]:
+            self._close_segment(name)
+        if open_segments:
+            self.active = open_segments[-1]
+            self.active_count = self._repair(self.active)
+            ts = self._read_open(self.active, self.active_count)["ts"]
+            self.active_first = ts[0] if len(ts) else int(self.active) / 1000.0
+
+        self.maintain()
+        return self
+
+    def _scan_read_only(self):
+        # For other processes (sheet.py): never write while the listener owns the files
+        for index_path in self.directory.glob("*.json"):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self.indexes[index_path.stem] = json.load(f)
+            except (OSError, ValueError):
+                continue
+        open_segments = sorted(path.stem for path in self.directory.glob("*.ts") if path.stem not in self.indexes)
+        if open_segments:
+            self.active = open_segments[-1]
+            self.active_count = self._open_count(self.active)
+        return self
+
+    def _convert_csv_segments(self):
+        # History written before the columnar format (the flat legacy file
+        # and CSV segments); each becomes one closed columnar segment
+        paths = sorted(self.directory.glob("*.csv")) + sorted(self.directory.glob("*.csv.gz"))
+        if self.legacy_path is not None and self.legacy_path.exists():
+            paths.insert(0, self.legacy_path)
+        for path in paths:
+            rows = list(_read_csv_rows(path))
+            if path.parent == self.directory:
+                self._path(path.name.split(".")[0], ".json").unlink(missing_ok=True)
+            if rows:
+                name = self._name(rows[0][0])
+                self._write_open(name, [(epoch, self.dictionary.intern(code), 0.0, STATUS_UNKNOWN)
+                                        for epoch, code in rows])
+                self._close_segment(name)
+            path.unlink()
+            logging.info(f"Converted {len(rows)} usage history rows from {path}")
+
+    def _name(self, epoch):
+        stamp = int(epoch * 1000)
+        while self._path(f"{stamp:013d}", ".ts").exists() or f"{stamp:013d}" in self.indexes:
+            stamp += 1
+        return f"{stamp:013d}"
+
+    def _open_count(self, name):
+        counts = []
+        for field, _ in COLUMNS:
+            path = self._path(name, "." + field)
+            counts.append((path.stat().st_size if path.exists() else 0) // ITEM_SIZES[field])
+        return min(counts)
+
+    def _repair(self, name):
+        # A crash between column appends leaves some columns one batch longer
+        count = self._open_count(name)
+        for field, _ in COLUMNS:
+            with open(self._path(name, "." + field), 'ab') as f:
+                f.truncate(count * ITEM_SIZES[field])
+        return count
+
+    def maintain(self, now=None):
+        """Close an active segment that is too old and delete expired segments"""
+        now = time.time() if now is None else now
+        if self.active is not None and now - self.active_first >= self.segment_max_age:
+            self.rotate()
+        oldest = now - self.retention_days * DAY
+        for name, index in sorted(self.indexes.items()):
+            if index["last"] < oldest:
+                for suffix in (".cols.gz", ".json"):
+                    self._path(name, suffix).unlink(missing_ok=True)
+                del self.indexes[name]
+                logging.info(f"Deleted expired usage history segment {name}")
+
+    def _write_open(self, name, records):
+        columns = [array.array(typecode) for _, typecode in COLUMNS]
+        for record in records:
+            for column, value in zip(columns, record):
+                column.append(value)
+        for (field, _), column in zip(COLUMNS, columns):
+            with open(self._path(name, "." + field), 'ab') as f:
+                column.tofile(f)
+
+    def append_many(self, events):
+        """Append the action events and return the position after them"""
+        first = event_epoch(events[0])
+        if self.active is not None and (self.active_count * RECORD_SIZE >= self.segment_max_bytes
+                                        or first - self.active_first >= self.segment_max_age):
+            self.rotate()
+            self.maintain(first)
+        if self.active is None:
+            self.active = self._name(first)
+            self.active_first = first
+            self.active_count = 0
+
+        records = []
+        for event in events:
+            if "id" in event:
+                self.pending[event["id"]] = (self.active, self.active_count + len(records))
+            records.append((event_epoch(event), self.dictionary.intern(event["code"]), 0.0, STATUS_UNKNOWN))
+        self._write_open(self.active, records)
+        self.active_count += len(records)
+        return [self.active, self.active_count]
+
+    def complete(self, event_id, duration, status):
+        """Record how long the run of a logged action took and how it ended"""
+        location = self.pending.pop(event_id, None)
+        if location is None:
+            return False
+        name, index = location
+        values = (("duration", duration), ("status", status))
+        if name == self.active:
+            for field, value in values:
+                with open(self._path(name, "." + field), 'r+b') as f:
+                    f.seek(index * ITEM_SIZES[field])
+                    f.write(array.array(TYPECODES[field], [value]).tobytes())
+        elif name in self.indexes:
+            # The run was still in flight when its segment was closed
+            self._patch_closed(name, index, values)
+        else:
+            # Deleted by retention in the meantime
+            return False
+        return True
+
+    def _patch_closed(self, name, index, values):
+        with gzip.open(self._path(name, ".cols.gz"), 'rb') as f:
+            data = bytearray(f.read())
+        count = len(data) // RECORD_SIZE
+        offsets = {}
+        offset = 0
+        for field, _ in COLUMNS:
+            offsets[field] = offset
+            offset += count * ITEM_SIZES[field]
+        for field, value in values:
+            start = offsets[field] + index * ITEM_SIZES[field]
+            data[start:start + ITEM_SIZES[field]] = array.array(TYPECODES[field], [value]).tobytes()
+        self._write_closed(name, [data])
+
+    def rotate(self):
+        """Close the active segment; the next append starts a new one"""
+        if self.active is None:
+            return
+        self._close_segment(self.active)
+        self.active = None
+        self.active_first = None
+        self.active_count = 0
+
+    def _close_segment(self, name):
+        columns = self._read_open(name, self._open_count(name))
+        self._write_closed(name, [columns[field] for field, _ in COLUMNS])
+        self.indexes[name] = self._write_index(name, columns)
+        for field, _ in COLUMNS:
+            columns[field].release()
+        if self._unmap(name):
+            logging.warning(f"Usage history segment {name} is still being read while it is closed")
+        for field, _ in COLUMNS:
+            self._path(name, "." + field).unlink()
+
+    def _write_closed(self, name, chunks):
+        gz_path = self._path(name, ".cols.gz")
+        tmp_path = gz_path.with_name(gz_path.name + ".tmp")
+        with gzip.open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, gz_path)
+
+    def _unmap(self, name):
+        """Close the mmaps of a segment that no view uses any more; returns the ones still in use"""
+        still_used = []
+        for mapped in self.maps.pop(name, ()):
+            try:
+                mapped.close()
+            except BufferError:
+                # A caller still holds a view; the mmap goes when that view does
+                still_used.append(mapped)
+        return still_used
+
+    def close(self):
+        """Close the mmaps of every open segment"""
+        for name in list(self.maps):
+            self._unmap(name)
+
+    def _write_index(self, name, columns):
+        ts = columns["ts"]
+        if len(ts):
+            first, last = min(ts), max(ts)
+        else:
+            first = last = int(name) / 1000.0
+        index = {"first": first, "last": last, "events": len(ts), "combos": sorted(set(columns["combo"]))}
+        write_atomic(self._path(name, ".json"), lambda f: json.dump(index, f))
+        return index
+
+    def _read_open(self, name, count):
+        # Reads of the active segment come and go; drop the maps nothing uses any more
+        maps = self.maps[name] = self._unmap(name)
+        columns = {}
+        for field, _ in COLUMNS:
+            mapped, columns[field] = _map_column(self._path(name, "." + field), field, count)
+            if mapped is not None:
+                maps.append(mapped)
+        return columns
+
+    def _read_closed(self, name, count):
+        with gzip.open(self._path(name, ".cols.gz"), 'rb') as f:
+            data = memoryview(f.read())
+        if count is None:
+            count = len(data) // RECORD_SIZE
+        columns = {}
+        offset = 0
+        for field, typecode in COLUMNS:
+            size = count * ITEM_SIZES[field]
+            columns[field] = data[offset:offset + size].cast(typecode)
+            offset += size
+        return columns
+
+    def _segments(self):
+        """(name, index) for every segment, oldest first; the active one has no index"""
+        segments = sorted(self.indexes.items())
+        if self.active is not None:
+            segments.append((self.active, None))
+        return segments
+
+    def read_columns(self, name, index=None):
+        """Column name -> memoryview over the segment's records"""
+        if index is None:
+            return self._read_open(name, self.active_count)
+        return self._read_closed(name, index["events"])
+
+    def columns(self, start=None, end=None, codes=None):
+        """Yield the columns of every segment that may hold actions in [start, end] for `codes`"""
+        combo_ids = None
+        if codes is not None:
+            combo_ids = {self.dictionary.ids[code] for code in codes if code in self.dictionary.ids}
+        for name, index in self._segments():
+            if index is not None:
+                if (start is not None and index["last"] < start) or (end is not None and index["first"] > end):
+                    continue
+                if combo_ids is not None and combo_ids.isdisjoint(index["combos"]):
+                    continue
+            yield self.read_columns(name, index)
+
+    def end(self):
+        """Position after the last event written, or None if there is no history"""
+        if self.active is not None:
+            return [self.active, self.active_count]
+        if self.indexes:
+            name = max(self.indexes)
+            return [name, self.indexes[name]["events"]]
+        return None
+
+    def read_from(self, position=None):
+        """Yield (epoch, code) for actions recorded after `position` (everything if None)"""
+        name, offset = position if position else (None, 0)
+        code = self.dictionary.code
+        for segment, index in self._segments():
+            if name is not None and segment < name:
+                continue
+            columns = self.read_columns(segment, index)
+            first = offset if segment == name else 0
+            for epoch, combo_id in zip(columns["ts"][first:], columns["combo"][first:]):
+                yield epoch, code(combo_id)
+
+    def read_range(self, start=None, end=None, codes=None):
+        """Yield (epoch, code, duration, status) for actions in [start, end], optionally only for `codes`"""
+        codes = set(codes) if codes is not None else None
+        code = self.dictionary.code
+        for columns in self.columns(start, end, codes):
+            for epoch, combo_id, duration, status in zip(columns["ts"], columns["combo"],
+                                                         columns["duration"], columns["status"]):
+                if start is not None and epoch < start:
+                    continue
+                if end is not None and epoch > end:
+                    continue
+                if codes is None or code(combo_id) in codes:
+                    yield epoch, code(combo_id), duration, status
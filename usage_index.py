@@ -0,0 +1,135 @@
+import heapq
+from collections import OrderedDict
+
+
+class _Bucket:
+    """The codes used exactly `count` times; a node in the list of buckets"""
+
+    __slots__ = ("count", "codes", "prev", "next")
+
+    def __init__(self, count):
+        self.count = count
+        self.codes = set()
+        self.prev = self.next = self
+
+
+class UsageIndex:
+    """Ordered views of the usage counts, kept up to date per action.
+
+    Codes are grouped in buckets by count, as in an O(1) LFU cache: the
+    non-empty buckets form a doubly linked list in count order, so an
+    action moves its code from one bucket into the next one (created right
+    behind it if needed) in constant time, and top/least-used reads walk
+    the list from either end until they have `limit` codes. Recency is an
+    OrderedDict whose last key is the most recently used code.
+
+    Configured combos that have never been used sit in the zero bucket,
+    so least-used reports list them first without a set difference.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.buckets = {}
+        # Sentinel of the circular bucket list: root.next has the lowest count
+        self.root = _Bucket(None)
+        self.recency = OrderedDict()
+        self.configured = frozenset()
+        self.total = 0
+
+    def load(self, entries, count_of):
+        """Rebuild from {code: entry}; `count_of(entry)` returns its count"""
+        self.__init__()
+        counts = {entry['code']: count_of(entry) for entry in entries.values()}
+        # Built in count order, so each new bucket goes at the end of the list
+        for code, count in sorted(counts.items(), key=lambda item: item[1]):
+            self._add(code, count, self.root.prev)
+        for entry in sorted(entries.values(), key=lambda x: x['last_action']):
+            self.recency[entry['code']] = None
+        self.total = sum(counts.values())
+
+    def _add(self, code, count, after):
+        # `after` is the bucket the new count belongs right behind (or the root)
+        bucket = self.buckets.get(count)
+        if bucket is None:
+            bucket = self.buckets[count] = _Bucket(count)
+            bucket.prev, bucket.next = after, after.next
+            after.next.prev = bucket
+            after.next = bucket
+        bucket.codes.add(code)
+        self.counts[code] = count
+
+    def _take(self, code, count):
+        # Take code out of its bucket and unlink the bucket if that emptied it
+        bucket = self.buckets[count]
+        bucket.codes.discard(code)
+        if not bucket.codes:
+            bucket.prev.next = bucket.next
+            bucket.next.prev = bucket.prev
+            del self.buckets[count]
+
+    def _discard(self, code):
+        count = self.counts.pop(code, None)
+        if count is not None:
+            self._take(code, count)
+
+    def record(self, code):
+        count = self.counts.get(code)
+        if count is None:
+            # First use: right behind the zero bucket if there is one
+            self._add(code, 1, self.buckets.get(0, self.root))
+        else:
+            self._add(code, count + 1, self.buckets[count])
+            self._take(code, count)
+        self.recency[code] = None
+        self.recency.move_to_end(code)
+        self.total += 1
+
+    def remove(self, code):
+        count = self.counts.get(code)
+        if count is None:
+            return
+        self.total -= count
+        self.recency.pop(code, None)
+        self._discard(code)
+        if code in self.configured:
+            self._add(code, 0, self.root)
+
+    def set_configured(self, codes):
+        codes = frozenset(codes)
+        for code in self.configured - codes:
+            if code not in self.recency:
+                self._discard(code)
+        for code in codes - self.configured:
+            if code not in self.counts:
+                self._add(code, 0, self.root)
+        self.configured = codes
+
+    def _buckets(self, reverse=False):
+        bucket = self.root.prev if reverse else self.root.next
+        while bucket is not self.root:
+            yield bucket
+            bucket = bucket.prev if reverse else bucket.next
+
+    def _walk(self, buckets, limit):
+        codes = []
+        for bucket in buckets:
+            remaining = None if limit is None else limit - len(codes)
+            if remaining == 0:
+                break
+            codes.extend(sorted(bucket.codes) if remaining is None else heapq.nsmallest(remaining, bucket.codes))
+        return codes
+
+    def top(self, limit=None):
+        """Used codes, most used first (ties by code)"""
+        return self._walk((bucket for bucket in self._buckets(reverse=True) if bucket.count > 0), limit)
+
+    def least_used(self, limit=None):
+        """Codes with the lowest counts first, never-used configured combos included"""
+        return self._walk(self._buckets(), limit)
+
+    def recent(self, limit=None):
+        """Logged codes, most recently used first"""
+        codes = reversed(self.recency)
+        if limit is None:
+            return list(codes)
+        return [code for code, _ in zip(codes, range(limit))]
@@ -0,0 +1,179 @@
+import csv
+import json
+import logging
+import os
+from pathlib import Path
+from file_lock import file_lock
+
+CSV_FIELDS = ['code', 'count', 'last_action', 'comment']
+# Events that change the aggregates; others (e.g. run completions) only feed the history
+AGGREGATE_OPS = ("action", "prune", "rename")
+
+
+def newest_mtime(paths):
+    """The latest st_mtime_ns of the paths that exist, or None if none do"""
+    return max((path.stat().st_mtime_ns for path in paths if path.exists()), default=None)
+
+
+def retire(paths):
+    """Move files another backend has taken over aside as `<name>.migrated`, so they are never read again"""
+    for path in paths:
+        if path.exists():
+            os.replace(path, path.with_name(path.name + ".migrated"))
+            logging.info(f"Retired {path}")
+
+
+def write_atomic(path, write, newline=None):
+    """Write a file via a temp file + os.replace so readers never see it half written"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8', newline=newline) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class UsageEventLog:
+    """Append-only usage log plus a periodically compacted snapshot.
+
+    Each action appends one JSON line to `<name>.log`. Compaction folds the
+    aggregates into `<name>.snapshot.json` and starts a fresh log, so a
+    restart only replays the events since the last compaction. The snapshot
+    and the log header carry a generation number; a log whose generation
+    does not match the snapshot was already folded in and is ignored, which
+    keeps a crash between the two writes from double counting.
+
+    The CSV next to them is only a view for sheet.py and humans and is
+    rewritten by materialize_csv().
+    """
+
+    def __init__(self, csv_path):
+        self.csv_path = Path(csv_path)
+        self.log_path = self.csv_path.with_suffix(".log")
+        self.snapshot_path = self.csv_path.with_suffix(".snapshot.json")
+        self.generation = 0
+        self.records_since_compaction = 0
+        self.log_file = None
+
+    def load(self):
+        """Return {code: row} from the snapshot plus any events logged after it"""
+        entries = {}
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self.generation = snapshot.get("generation", 0)
+            entries = snapshot.get("entries", {})
+        elif not self.log_path.exists() and self.csv_path.exists():
+            entries = self.read_csv()
+            logging.info(f"Migrated {len(entries)} usage entries from {self.csv_path}")
+            self.compact(entries)
+            return entries
+
+        self.records_since_compaction = 0
+        if self.log_path.exists():
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                header = self._parse_line(f.readline())
+                if header and header.get("generation") == self.generation:
+                    for line in f:
+                        event = self._parse_line(line)
+                        if event:
+                            self.apply(entries, event)
+                            self.records_since_compaction += 1
+        return entries
+
+    def _parse_line(self, line):
+        try:
+            return json.loads(line) if line.strip() else None
+        except json.JSONDecodeError:
+            # A torn last line from a crash mid-append
+            return None
+
+    @staticmethod
+    def apply(entries, event):
+        if event["op"] == "action":
+            entry = entries.get(event["code"])
+            count = int(entry["count"]) + 1 if entry else 1
+            entries[event["code"]] = {
+                'code': event["code"],
+                'count': str(count),
+                'last_action': event["ts"],
+                'comment': event.get("comment", "")
+            }
+        elif event["op"] == "prune":
+            for code in event["codes"]:
+                entries.pop(code, None)
+        elif event["op"] == "rename":
+            for old, new in event["renames"]:
+                entry = entries.pop(old, None)
+                if entry is None:
+                    continue
+                target = entries.get(new)
+                if target is None:
+                    entries[new] = dict(entry, code=new)
+                else:
+                    # Both codes were used; keep the newer label and add the counts
+                    entries[new] = dict(target,
+                                        count=str(int(target['count']) + int(entry['count'])),
+                                        last_action=max(target['last_action'], entry['last_action']))
+
+    def _open_log(self):
+        if self.log_file is None:
+            fresh = not self.log_path.exists() or self.log_path.stat().st_size == 0
+            self.log_file = open(self.log_path, 'a', encoding='utf-8')
+            if fresh:
+                self.log_file.write(json.dumps({"generation": self.generation}) + "\n")
+        return self.log_file
+
+    def append(self, event):
+        self.append_many([event])
+
+    def append_many(self, events):
+        log_file = self._open_log()
+        log_file.write("".join(json.dumps(event) + "\n" for event in events))
+        log_file.flush()
+        self.records_since_compaction += len(events)
+
+    def compact(self, entries):
+        """Write the aggregates as a new snapshot generation and start an empty log"""
+        self.close()
+        self.generation += 1
+        write_atomic(self.snapshot_path,
+                     lambda f: json.dump({"generation": self.generation, "entries": entries}, f))
+        write_atomic(self.log_path,
+                     lambda f: f.write(json.dumps({"generation": self.generation}) + "\n"))
+        self.records_since_compaction = 0
+
+    def materialize_csv(self, entries):
+        def write_rows(f):
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            for code in sorted(entries):
+                writer.writerow(entries[code])
+        write_atomic(self.csv_path, write_rows, newline='')
+
+    def materialize_if_stale(self):
+        """Refresh the CSV view if the snapshot or log is newer than it"""
+        with file_lock(self.csv_path.with_suffix(".lock")):
+            sources = [p.stat().st_mtime_ns for p in (self.snapshot_path, self.log_path) if p.exists()]
+            if not sources:
+                return False
+            if self.csv_path.exists() and self.csv_path.stat().st_mtime_ns > max(sources):
+                return False
+            self.materialize_csv(self.load())
+            return True
+
+    def read_csv(self):
+        entries = {}
+        with open(self.csv_path, 'r', newline='', encoding='utf-8') as csvfile:
+            for row in csv.DictReader(csvfile):
+                if row.get('code'):
+                    entry = {field: row.get(field) or '' for field in CSV_FIELDS}
+                    entry['count'] = entry['count'].strip() if entry['count'].strip().isdigit() else '0'
+                    entries[row['code']] = entry
+        return entries
+
+    def close(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
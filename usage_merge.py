@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import logging
+import platform
+import sys
+from datetime import datetime
+from pathlib import Path
+from usage_log import UsageEventLog, newest_mtime, write_atomic
+
+SNAPSHOT_FORMAT = 1
+
+
+def host_name():
+    """Short name of this machine, used as its counter id"""
+    return platform.node().split(".")[0] or "localhost"
+
+
+def merged_path(csv_path):
+    """Where the merged usage of every host is kept, next to the usage CSV"""
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.stem + "_merged.json")
+
+
+def parse_last_action(value):
+    """Epoch seconds of a `last_action` column, or 0.0 if it is empty or malformed"""
+    try:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class UsageCounters:
+    """Usage counts from several hosts that merge like a G-counter.
+
+    Each code has one count per host, and only that host ever raises it.
+    Merging keeps the max per (code, host), the latest last_action per code,
+    and the comment with the latest (comment_at, comment), so merges can
+    happen in any order, any number of times, and still agree. comment_at is
+    the last_action the comment was seen with; an empty comment never
+    replaces one. The global count of a code is the sum over its hosts.
+    Times are kept as epoch seconds so hosts in different time zones
+    compare correctly.
+
+    A snapshot is the whole state, not a delta: a host exports what it has
+    merged from others along with its own counts, so snapshots can be
+    passed on through any host.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.last_action = {}
+        self.comments = {}
+        self.comment_at = {}
+        self.hosts = {}
+
+    def observe(self, host, code, count, last_action=0.0, comment=""):
+        """Fold in one host's count for one code"""
+        per_host = self.counts.setdefault(code, {})
+        if count > per_host.get(host, 0):
+            per_host[host] = count
+        self._observe_time(code, last_action)
+        self._observe_comment(code, comment, last_action)
+
+    def _observe_time(self, code, last_action):
+        if last_action > self.last_action.get(code, 0.0) or code not in self.last_action:
+            self.last_action[code] = last_action
+
+    def _observe_comment(self, code, comment, at):
+        if comment and (code not in self.comments or
+                        (at, comment) > (self.comment_at[code], self.comments[code])):
+            self.comments[code] = comment
+            self.comment_at[code] = at
+
+    def observe_entries(self, host, entries, exported_at):
+        """Fold in a host's own usage rows ({code: CSV row})"""
+        for code, entry in entries.items():
+            try:
+                count = int(entry.get('count') or 0)
+            except ValueError:
+                count = 0
+            self.observe(host, code, count, parse_last_action(entry.get('last_action')),
+                         entry.get('comment') or "")
+        self.hosts[host] = max(self.hosts.get(host, 0.0), exported_at)
+
+    def merge(self, other):
+        """Fold another state in; linear in the size of `other`"""
+        for code, per_host in other.counts.items():
+            mine = self.counts.setdefault(code, {})
+            for host, count in per_host.items():
+                if count > mine.get(host, 0):
+                    mine[host] = count
+        for code, last_action in other.last_action.items():
+            self._observe_time(code, last_action)
+        for code, comment in other.comments.items():
+            self._observe_comment(code, comment, other.comment_at[code])
+        for host, exported_at in other.hosts.items():
+            self.hosts[host] = max(self.hosts.get(host, 0.0), exported_at)
+        return self
+
+    def total(self, code, exclude_host=None):
+        return sum(count for host, count in self.counts.get(code, {}).items() if host != exclude_host)
+
+    def to_dict(self):
+        return {
+            "format": SNAPSHOT_FORMAT,
+            "hosts": self.hosts,
+            "entries": {code: {"counts": per_host,
+                               "last_action": self.last_action.get(code, 0.0),
+                               "comment": self.comments.get(code, ""),
+                               "comment_at": self.comment_at.get(code, 0.0)}
+                        for code, per_host in sorted(self.counts.items())},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        if data.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"unsupported usage snapshot format: {data.get('format')!r}")
+        counters = cls()
+        counters.hosts = {host: float(exported_at) for host, exported_at in data.get("hosts", {}).items()}
+        for code, entry in data.get("entries", {}).items():
+            counters.counts[code] = {host: int(count) for host, count in entry.get("counts", {}).items()}
+            counters.last_action[code] = float(entry.get("last_action", 0.0))
+            if entry.get("comment"):
+                # Snapshots written before comment_at only had the comment of the latest action
+                counters.comments[code] = entry["comment"]
+                counters.comment_at[code] = float(entry.get("comment_at", counters.last_action[code]))
+        return counters
+
+    @classmethod
+    def load(cls, path):
+        """The state saved at `path`, or an empty one if there is none"""
+        path = Path(path)
+        if not path.exists():
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path):
+        write_atomic(path, lambda f: json.dump(self.to_dict(), f, separators=(",", ":")))
+
+
+def local_entries(csv_path):
+    """This host's usage rows ({code: CSV row}), as current as the listener has them.
+
+    The CSV is only a view, which the SQLite backend refreshes every
+    `compact_every` actions, so rows come from the SQLite database when it
+    is newer than the view. Counts and last use are then overlaid with the
+    live counters, if the listener publishes them.
+    """
+    csv_path = Path(csv_path)
+    event_log = UsageEventLog(csv_path)
+    event_log.materialize_if_stale()
+    entries = event_log.read_csv() if csv_path.exists() else {}
+
+    db_path = csv_path.with_suffix(".db")
+    db_mtime = newest_mtime([db_path, db_path.with_name(db_path.name + "-wal")])
+    if db_mtime is not None and (not entries or db_mtime > csv_path.stat().st_mtime_ns):
+        from csv_logger import SQLiteBackend
+        try:
+            entries = SQLiteBackend.read_entries(db_path)
+        except Exception as e:
+            logging.error(f"Error reading {db_path}, using the CSV view: {e}")
+
+    from live_counters import LiveCountersReader
+    reader = LiveCountersReader.for_csv(csv_path)
+    try:
+        live = reader.snapshot() or {}
+    except (OSError, ValueError, TimeoutError) as e:
+        logging.error(f"Error reading live counters, using the stored counts: {e}")
+        live = {}
+    finally:
+        reader.close()
+    for code, (count, last_used) in live.items():
+        entry = entries.setdefault(code, {'code': code, 'count': '0', 'last_action': '', 'comment': ''})
+        entry['count'] = str(count)
+        if last_used:
+            entry['last_action'] = datetime.fromtimestamp(last_used).strftime("%Y-%m-%d %H:%M:%S")
+    return entries
+
+
+def local_counters(csv_path, host=None):
+    """The merged state so far plus this host's current usage"""
+    csv_path = Path(csv_path)
+    counters = UsageCounters.load(merged_path(csv_path))
+    counters.observe_entries(host or host_name(), local_entries(csv_path), datetime.now().timestamp())
+    return counters
+
+
+def export_snapshot(csv_path, out_path, host=None):
+    counters = local_counters(csv_path, host)
+    counters.save(out_path)
+    return counters
+
+
+def merge_snapshots(csv_path, snapshot_paths, host=None):
+    """Merge exported snapshots into the merged state next to `csv_path`"""
+    counters = local_counters(csv_path, host)
+    for snapshot_path in snapshot_paths:
+        counters.merge(UsageCounters.load(snapshot_path))
+    counters.save(merged_path(csv_path))
+    return counters
+
+
+def main():
+    script_dir = Path(__file__).parent.absolute()
+    parser = argparse.ArgumentParser(
+        description="Export and merge usage counts across machines that share a config",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s export                         # writes key_listener_actions_<host>.json
+  %(prog)s merge other-mac.json ...       # folds other hosts into key_listener_actions_merged.json
+        """
+    )
+    parser.add_argument("--file", type=Path, default=script_dir / "key_listener_actions.csv",
+                        help="Usage CSV of this machine (default: key_listener_actions.csv)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write this machine's usage, plus what it has merged, to a snapshot")
+    export_parser.add_argument("-o", "--output", type=Path, help="Snapshot file (default: <csv stem>_<host>.json)")
+
+    merge_parser = subparsers.add_parser("merge", help="Merge snapshots exported on other machines")
+    merge_parser.add_argument("snapshots", nargs="+", type=Path)
+
+    args = parser.parse_args()
+    host = host_name()
+
+    try:
+        if args.command == "export":
+            output = args.output or args.file.with_name(f"{args.file.stem}_{host}.json")
+            counters = export_snapshot(args.file, output, host)
+            print(f"Exported usage of {len(counters.counts)} combos from {len(counters.hosts)} host(s) to {output}")
+        else:
+            counters = merge_snapshots(args.file, args.snapshots, host)
+            local = sum(per_host.get(host, 0) for per_host in counters.counts.values())
+            total = sum(sum(per_host.values()) for per_host in counters.counts.values())
+            print(f"Merged {len(args.snapshots)} snapshot(s) into {merged_path(args.file)}: "
+                  f"{total} actions on {len(counters.hosts)} host(s), {local} on {host}")
+    except (OSError, ValueError) as e:
+        logging.error(f"Usage merge failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from usage_history import UsageHistory, event_epoch
+from usage_log import write_atomic
+
+HOUR = 3600
+WINDOWS = (("24h", 1), ("7d", 7), ("30d", 30))
+
+
+def hour_bucket(epoch):
+    return int(epoch // HOUR)
+
+
+def day_bucket(epoch):
+    # Local calendar day, so daily buckets line up with what the user sees
+    return datetime.fromtimestamp(epoch).date().toordinal()
+
+
+class UsageRollups:
+    """Hourly and daily usage buckets per combo, maintained incrementally.
+
+    Each action bumps one hourly and one daily bucket. Buckets older than
+    the retention settings are dropped when the rollups are saved: hourly
+    detail goes first and the daily buckets keep the longer history.
+    Windowed queries sum at most a window's worth of buckets per combo and
+    never touch the raw history.
+
+    The rollups file records the history position it covers, so a crash
+    between saves is repaired by replaying the tail of the history on load.
+    """
+
+    def __init__(self, path, history, hourly_retention_days=14, daily_retention_days=730, save_every=64):
+        self.path = Path(path)
+        self.history = history
+        self.hourly_retention_days = hourly_retention_days
+        self.daily_retention_days = daily_retention_days
+        self.save_every = save_every
+        self.hourly = defaultdict(lambda: defaultdict(int))
+        self.daily = defaultdict(lambda: defaultdict(int))
+        self.history_position = None
+        self.unsaved = 0
+        self.version = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_csv(cls, csv_path, history=None, **kwargs):
+        csv_path = Path(csv_path)
+        history = history or UsageHistory.for_csv(csv_path)
+        return cls(csv_path.with_name(csv_path.stem + "_rollups.json"), history, **kwargs)
+
+    def load(self, read_only=False):
+        self.history.load(read_only)
+        with self.lock:
+            if self.path.exists():
+                try:
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    if "history_cursor" in data:
+                        for code, buckets in data.get("hourly", {}).items():
+                            self.hourly[code].update({int(k): v for k, v in buckets.items()})
+                        for code, buckets in data.get("daily", {}).items():
+                            self.daily[code].update({int(k): v for k, v in buckets.items()})
+                        self.history_position = data["history_cursor"]
+                    else:
+                        logging.info("Usage rollups predate the columnar history, rebuilding them")
+                except (OSError, ValueError) as e:
+                    logging.error(f"Error loading usage rollups, rebuilding from history: {e}")
+                    self.hourly.clear()
+                    self.daily.clear()
+                    self.history_position = None
+
+            replayed = 0
+            for epoch, code in self.history.read_from(self.history_position):
+                self._add(code, epoch)
+                replayed += 1
+            self.history_position = self.history.end()
+            if replayed:
+                logging.info(f"Replayed {replayed} history events into usage rollups")
+        return self
+
+    def _add(self, code, epoch):
+        self.hourly[code][hour_bucket(epoch)] += 1
+        self.daily[code][day_bucket(epoch)] += 1
+
+    # Storage actor sink interface
+
+    def write_batch(self, events):
+        actions = [event for event in events if event["op"] == "action"]
+        if actions:
+            position = self.history.append_many(actions)
+            with self.lock:
+                for event in actions:
+                    self._add(event["code"], event_epoch(event))
+                self.history_position = position
+                self.unsaved += len(actions)
+                self.version += 1
+            if self.unsaved >= self.save_every:
+                self.save()
+        for event in events:
+            if event["op"] == "completion":
+                self.history.complete(event["id"], event["duration"], event["status"])
+
+    def close(self):
+        self.save()
+
+    def save(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self._prune(now)
+            data = {
+                "history_cursor": self.history_position,
+                "hourly": {code: buckets for code, buckets in self.hourly.items() if buckets},
+                "daily": {code: buckets for code, buckets in self.daily.items() if buckets},
+            }
+            self.unsaved = 0
+        write_atomic(self.path, lambda f: json.dump(data, f))
+
+    def _prune(self, now):
+        oldest_hour = hour_bucket(now) - self.hourly_retention_days * 24
+        oldest_day = day_bucket(now) - self.daily_retention_days
+        for buckets, oldest in ((self.hourly, oldest_hour), (self.daily, oldest_day)):
+            for code in list(buckets):
+                expired = [bucket for bucket in buckets[code] if bucket < oldest]
+                for bucket in expired:
+                    del buckets[code][bucket]
+                if not buckets[code]:
+                    del buckets[code]
+
+    # Queries
+
+    def window_counts(self, days, now=None):
+        """Return {code: (count in the last `days`, count in the `days` before that)}.
+
+        Windows that fit twice inside the hourly retention are summed from
+        hourly buckets (exact to the hour); longer ones from daily buckets
+        (aligned to local days).
+        """
+        now = time.time() if now is None else now
+        if 2 * days <= self.hourly_retention_days:
+            source, end, span = self.hourly, hour_bucket(now), days * 24
+        else:
+            source, end, span = self.daily, day_bucket(now), days
+        current_start = end - span + 1
+        previous_start = current_start - span
+
+        counts = {}
+        with self.lock:
+            for code, buckets in source.items():
+                current = previous = 0
+                for bucket in range(previous_start, end + 1):
+                    count = buckets.get(bucket)
+                    if count:
+                        if bucket >= current_start:
+                            current += count
+                        else:
+                            previous += count
+                if current or previous:
+                    counts[code] = (current, previous)
+        return counts
+
+    def windowed_stats(self, now=None):
+        """Rows of {code, 24h, 7d, 30d, <window>_prev} for every combo used in any window or the one before it"""
+        rows = {}
+        empty = {key: 0 for name, _ in WINDOWS for key in (name, f"{name}_prev")}
+        for label, days in WINDOWS:
+            for code, (current, previous) in self.window_counts(days, now).items():
+                row = rows.setdefault(code, {'code': code, **empty})
+                row[label] = current
+                row[f"{label}_prev"] = previous
+        return sorted(rows.values(), key=lambda row: (-row['7d'], -row['30d'], row['code']))
+
+    @staticmethod
+    def trend(current, previous):
+        """Short label comparing a window with the one before it"""
+        if not previous:
+            return "new" if current else "-"
+        change = (current - previous) * 100.0 / previous
+        return f"{change:+.0f}%"
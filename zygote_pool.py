@@ -0,0 +1,297 @@
+import json
+import logging
+import os
+import queue
+import resource
+import runpy
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from helper_runner import HelperRunner
+
+# Imported by every worker before its first job, so helpers find them already loaded
+PRELOAD = ("argparse", "json", "shlex", "socket", "subprocess", "urllib.request",
+           "script_runner", "script_library")
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes on Linux
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class _Worker:
+    """One warm worker process and the replies read from its pipe"""
+
+    def __init__(self, process, replies):
+        self.process = process
+        self.replies = replies
+        self.jobs = 0
+        self.baseline_rss = None
+        self.rss = 0
+
+    def alive(self):
+        return self.process.poll() is None
+
+
+class ZygotePool:
+    """A few warm Python processes that run file_command helpers in isolation.
+
+    Each worker starts once, imports PRELOAD and then waits for jobs as JSON
+    lines on its stdin; it answers on a separate pipe so helpers keep the
+    listener's stdout and stderr. A job runs the helper's main(argv) if it
+    has one and the whole script otherwise, exactly like `python3 file.py`
+    but without the interpreter start and imports. A helper that crashes or
+    hangs only takes its worker down: the worker is killed on timeout and
+    replaced. Workers are also replaced after `max_jobs` jobs or when their
+    peak memory has grown by more than `max_rss_growth_mb` since they
+    started. If `max_failures` workers in a row die before they are ready, run()
+    returns None and the caller starts helpers as plain subprocesses.
+    """
+
+    def __init__(self, app_dir, size=2, max_jobs=100, max_rss_growth_mb=200, timeout=60.0,
+                 max_failures=3, preload=PRELOAD):
+        self.app_dir = Path(app_dir)
+        self.size = max(1, size)
+        self.max_jobs = max_jobs
+        self.max_rss_growth = max_rss_growth_mb * 1024 * 1024
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.preload = preload
+        self.condition = threading.Condition()
+        self.idle = []
+        self.count = 0
+        self.failures = 0
+        self.ids = 0
+        self.closed = False
+
+    def start(self):
+        """Start all workers now so the first jobs do not wait for them"""
+        with self.condition:
+            self.closed = False
+            while self.count < self.size and self.failures < self.max_failures:
+                worker = self._spawn()
+                if worker is None:
+                    break
+                self.idle.append(worker)
+
+    def _spawn(self):
+        # Called with self.condition held
+        read_fd, write_fd = os.pipe()
+        command = [sys.executable, str(Path(__file__).resolve()), "--worker", str(write_fd),
+                   str(self.app_dir), ",".join(self.preload)]
+        try:
+            # A session of its own keeps Ctrl+C in the listener's terminal away from the workers
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, text=True, encoding='utf-8',
+                                       bufsize=1, pass_fds=(write_fd,), start_new_session=True)
+        except OSError as e:
+            logging.error(f"Could not start a file_command worker: {e}")
+            os.close(read_fd)
+            self.failures = self.max_failures
+            return None
+        finally:
+            os.close(write_fd)
+        replies = queue.SimpleQueue()
+        threading.Thread(target=self._read, args=(os.fdopen(read_fd, encoding='utf-8'), replies),
+                         name="file-command-worker-reader", daemon=True).start()
+        self.count += 1
+        return _Worker(process, replies)
+
+    @staticmethod
+    def _read(pipe, replies):
+        with pipe:
+            for line in pipe:
+                replies.put(line)
+        replies.put(None)
+
+    def _acquire(self, deadline):
+        with self.condition:
+            while not self.closed:
+                if self.failures >= self.max_failures:
+                    return None
+                while self.idle:
+                    worker = self.idle.pop()
+                    if worker.alive():
+                        return worker
+                    self.count -= 1
+                if self.count < self.size:
+                    worker = self._spawn()
+                    if worker is not None:
+                        return worker
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+            return None
+
+    def _release(self, worker):
+        with self.condition:
+            if self.closed:
+                self.count -= 1
+                self._stop(worker)
+            else:
+                self.idle.append(worker)
+            self.condition.notify()
+
+    def _retire(self, worker, kill=False, reason=None):
+        if reason:
+            logging.info(f"Replacing file_command worker {worker.process.pid}: {reason}")
+        self._stop(worker, kill)
+        with self.condition:
+            self.count -= 1
+            # Keep the pool warm: the replacement starts its imports right away
+            if not self.closed and self.failures < self.max_failures:
+                replacement = self._spawn()
+                if replacement is not None:
+                    self.idle.append(replacement)
+            self.condition.notify()
+
+    @staticmethod
+    def _stop(worker, kill=False):
+        if kill:
+            worker.process.kill()
+        try:
+            worker.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            worker.process.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            worker.process.kill()
+            worker.process.wait()
+
+    def run(self, path, args, timeout=None):
+        """Run a helper in a worker; True/False for success, None if the pool cannot run it"""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        worker = self._acquire(deadline)
+        if worker is None:
+            return None
+        if worker is False:
+            logging.warning(f"No file_command worker free within {timeout}s for {Path(path).name}")
+            return False
+
+        with self.condition:
+            self.ids += 1
+            job_id = self.ids
+        try:
+            worker.process.stdin.write(json.dumps({"id": job_id, "path": str(path),
+                                                   "args": [str(arg) for arg in args]}) + "\n")
+            worker.process.stdin.flush()
+        except (OSError, ValueError):
+            self._worker_died(worker)
+            return self.run(path, args, max(deadline - time.monotonic(), 0.1))
+
+        while True:
+            try:
+                line = worker.replies.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                logging.warning(f"{Path(path).name} still running after {timeout}s; killing its worker")
+                self._retire(worker, kill=True)
+                return False
+            if line is None:
+                logging.error(f"The file_command worker exited while running {Path(path).name} "
+                              f"(exit code {worker.process.wait()})")
+                self._worker_died(worker)
+                return False
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                continue
+            if "rss" in reply:
+                worker.rss = reply["rss"]
+                if worker.baseline_rss is None:
+                    worker.baseline_rss = worker.rss
+            if reply.get("id") == job_id:
+                break
+
+        with self.condition:
+            self.failures = 0
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs:
+            self._retire(worker, reason=f"ran {worker.jobs} jobs")
+        elif worker.rss - worker.baseline_rss > self.max_rss_growth:
+            self._retire(worker, reason=f"memory grew by {(worker.rss - worker.baseline_rss) // (1024 * 1024)} MB")
+        else:
+            self._release(worker)
+        return bool(reply.get("ok"))
+
+    def _worker_died(self, worker):
+        with self.condition:
+            # A helper that crashes its worker is not held against the pool; workers that cannot start are
+            if worker.baseline_rss is not None:
+                self.failures = 0
+            else:
+                self.failures += 1
+            if self.failures >= self.max_failures:
+                logging.error(f"file_command workers died {self.failures} times in a row; "
+                              f"running isolated helpers as plain subprocesses from now on")
+        self._retire(worker)
+
+    def close(self):
+        """Stop the idle workers; busy ones stop when their job ends"""
+        with self.condition:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.count -= len(idle)
+            self.condition.notify_all()
+        for worker in idle:
+            self._stop(worker)
+
+
+def _run_job(helpers, path, args):
+    sys.argv = [str(path)] + args
+    try:
+        module = helpers.module(path)
+        if module is not None:
+            return not module.main(list(args))
+        runpy.run_path(str(path), run_name="__main__")
+        return True
+    except SystemExit as e:
+        return e.code in (None, 0)
+    except BaseException:
+        traceback.print_exc()
+        return False
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def worker_main(reply_fd, app_dir, preload):
+    """Worker side of ZygotePool: import, report ready, then run jobs until stdin closes"""
+    requests = os.fdopen(os.dup(0), encoding='utf-8')
+    # Helpers get no stdin, same as a hotkey-started process; the real one carries the jobs
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    replies = os.fdopen(reply_fd, "w", encoding='utf-8', buffering=1)
+
+    sys.path.insert(0, app_dir)
+    for name in filter(None, preload.split(",")):
+        try:
+            __import__(name)
+        except Exception as e:
+            print(f"file_command worker could not preload {name}: {e}", file=sys.stderr)
+    helpers = HelperRunner()
+    replies.write(json.dumps({"ready": True, "rss": peak_rss()}) + "\n")
+
+    for line in requests:
+        try:
+            job = json.loads(line)
+        except ValueError:
+            continue
+        ok = _run_job(helpers, Path(job["path"]), job.get("args", []))
+        replies.write(json.dumps({"id": job.get("id"), "ok": ok, "rss": peak_rss()}) + "\n")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--worker":
+        worker_main(int(sys.argv[2]), sys.argv[3], sys.argv[4])
+    else:
+        print("Usage: zygote_pool.py --worker <reply fd> <app dir> <preload modules>")
+        sys.exit(1)